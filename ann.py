@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+ann - approximate nearest neighbor index of the snapshot embeddings. The
+      inverted file index (IVF) clusters the embeddings with k-means and
+      searches only the embeddings of the clusters closest to a query.
+"""
+
+# Author: Eren Cakmak <eren.cakmak@uni-konstanz.de>
+#
+# License: MIT
+
+import math
+
+import numpy as np
+
+# rows of the distance matrices computed at once
+chunk_size = 4096
+
+
+def squared_distances(X, Y, Y_norms=None):
+    """Return the squared euclidean distances between the rows of X and Y
+
+        Keyword arguments:
+        X -- 2d array
+        Y -- 2d array
+        Y_norms -- squared norms of the rows of Y
+    """
+    if Y_norms is None:
+        Y_norms = np.einsum('ij,ij->i', Y, Y)
+    d = np.einsum('ij,ij->i', X, X)[:, None] - 2 * X.dot(Y.T) + Y_norms
+    return np.maximum(d, 0)
+
+
+def nearest_centroids(X, centroids):
+    """Return the index of the nearest centroid of every row of X
+    """
+    norms = np.einsum('ij,ij->i', centroids, centroids)
+    return np.concatenate([
+        np.argmin(squared_distances(X[i:i + chunk_size], centroids, norms),
+                  axis=1) for i in range(0, len(X), chunk_size)
+    ]) if len(X) else np.empty(0, dtype=int)
+
+
+def kmeans(X, k, iterations=10, seed=0):
+    """Return k centroids of the rows of X (Lloyd's algorithm). Empty
+    clusters are restarted at random rows.
+
+        Keyword arguments:
+        X -- 2d array
+        k -- number of clusters
+        iterations -- number of iterations
+        seed -- seed of the initialization
+    """
+    rng = np.random.RandomState(seed)
+    centroids = X[rng.choice(len(X), k, replace=False)].copy()
+    for _ in range(iterations):
+        assign = nearest_centroids(X, centroids)
+        counts = np.bincount(assign, minlength=k)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, X)
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        centroids[empty] = X[rng.choice(len(X), np.count_nonzero(empty))]
+    return centroids
+
+
+class IVFIndex:
+    def __init__(self, n_lists=None, n_probe=8, iterations=10, seed=0):
+        """Initialize the inverted file index.
+
+            Keyword arguments:
+            n_lists -- number of clusters, sqrt(n) if None
+            n_probe -- number of clusters searched per query
+            iterations -- k-means iterations
+            seed -- seed of the k-means initialization
+        """
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.iterations = iterations
+        self.seed = seed
+
+    def __repr__(self):
+        return 'IVFIndex: ' + str(len(self.indices)) + ' embeddings - ' + str(
+            len(self.centroids)) + ' lists - ' + str(self.n_probe) + ' probes'
+
+    def fit(self, X):
+        """Build the index of the rows of X. The k-means clustering is
+        trained on a sample of at most 64 rows per cluster.
+
+            Keyword arguments:
+            X -- 2d array of the embeddings
+        """
+        X = np.asarray(X, dtype=float)
+        n_lists = self.n_lists or int(math.sqrt(len(X)))
+        n_lists = max(1, min(n_lists, len(X)))
+        rng = np.random.RandomState(self.seed)
+        sample = X[rng.choice(len(X), min(len(X), 64 * n_lists),
+                              replace=False)]
+        self.centroids = kmeans(sample, n_lists, self.iterations, self.seed)
+
+        # the embeddings of a cluster are stored contiguously
+        assign = nearest_centroids(X, self.centroids)
+        self.indices = np.argsort(assign, kind='stable')
+        self.offsets = np.concatenate(
+            [[0], np.cumsum(np.bincount(assign, minlength=n_lists))])
+        self.vectors = X[self.indices]
+        self.norms = np.einsum('ij,ij->i', self.vectors, self.vectors)
+        return self
+
+    def kneighbors(self, X, n_neighbors=5):
+        """Return the distances and indices of the approximate k-nearest
+        neighbors of the rows of X like NearestNeighbors.kneighbors. More
+        clusters are searched if the probed clusters contain less than k
+        embeddings.
+
+            Keyword arguments:
+            X -- 2d array of query embeddings
+            n_neighbors -- number of nearest neighbors
+        """
+        X = np.atleast_2d(np.asarray(X, dtype=float))
+        k = min(n_neighbors, len(self.indices))
+        dist = np.empty((len(X), k))
+        indices = np.empty((len(X), k), dtype=int)
+        order = np.argsort(squared_distances(X, self.centroids), axis=1)
+        sizes = np.diff(self.offsets)
+
+        for q, x in enumerate(X):
+            n_probe = self.n_probe
+            while n_probe < len(order[q]) and \
+                    sizes[order[q][:n_probe]].sum() < k:
+                n_probe = n_probe * 2
+            candidates = np.concatenate([
+                np.arange(self.offsets[c], self.offsets[c + 1])
+                for c in order[q][:n_probe]
+            ])
+            d = squared_distances(x[None, :], self.vectors[candidates],
+                                  self.norms[candidates])[0]
+            top = np.argpartition(d, k - 1)[:k] if k < len(d) else np.arange(
+                len(d))
+            top = top[np.argsort(d[top], kind='stable')]
+            dist[q] = np.sqrt(d[top])
+            indices[q] = self.indices[candidates[top]]
+        return dist, indices
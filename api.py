@@ -8,19 +8,233 @@ API - for querying the data
 # License: MIT
 
 import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-from flask import Blueprint, Response, jsonify, request
+from flask import (Blueprint, Response, current_app, jsonify, request,
+                   stream_with_context)
 import networkx as nx
-from networkx.readwrite import json_graph
 import json
 from distutils.util import strtobool
 
 import model
+import detail
+import offload
+import instrument
+from instrument import phase
+from serialize import (formats, encode_graph, encode_graphs, parse_graph,
+                       EncodedResponse)
 
 backend_api = Blueprint('api', __name__)
 
 logger = logging.getLogger(__name__)
 
+# worker threads of the batched snapshot requests
+batch_pool = ThreadPoolExecutor(4)
+batch_max_requests = 256  # maximum number of requests of a batch
+
+
+def configure_batch(workers=4, max_requests=256):
+    """Configure the batched snapshot requests.
+
+        Keyword arguments:
+        workers -- number of worker threads
+        max_requests -- maximum number of requests of a batch
+    """
+    global batch_pool, batch_max_requests
+    batch_pool.shutdown(wait=False)
+    batch_pool = ThreadPoolExecutor(workers)
+    batch_max_requests = max_requests
+
+
+def cached_encoding(key, compute):
+    """Return the EncodedResponse of the graph data or None. The encoded and
+    the gzip compressed bytes are kept in the graph cache - the entries of
+    changed snapshots are removed by appends.
+
+        Keyword arguments:
+        key -- cache key of the response
+        compute -- function returning (bytes, mimetype) or None
+    """
+    def encode():
+        result = compute()
+        if result is None:
+            return None
+        with phase('serialize'):
+            return EncodedResponse(*result)
+
+    return model.graph_cache.get_or_compute(('response', ) + key, encode,
+                                            EncodedResponse.size)
+
+
+def encoded_response(key, compute):
+    """Return the response of the encoded graph data (see cached_encoding).
+
+        Keyword arguments:
+        key -- cache key of the response
+        compute -- function returning (bytes, mimetype) or None
+    """
+    encoded = cached_encoding(key, compute)
+    if encoded is None:
+        return jsonify({})
+
+    if 'gzip' in request.headers.get('Accept-Encoding', ''):
+        response = Response(encoded.gzip_data, mimetype=encoded.mimetype)
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = Response(encoded.data, mimetype=encoded.mimetype)
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+
+@backend_api.errorhandler(offload.Timeout)
+def timeout_error(e):
+    """The computation exceeded the time budget of the request
+    """
+    return jsonify({'error': str(e)}), 504
+
+
+@backend_api.errorhandler(offload.Cancelled)
+def cancelled_error(e):
+    """The computation was cancelled - the client is gone or a newer request
+    of the same view arrived
+    """
+    return jsonify({'error': str(e)}), 409
+
+
+@backend_api.before_request
+def start_timing():
+    """Start the timing of the model phases of the request
+    """
+    instrument.start_request()
+
+
+@backend_api.after_request
+def add_server_timing(response):
+    """Add the durations of the model phases as Server-Timing header. The
+    body of a streamed response is produced after the headers are sent - its
+    request is recorded without header when the stream is closed.
+    """
+    endpoint = request.endpoint or request.path
+    if response.is_streamed:
+        state = instrument.detach_request()
+        status = response.status_code
+        response.call_on_close(
+            lambda: instrument.end_request(endpoint, status, state))
+        return response
+    phases, duration = instrument.end_request(endpoint, response.status_code)
+    response.headers['Server-Timing'] = instrument.server_timing(
+        phases, duration)
+    return response
+
+
+def request_filter(token=None):
+    """Return (node_filter, error_response) of the filter token of the
+    request. The node filter is None without a token.
+
+        Keyword arguments:
+        token -- filter token, the filter parameter of the request if None
+    """
+    token = token or request.args.get('filter')
+    if not token:
+        return None, None
+    node_filter = model.hierarchy.get_filter(token)
+    if node_filter is None:
+        return None, (jsonify({'error': 'Unknown filter: ' + token}), 404)
+    return node_filter, None
+
+
+def filter_key(node_filter):
+    """Return the picklable (token, ids) of the node filter or None
+    """
+    if node_filter is None:
+        return None
+    return node_filter.token, node_filter.ids
+
+
+def resolve_filter(key):
+    """Return the node filter of the (token, ids) key or None. Processes
+    without the filter register it again.
+    """
+    if key is None:
+        return None
+    token, ids = key
+    node_filter = model.hierarchy.get_filter(token)
+    if node_filter is None:
+        node_filter = model.hierarchy.get_filter(
+            model.hierarchy.filter_nodes(ids))
+    return node_filter
+
+
+def request_budget(timeout=None, view=None):
+    """Return the offload.Budget of the request. The offloaded computations
+    of the request are cancelled when the client disconnects or a newer
+    request of the same view arrives.
+
+        Keyword arguments:
+        timeout -- time budget in seconds, the timeout parameter of the
+                   request if None
+        view -- view of the client, the view parameter of the request if None
+    """
+    if timeout is None:
+        timeout = request.args.get('timeout')
+    view = view or request.args.get('view')
+    environ = request.environ
+    stamp = None
+    if view and offload.views is not None:
+        stamp = offload.views.start(view)
+
+    def cancelled():
+        if stamp is not None and offload.views.superseded(view, stamp):
+            return True
+        return offload.client_disconnected(environ)
+
+    return offload.budget(
+        float(timeout) if timeout is not None else None, cancelled)
+
+
+def check_k(graph_type, k):
+    """Raise ValueError if the graph type requires a positive k - the
+    disjoint graph contains the nodes occuring in at most k time steps
+    """
+    if graph_type == 'disjoint' and k <= 0:
+        raise ValueError('The disjoint graph requires a positive k')
+
+
+def parse_bool(value):
+    """Return the boolean of a json value - true, false or a string parsed
+    like the query parameters. Raises ValueError for other values.
+    """
+    if isinstance(value, bool):
+        return value
+    if not isinstance(value, str):
+        raise ValueError('Invalid boolean: ' + json.dumps(value))
+    return bool(strtobool(value))
+
+
+def request_detail(args):
+    """Return the detail.Detail of the level of detail parameters or None
+    without a detail method. detail is the ranking method (see
+    detail.methods), the budget is the tier (default 0) or max_nodes and
+    max_edges and since is the number of ranked nodes the client already
+    has. Raises ValueError for invalid parameters.
+
+        Keyword arguments:
+        args -- request arguments or dict of a batched request
+    """
+    method = args.get('detail')
+    if not method:
+        return None
+    if method not in detail.methods:
+        raise ValueError('Unknown detail method: ' + str(method))
+    since = int(args.get('since', 0))
+    max_nodes = args.get('max_nodes')
+    max_edges = args.get('max_edges')
+    if max_nodes is None and max_edges is None:
+        return detail.tier(method, int(args.get('tier', 0)), since)
+    return detail.Detail(method,
+                         None if max_nodes is None else int(max_nodes),
+                         None if max_edges is None else int(max_edges), since)
+
 
 @backend_api.route("/hierarchy_meta")
 def get_hierarchy_meta():
@@ -32,6 +246,14 @@ def get_hierarchy_meta():
 @backend_api.route("/graph")
 def get_graph():
     """Return a specifc single snapshot
+    The format is node_link (default), columnar or binary. The nodes are
+    filtered with the token of the filter parameter. Clustered graphs are
+    partitioned with the cluster_method (greedy or label_propagation). Large
+    graphs are reduced to a level of detail with the detail ranking method
+    (degree or stratified) and a tier or max_nodes and max_edges budget -
+    only the additions to the first since ranked nodes are returned if since
+    is given. The computation is limited to timeout seconds and cancelled by
+    a newer request of the same view parameter.
     """
     # level as a n int
     level = int(request.args.get('level'))
@@ -43,19 +265,189 @@ def get_graph():
     k = int(request.args.get('k', -1))
     # get the cluster boolean
     cluster = strtobool(request.args.get('cluster'))
+    # community detection method of the clustered graph
+    method = request.args.get('cluster_method')
+    # response format
+    fmt = request.args.get('format', 'node_link')
 
     if not isinstance(level, int) or not isinstance(
             num, int) or not graph_type or not isinstance(k, int):
         return jsonify({})
-
+    if fmt not in formats:
+        return jsonify({})
+    if cluster:
+        cluster = method or model.cluster_method
+    try:
+        check_k(graph_type, k)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    node_filter, error = request_filter()
+    if error:
+        return error
+    try:
+        level_of_detail = request_detail(request.args)
+    except ValueError as e:
+        return jsonify({'error': 'Invalid detail: ' + str(e)}), 400
+    if cluster and level_of_detail:
+        return jsonify({'error': 'Clustered graphs have no level of detail'
+                        }), 400
+
+    return encoded_response(*graph_encoding(
+        level, num, graph_type, k, cluster, node_filter, fmt,
+        request_budget(), level_of_detail))
+
+
+def snapshot_data(level, num, graph_type, k, cluster, filter_key, fmt,
+                  level_of_detail=None):
+    """Return (bytes, mimetype) of the encoded snapshot graph or None - runs
+    in the offload worker processes.
+    """
+    node_filter = resolve_filter(filter_key)
     if k > 0:
-        G = model.hierarchy.get_snapshot(level, num, graph_type, k, cluster)
+        G = model.hierarchy.get_snapshot(level, num, graph_type, k, cluster,
+                                         node_filter, level_of_detail)
     else:
-        G = model.hierarchy.get_snapshot(level, num, graph_type, cluster)
+        G = model.hierarchy.get_snapshot(level,
+                                         num,
+                                         graph_type,
+                                         cluster=cluster,
+                                         node_filter=node_filter,
+                                         level_of_detail=level_of_detail)
 
     if (G):
-        return json_graph.node_link_data(G)
-    return {}
+        with phase('serialize'):
+            return encode_graph(G, fmt)
+    return None
+
+
+def graph_encoding(level,
+                   num,
+                   graph_type,
+                   k,
+                   cluster,
+                   node_filter,
+                   fmt,
+                   budget=None,
+                   level_of_detail=None):
+    """Return the cache key and the compute function of the encoded
+    snapshot graph (see cached_encoding). The graph is computed in the
+    offload worker processes within the budget of the request.
+    """
+    def compute():
+        return offload.run(snapshot_data,
+                           (level, num, graph_type, k, cluster,
+                            filter_key(node_filter), fmt, level_of_detail),
+                           budget)
+
+    key = (model.SnapshotKey(level, num), graph_type, k, cluster,
+           node_filter.token if node_filter else None, fmt, level_of_detail)
+    return key, compute
+
+
+def batch_result(index, item, node_filter, fmt, budget=None):
+    """Return the json encoded result of a request of a batch. The encoded
+    graph of the graph cache is embedded as it is.
+
+        Keyword arguments:
+        index -- position of the request in the batch
+        item -- dict with level, num and optional graph_type, k, cluster,
+                cluster_method and level of detail (see request_detail) of
+                the request
+        node_filter -- NodeFilter of the batch or None
+        fmt -- json format of the graphs
+        budget -- offload.Budget of the batch
+    """
+    result = {'index': index}
+    try:
+        level = int(item['level'])
+        num = int(item['num'])
+        result['exists'] = model.hierarchy.check_snapshot(level, num)
+        graph_type = item.get('graph_type')
+        if not result['exists'] or not graph_type:
+            # existence check only
+            return json.dumps(result).encode()
+
+        k = int(item.get('k', -1))
+        check_k(graph_type, k)
+        cluster = parse_bool(item.get('cluster', False))
+        if cluster:
+            cluster = item.get('cluster_method') or model.cluster_method
+        level_of_detail = request_detail(item)
+        if cluster and level_of_detail:
+            raise ValueError('Clustered graphs have no level of detail')
+        encoded = cached_encoding(*graph_encoding(level, num, graph_type, k,
+                                                  cluster, node_filter, fmt,
+                                                  budget, level_of_detail))
+    except (KeyError, TypeError, ValueError) as e:
+        result['error'] = 'Invalid request: ' + str(e)
+        return json.dumps(result).encode()
+    except (offload.Timeout, offload.Cancelled) as e:
+        result['error'] = str(e)
+        return json.dumps(result).encode()
+
+    graph = encoded.data if encoded is not None else b'null'
+    return json.dumps(result)[:-1].encode() + b', "graph": ' + graph + b'}'
+
+
+@backend_api.route("/graphs", methods=['POST'])
+def get_graphs():
+    """Return a batch of snapshots and existence checks. The body is a json
+    object with the list of requests ({level, num, graph_type, k, cluster,
+    cluster_method} - without graph_type only the existence is checked), the
+    format (node_link or columnar), the filter token, stream and the
+    optional timeout and view of the budget. The snapshots are computed in
+    parallel on the batch worker threads. The
+    results {index, exists, graph} are returned in the order of the requests
+    or streamed as newline delimited json as they complete if stream is
+    true.
+    """
+    data = json.loads(request.get_data())
+    items = data.get('requests', []) if isinstance(data, dict) else None
+    if not isinstance(items, list):
+        return jsonify({'error': 'Invalid batch'}), 400
+    if len(items) > batch_max_requests:
+        return jsonify({
+            'error':
+            'Too many requests: ' + str(len(items)) + ' > ' +
+            str(batch_max_requests)
+        }), 400
+    fmt = data.get('format', 'node_link')
+    if fmt not in ['node_link', 'columnar']:
+        return jsonify({'error': 'Unknown format: ' + str(fmt)}), 400
+    node_filter, error = request_filter(data.get('filter'))
+    if error:
+        return error
+
+    budget = request_budget(data.get('timeout'), data.get('view'))
+
+    # the phases of the batch threads are recorded in the request
+    phases = instrument.request_phases()
+
+    def traced_result(*args):
+        with instrument.attached(phases):
+            return batch_result(*args)
+
+    futures = [
+        batch_pool.submit(traced_result, i, item, node_filter, fmt, budget)
+        for i, item in enumerate(items)
+    ]
+    if not data.get('stream'):
+        with phase('batch'):
+            results = [f.result() for f in futures]
+        return Response(b'{"results": [' + b', '.join(results) + b']}',
+                        mimetype='application/json')
+
+    def stream():
+        try:
+            for f in as_completed(futures):
+                yield f.result() + b'\n'
+        finally:
+            # the client is gone - skip the requests not started yet
+            for f in futures:
+                f.cancel()
+
+    return Response(instrument.stream(stream(), phases, 'batch'),
+                    mimetype='application/x-ndjson')
 
 
 @backend_api.route("/intervall_tree")
@@ -72,14 +464,18 @@ def get_intervall_tree():
 
 @backend_api.route("/timeseries")
 def get_timeseries():
-    """Return time series data over time for a interval
+    """Return time series data over time for a interval. With max_points the
+    series is downsampled to the min, max and mean per window of the
+    matching hierarchy level.
     """
     # get the start and end date
     start = request.args.get('start_dateTime')
     end = request.args.get('end_dateTime')
+    max_points = request.args.get('max_points', type=int)
 
-    result = model.hierarchy.get_timeseries(start, end)
-    return jsonify(result)
+    result = model.hierarchy.get_timeseries(start, end, max_points)
+    with phase('serialize'):
+        return jsonify(result)
 
 
 @backend_api.route("/get_all_nodes")
@@ -89,13 +485,114 @@ def get_all_nodes():
     return jsonify(model.hierarchy.get_nodes())
 
 
+@backend_api.route("/search_nodes")
+def search_nodes():
+    """Return a page of the nodes with names matching the query parameter q
+    ranked by the number of time steps they occur in. The mode is substring
+    (default) or prefix, the page is selected with offset and limit.
+    """
+    query = request.args.get('q', '')
+    mode = request.args.get('mode', 'substring')
+    offset = int(request.args.get('offset', 0))
+    limit = int(request.args.get('limit', 50))
+
+    try:
+        result = model.hierarchy.search_nodes(query, mode, offset, limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    with phase('serialize'):
+        return jsonify(result)
+
+
 @backend_api.route("/filter_nodes", methods=['POST'])
 def filter_nodes():
-    """set the filter nodes for the hierarchy
+    """Register a node filter and return its token - the token is passed as
+    filter parameter of /graph and /animation_data. The token is null for an
+    empty list of nodes.
     """
     node_ids = json.loads(request.get_data())
-    model.hierarchy.filter_nodes(list(map(int, node_ids)))
-    return {}
+    token = model.hierarchy.filter_nodes(list(map(int, node_ids)))
+    return jsonify({'filter': token})
+
+
+def request_nodes(data):
+    """Return (node_ids, error_response) of the node set of the request
+    body - the list of nodes or the nodes of the filter token.
+
+        Keyword arguments:
+        data -- decoded json body with nodes or filter
+    """
+    if not isinstance(data, dict):
+        return None, (jsonify({'error': 'Invalid request'}), 400)
+    if data.get('filter'):
+        node_filter, error = request_filter(data['filter'])
+        if error:
+            return None, error
+        return node_filter.ids, None
+    try:
+        return list(map(int, data.get('nodes', []))), None
+    except (TypeError, ValueError) as e:
+        return None, (jsonify({'error': 'Invalid nodes: ' + str(e)}), 400)
+
+
+@backend_api.route("/node_timeline", methods=['POST'])
+def node_timeline():
+    """Return the presence of a node set over time. The body is a json
+    object with the nodes (list of ids) or a filter token and the optional
+    start_dateTime and end_dateTime. Returns the intervals of consecutive
+    time steps of every node and the number of nodes present per time step.
+    """
+    data = json.loads(request.get_data())
+    node_ids, error = request_nodes(data)
+    if error:
+        return error
+
+    result = model.hierarchy.node_timeline(node_ids,
+                                           data.get('start_dateTime'),
+                                           data.get('end_dateTime'))
+    with phase('serialize'):
+        return jsonify(result)
+
+
+@backend_api.route("/node_snapshots", methods=['POST'])
+def node_snapshots():
+    """Return the snapshots per level which contain any node of a node set.
+    The body is a json object with the nodes (list of ids) or a filter token
+    and the optional list of levels.
+    """
+    data = json.loads(request.get_data())
+    node_ids, error = request_nodes(data)
+    if error:
+        return error
+    levels = data.get('levels')
+    if levels is not None:
+        levels = list(map(int, levels))
+
+    result = model.hierarchy.node_snapshots(node_ids, levels)
+    with phase('serialize'):
+        return jsonify(result)
+
+
+@backend_api.route("/ingest", methods=['POST'])
+def ingest():
+    """Append the graph of the next time step to the hierarchy. The body is
+    a json object with the graph (see serialize.parse_graph) and optional
+    embeddings of the changed snapshots keyed by 'level_num'. Returns the
+    changed snapshots and the new hierarchy meta data.
+    """
+    if current_app.config.get('READ_ONLY'):
+        return jsonify({'error': 'The hierarchy is read-only'}), 403
+    data = json.loads(request.get_data())
+    try:
+        G = parse_graph(data['graph'])
+        changed = model.hierarchy.append(G, data.get('embeddings'))
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({'error': 'Invalid graph: ' + str(e)}), 400
+
+    return jsonify({
+        'changed': [[key.level, key.num] for key in changed],
+        'meta': model.hierarchy.get_hierarchy_meta()
+    })
 
 
 @backend_api.route("/check_graph")
@@ -116,34 +613,127 @@ def check_graph():
 @backend_api.route("/search_all_levels")
 def search_all_levels():
     """Knn search on all levels return k nearest neighbors
+    The embedding can be a single embedding or a list of embeddings. If merge
+    is true the k nearest neighbors over all levels are returned. Large
+    levels are searched approximately unless exact is true.
     """
     embedding = json.loads(request.args.get('embedding'))
     levels = list(map(int, json.loads(request.args.get('levels'))))
     k = int(request.args.get('k'))
-    
-    result = model.hierarchy.getAllNearestNeighbors(embedding, levels, k)
-    return jsonify(result)
+    merge = strtobool(request.args.get('merge', 'false'))
+    exact = strtobool(request.args.get('exact', 'false'))
+
+    result = model.hierarchy.getAllNearestNeighbors(embedding, levels, k,
+                                                    merge, exact)
+    with phase('serialize'):
+        return jsonify(result)
+
+
+@backend_api.route("/cache_stats")
+def get_cache_stats():
+    """Return the hit/miss statistics and the memory usage of the graph cache
+    """
+    return jsonify(model.graph_cache.get_stats())
+
+
+@backend_api.route("/metrics")
+def get_metrics():
+    """Return the request latencies, the cache statistics and the memory
+    estimates of the hierarchy in the Prometheus text format
+    """
+    caches = [('graph', model.graph_cache.get_stats()),
+              ('node_filter', model.node_filters.get_stats())]
+    gauges = [('msnap_cache_' + name, 'Graph cache ' + name.replace('_', ' '),
+               [({
+                   'cache': cache
+               }, stats[name]) for cache, stats in caches])
+              for name in ['entries', 'bytes', 'max_bytes', 'hits', 'misses',
+                           'evictions', 'hit_ratio']]
+    if model.hierarchy is not None:
+        gauges.append(('msnap_hierarchy_bytes',
+                       'Estimated memory of the hierarchy by part',
+                       [({
+                           'part': part
+                       }, size)
+                        for part, size in model.hierarchy.memory_usage().items()
+                        ]))
+        gauges.append(('msnap_hierarchy_time_steps',
+                       'Number of time steps of the hierarchy',
+                       [({}, len(model.hierarchy.store))]))
+    if offload.pool is not None:
+        gauges.append(('msnap_offload_replaced_workers',
+                       'Offload worker processes replaced after a timeout '
+                       'or cancellation', [({}, offload.pool.replaced)]))
+    return Response(instrument.registry.exposition(gauges),
+                    mimetype='text/plain; version=0.0.4')
 
 
 @backend_api.route("/animation_data")
 def get_animation_data():
     """Returns a list of graphs for the animatino of grpahs
+    The format is node_link (default) or columnar. The nodes are filtered
+    with the token of the filter parameter. The computation is limited to
+    timeout seconds and cancelled by a newer request of the same view.
     """
     # level as a n int
     level = int(request.args.get('level'))
     # the num snapshot in the level
     num = int(request.args.get('num'))
+    # response format
+    fmt = request.args.get('format', 'node_link')
 
     if not isinstance(level, int) or not isinstance(
             num, int) :
         return jsonify({})
+    if fmt not in ['node_link', 'columnar']:
+        return jsonify({})
+    node_filter, error = request_filter()
+    if error:
+        return error
+
+    budget = request_budget()
+
+    def compute():
+        return offload.run(animation_data,
+                           (level, num, filter_key(node_filter), fmt), budget)
 
-    graphs = model.hierarchy.get_animation_data(level, num)
+    key = ('animation', model.SnapshotKey(level, num),
+           node_filter.token if node_filter else None, fmt)
+    return encoded_response(key, compute)
+
+
+def animation_data(level, num, filter_key, fmt):
+    """Return (bytes, mimetype) of the encoded animation graphs or None -
+    runs in the offload worker processes.
+    """
+    graphs = model.hierarchy.get_animation_data(level, num,
+                                                resolve_filter(filter_key))
 
     if len(graphs):
-        result = []
-        for G in graphs:
-            if (G):
-                result.append(json_graph.node_link_data(G))
-        return jsonify(result)
-    return {}
+        with phase('serialize'):
+            return encode_graphs([G for G in graphs if G], fmt)
+    return None
+
+
+@backend_api.route("/animation_stream")
+def get_animation_stream():
+    """Streams the graphs of the animation as newline delimited json. The
+    first line is the first graph in the node-link format, every following
+    line contains the added and removed nodes and links of the next graph.
+    The nodes are filtered with the token of the filter parameter.
+    """
+    # level as a n int
+    level = int(request.args.get('level'))
+    # the num snapshot in the level
+    num = int(request.args.get('num'))
+
+    node_filter, error = request_filter()
+    if error:
+        return error
+
+    frames = model.hierarchy.get_animation_stream(level, num, node_filter)
+    if frames is None:
+        return jsonify({})
+    frames = instrument.stream(frames, instrument.request_phases())
+    return Response(stream_with_context(frames),
+                    mimetype='application/x-ndjson')
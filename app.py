@@ -12,8 +12,10 @@ from flask import Flask, render_template
 from flask_compress import Compress
 from flask_cors import CORS
 
-from api import backend_api
-from model import load_data
+from api import backend_api, configure_batch
+from instrument import configure_profiling
+from model import (load_data, graph_cache, configure_search,
+                   configure_clustering)
 
 app = Flask(__name__, static_folder='static', template_folder='static')
 CORS(app)
@@ -23,6 +25,13 @@ app.register_blueprint(backend_api)
 
 comp = Compress(app)
 
+graph_cache.set_max_bytes(app.config['GRAPH_CACHE_BYTES'])
+configure_search(app.config['ANN_MIN_SIZE'], app.config['ANN_PROBES'])
+configure_clustering(app.config['CLUSTER_METHOD'])
+configure_profiling(app.config['PROFILE_SLOW_REQUESTS'],
+                    app.config['PROFILE_DIR'])
+configure_batch(app.config['BATCH_WORKERS'], app.config['BATCH_MAX_REQUESTS'])
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -31,6 +40,7 @@ if __name__ == "__main__":
     graph_file_path = 'data/reddit_graphs.pkl'
     graph_embeddings_path = 'data/reddit_embeddings.pkl'
 
-    load_data(graph_file_path, graph_embeddings_path)
+    load_data(graph_file_path, graph_embeddings_path,
+              app.config['LAZY_HIERARCHY'])
 
     app.run(port=8000, debug=True)
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+cache - bounded LRU cache of the computed graphs with a global memory budget
+"""
+
+# Author: Eren Cakmak <eren.cakmak@uni-konstanz.de>
+#
+# License: MIT
+
+import sys
+import threading
+from collections import OrderedDict
+
+# approximate memory of a networkX node / edge with its attribute dicts
+node_bytes = 600
+edge_bytes = 400
+
+
+def graph_size(G):
+    """Return the approximate memory size of a networkX graph in bytes.
+
+        Keyword arguments:
+        G -- networkX graph
+    """
+    size = G.number_of_nodes() * node_bytes + G.number_of_edges() * edge_bytes
+    for value in G.graph.values():
+        if isinstance(value, (list, dict)):
+            size += 8 * len(value)
+        size += sys.getsizeof(value)
+    return size
+
+
+class GraphCache:
+    def __init__(self, max_bytes=512 * 1024 * 1024):
+        """Initialize the cache.
+
+            Keyword arguments:
+            max_bytes -- memory budget of all entries, entries are evicted in
+                         least recently used order above the budget
+        """
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key: (value, size)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __repr__(self):
+        return 'GraphCache: ' + str(len(self)) + ' entries - ' + str(
+            self.bytes) + ' of ' + str(self.max_bytes) + ' bytes'
+
+    def get(self, key):
+        """Return the cached value of key or None
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, size=None):
+        """Add the value to the cache and evict entries above the budget.
+
+            Keyword arguments:
+            key -- hashable key
+            value -- cached value
+            size -- size of the value in bytes, estimated for graphs if None
+        """
+        if size is None:
+            size = graph_size(value)
+        # never cache values larger than the budget
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.bytes -= self.entries.pop(key)[1]
+            self.entries[key] = (value, size)
+            self.bytes += size
+            self.evict()
+
+    def get_or_compute(self, key, compute, size=None):
+        """Return the cached value of key or compute and cache it.
+
+            Keyword arguments:
+            key -- hashable key
+            compute -- function without arguments returning the value
+            size -- function returning the size of the value, graph_size if
+                    None
+        """
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            if value is not None:
+                self.put(key, value, size(value) if size else None)
+        return value
+
+    def evict(self):
+        """Remove the least recently used entries until the budget is met.
+        The lock has to be held.
+        """
+        while self.bytes > self.max_bytes and self.entries:
+            _, (_, size) = self.entries.popitem(last=False)
+            self.bytes -= size
+            self.evictions += 1
+
+    def set_max_bytes(self, max_bytes):
+        """Change the memory budget
+        """
+        with self.lock:
+            self.max_bytes = max_bytes
+            self.evict()
+
+    def invalidate(self, match):
+        """Remove all entries with match(key) true.
+
+            Keyword arguments:
+            match -- function of the key returning true for outdated entries
+        """
+        with self.lock:
+            for key in [key for key in self.entries if match(key)]:
+                self.bytes -= self.entries.pop(key)[1]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def get_stats(self):
+        """Return the hit/miss statistics and memory usage as a dict
+        """
+        with self.lock:
+            requests = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': self.hits / requests if requests else 0.0
+            }
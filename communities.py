@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+communities - community detection of the clustered snapshots. Besides the
+              greedy modularity communities of networkX the nodes are
+              partitioned with a vectorized label propagation over the sparse
+              adjacency matrix, which can start from the partition of an
+              overlapping snapshot. The communities are aggregated into meta
+              nodes with vectorized group-bys.
+"""
+
+# Author: Eren Cakmak <eren.cakmak@uni-konstanz.de>
+#
+# License: MIT
+
+import networkx as nx
+from networkx.algorithms.community import greedy_modularity_communities
+import numpy as np
+from scipy.sparse.csgraph import connected_components
+
+from metrics import GraphMetrics
+
+methods = ['greedy', 'label_propagation']
+
+
+def greedy_partition(G):
+    """Return the community labels of the nodes of G (in node order) of the
+    greedy modularity communities.
+
+        Keyword arguments:
+        G -- networkX graph
+    """
+    position = {x: i for i, x in enumerate(G)}
+    labels = np.empty(len(position), dtype=np.int64)
+    for i, community in enumerate(
+            greedy_modularity_communities(G, weight='sentiment')):
+        labels[[position[x] for x in community]] = i
+    return labels
+
+
+def label_propagation(A, init=None, max_iter=100, seed=0):
+    """Return the community labels of the nodes of the adjacency matrix.
+    Every node takes the most frequent label of its neighbors - the current
+    label wins ties, otherwise the smallest label. A random half of the
+    nodes is updated per iteration so that the labels do not oscillate.
+    Communities which are not connected are split afterwards.
+
+        Keyword arguments:
+        A -- symmetric CSR adjacency matrix without self loops
+        init -- initial labels of the nodes, every node in its own
+                community if None
+        max_iter -- maximum number of iterations
+        seed -- seed of the node selection
+    """
+    n = A.shape[0]
+    if init is None:
+        labels = np.arange(n)
+    else:
+        # labels in [0, n) for the keys of the node label pairs
+        labels = np.unique(init, return_inverse=True)[1]
+    rows = np.repeat(np.arange(n), np.diff(A.indptr))
+    cols = A.indices
+    rng = np.random.RandomState(seed)
+
+    for _ in range(max_iter):
+        if not len(rows):
+            break
+        # number of neighbors per (node, label) - sorted by node and label
+        keys, counts = np.unique(rows * n + labels[cols], return_counts=True)
+        node, label = keys // n, keys % n
+        starts = np.flatnonzero(np.r_[True, node[1:] != node[:-1]])
+        best = np.zeros(n, dtype=counts.dtype)
+        best[node[starts]] = np.maximum.reduceat(counts, starts)
+        is_best = counts == best[node]
+
+        satisfied = np.zeros(n, dtype=bool)
+        satisfied[node[is_best & (label == labels[node])]] = True
+        candidates = np.flatnonzero(is_best)
+        first = candidates[np.r_[True,
+                                 node[candidates[1:]] != node[candidates[:-1]]]]
+        update = np.zeros(n, dtype=bool)
+        update[node[first]] = True
+        update &= ~satisfied
+        if not update.any():
+            break
+
+        selected = update & (rng.random_sample(n) < 0.5)
+        if not selected.any():
+            selected = update
+        new_labels = labels.copy()
+        new_labels[node[first]] = label[first]
+        labels = np.where(selected, new_labels, labels)
+
+    # connected components of the edges within the communities
+    inside = labels[rows] == labels[cols]
+    C = A.copy()
+    C.data = inside.astype(A.dtype)
+    C.eliminate_zeros()
+    return connected_components(C, directed=False)[1]
+
+
+def sort_labels(labels):
+    """Return the labels renumbered by community size (largest first) and
+    first node for equal sizes.
+    """
+    _, first, inverse, counts = np.unique(labels,
+                                          return_index=True,
+                                          return_inverse=True,
+                                          return_counts=True)
+    order = np.lexsort((first, -counts))
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+    return rank[inverse]
+
+
+def partition(G, method='label_propagation', init=None):
+    """Return the community labels of the nodes of G in node order. The
+    largest community has label 0.
+
+        Keyword arguments:
+        G -- networkX graph
+        method -- community detection method, see methods
+        init -- initial labels of the nodes for label propagation
+    """
+    if method == 'greedy':
+        labels = greedy_partition(G)
+    elif method == 'label_propagation':
+        labels = label_propagation(GraphMetrics(G).adjacency, init)
+    else:
+        raise ValueError('Unknown community detection method: ' + method)
+    return sort_labels(labels)
+
+
+def warm_start(ids, parent):
+    """Return the initial labels of the nodes with the labels of a parent
+    partition. Nodes without a label are in their own community.
+
+        Keyword arguments:
+        ids -- node ids
+        parent -- (ids, labels) of the parent partition sorted by id
+    """
+    parent_ids, parent_labels = parent
+    if not len(parent_ids):
+        return np.arange(len(ids))
+    pos = np.searchsorted(parent_ids, ids)
+    pos[pos == len(parent_ids)] = 0
+    found = parent_ids[pos] == ids
+    own = parent_labels.max() + 1 + np.arange(len(ids))
+    return np.where(found, parent_labels[pos], own)
+
+
+def quotient_graph(G, labels):
+    """Return the graph of the communities as meta nodes. The meta nodes
+    have the ids and names of their nodes and the mean coordinate. The meta
+    edges between two communities have the attributes of the latest edge
+    between them.
+
+        Keyword arguments:
+        G -- networkX graph with name and coord node attributes and sentiment
+             and time edge attributes
+        labels -- community labels of the nodes in node order
+    """
+    nodes = list(G.nodes(data=True))
+    num = int(labels.max()) + 1 if len(labels) else 0
+    position = {x: i for i, (x, _) in enumerate(nodes)}
+
+    # members of the communities in node order
+    order = np.argsort(labels, kind='stable')
+    offsets = np.cumsum(np.bincount(labels, minlength=num))[:-1]
+    ids = np.array([x for x, _ in nodes], dtype=object)[order]
+    names = np.array([d.get('name', '') for _, d in nodes], dtype=object)[order]
+    ids = [group.tolist() for group in np.split(ids, offsets)]
+    names = [group.tolist() for group in np.split(names, offsets)]
+
+    # mean of the known coordinates
+    dim = next((len(d['coord']) for _, d in nodes if 'coord' in d), 0)
+    coords = np.full((len(nodes), dim), np.nan)
+    for i, (_, d) in enumerate(nodes):
+        if 'coord' in d:
+            coords[i] = d['coord']
+    known = ~np.isnan(coords).any(axis=1)
+    sums = np.stack([
+        np.bincount(labels[known], weights=coords[known, j], minlength=num)
+        for j in range(dim)
+    ], axis=1) if dim else np.zeros((num, 0))
+    counts = np.bincount(labels[known], minlength=num)[:, None]
+    means = [
+        row if c else []
+        for row, c in zip((sums / np.maximum(counts, 1)).tolist(),
+                          counts[:, 0].tolist())
+    ]
+
+    H = nx.Graph()
+    H.graph = dict(G.graph)
+    H.add_nodes_from((i, {
+        'ids': ids[i],
+        'name': names[i],
+        'coord': means[i],
+        'is_cluster': True,
+        'cluster_size': len(ids[i])
+    }) for i in range(num))
+
+    # latest edge between two communities
+    edges = list(G.edges(data=True))
+    if not edges:
+        return H
+    u = labels[[position[x] for x, _, _ in edges]]
+    v = labels[[position[y] for _, y, _ in edges]]
+    time = np.array([d['time'] for _, _, d in edges], dtype='datetime64[s]')
+    between = np.flatnonzero(u != v)
+    between = between[np.argsort(time[between], kind='stable')]
+    keys = np.minimum(u, v)[between] * num + np.maximum(u, v)[between]
+    _, last = np.unique(keys[::-1], return_index=True)
+    latest = between[len(between) - 1 - last]
+    H.add_edges_from((int(u[i]), int(v[i]), {
+        'sentiment': edges[i][2]['sentiment'],
+        'time': edges[i][2]['time'],
+        'is_cluster': True
+    }) for i in latest.tolist())
+    return H
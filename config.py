@@ -12,3 +12,47 @@ import logging
 
 formatting = '%(asctime)s - %(levelname)s - %(name)s: %(message)s'
 logging.basicConfig(format=formatting, stream=sys.stdout, level=logging.INFO)
+
+# build the snapshots of the hierarchy on first access
+LAZY_HIERARCHY = False
+
+# memory budget of the cache of the union graphs and snapshots in bytes
+GRAPH_CACHE_BYTES = 512 * 1024 * 1024
+
+# levels with at least ANN_MIN_SIZE embeddings are searched with the
+# approximate nearest neighbor index (None for exact search only)
+ANN_MIN_SIZE = 100000
+# number of clusters of the approximate index searched per query
+ANN_PROBES = 8
+
+# community detection method of the clustered snapshots
+# ('greedy' or 'label_propagation')
+CLUSTER_METHOD = 'label_propagation'
+
+# requests slower than PROFILE_SLOW_REQUESTS seconds are profiled with
+# cProfile to PROFILE_DIR (None to disable profiling)
+PROFILE_SLOW_REQUESTS = None
+PROFILE_DIR = 'profiles'
+
+# worker threads and maximum number of requests of the batched snapshots
+BATCH_WORKERS = 4
+BATCH_MAX_REQUESTS = 256
+
+# production server (serve.py) - gunicorn workers forked after loading the
+# read-only hierarchy, each with OFFLOAD_PROCESSES forked processes for the
+# snapshot computations and OFFLOAD_CACHE_BYTES of graph cache per process
+SERVER_BIND = '0.0.0.0:8000'
+SERVER_WORKERS = 4
+SERVER_THREADS = 8
+OFFLOAD_PROCESSES = 2
+OFFLOAD_CACHE_BYTES = 128 * 1024 * 1024
+
+# default and maximum time budget of a snapshot computation in seconds
+REQUEST_TIMEOUT = 30
+MAX_REQUEST_TIMEOUT = 120
+
+# directory of the node filters shared by the server workers
+FILTER_DIR = 'filters'
+
+# reject appends to the hierarchy (/ingest) - set by serve.py
+READ_ONLY = False
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+dataset - versioned binary dataset format of flat arrays. The arrays of the
+          graph store and the embeddings are written as raw files next to a
+          small json header and opened with numpy.memmap.
+
+Convert the pickled graphs and embeddings with:
+
+    python dataset.py data/reddit_graphs.pkl data/reddit_embeddings.pkl data/reddit
+"""
+
+# Author: Eren Cakmak <eren.cakmak@uni-konstanz.de>
+#
+# License: MIT
+
+import os
+import sys
+import json
+import pickle
+
+import numpy as np
+
+from store import TemporalGraphStore
+
+format_name = 'multiscale-snapshots'
+format_version = 1
+header_file = 'meta.json'
+
+# arrays of the TemporalGraphStore in the order of its constructor
+store_arrays = [
+    'times', 'node_offsets', 'node_index', 'edge_offsets', 'edge_u', 'edge_v',
+    'edge_sentiment', 'edge_time', 'ids', 'names', 'coords'
+]
+
+
+def is_dataset(path):
+    """Return true if path is a directory in the binary dataset format
+    """
+    return os.path.isfile(os.path.join(path, header_file))
+
+
+def save_dataset(path, store, embeddings):
+    """Write the store and the embeddings in the binary dataset format.
+
+        Keyword arguments:
+        path -- directory of the dataset, created if it does not exist
+        store -- TemporalGraphStore of the graphs
+        embeddings -- dict with the embeddings and keys
+    """
+    os.makedirs(path, exist_ok=True)
+    arrays = {name: np.asarray(getattr(store, name)) for name in store_arrays}
+    arrays['embeddings'] = np.asarray(embeddings['embeddings'])
+    arrays['keys'] = np.asarray(embeddings['keys'], dtype=str)
+
+    header = {
+        'format': format_name,
+        'version': format_version,
+        'time_steps': len(store),
+        'nodes': len(store.ids),
+        'edges': len(store.edge_u),
+        'arrays': {}
+    }
+    for name, a in arrays.items():
+        a = np.ascontiguousarray(a)
+        a.tofile(os.path.join(path, name + '.bin'))
+        header['arrays'][name] = {'dtype': a.dtype.str, 'shape': a.shape}
+
+    # the header is written last - an incomplete dataset is not detected
+    with open(os.path.join(path, header_file), 'w') as f:
+        json.dump(header, f, indent=2)
+
+
+def save_embeddings(path, embeddings):
+    """Replace the embeddings of a dataset in the binary dataset format.
+
+        Keyword arguments:
+        path -- directory of the dataset
+        embeddings -- dict with the embeddings and keys
+    """
+    with open(os.path.join(path, header_file)) as f:
+        header = json.load(f)
+    arrays = {
+        'embeddings': np.asarray(embeddings['embeddings']),
+        'keys': np.asarray(embeddings['keys'], dtype=str)
+    }
+    for name, a in arrays.items():
+        a = np.ascontiguousarray(a)
+        a.tofile(os.path.join(path, name + '.bin'))
+        header['arrays'][name] = {'dtype': a.dtype.str, 'shape': a.shape}
+
+    with open(os.path.join(path, header_file), 'w') as f:
+        json.dump(header, f, indent=2)
+
+
+def open_dataset(path):
+    """Return the store and the embeddings of the binary dataset. The arrays
+    are memory mapped read-only and paged in on demand.
+
+        Keyword arguments:
+        path -- directory of the dataset
+    """
+    with open(os.path.join(path, header_file)) as f:
+        header = json.load(f)
+    if header.get('format') != format_name:
+        raise ValueError('Unknown dataset format: ' + str(header.get('format')))
+    if header.get('version') != format_version:
+        raise ValueError('Unsupported dataset version: ' +
+                         str(header.get('version')))
+
+    arrays = {}
+    for name, spec in header['arrays'].items():
+        shape = tuple(spec['shape'])
+        if 0 in shape:
+            # empty files can not be memory mapped
+            arrays[name] = np.empty(shape, dtype=spec['dtype'])
+        else:
+            arrays[name] = np.memmap(os.path.join(path, name + '.bin'),
+                                     dtype=spec['dtype'],
+                                     mode='r',
+                                     shape=shape)
+
+    store = TemporalGraphStore(*[arrays[name] for name in store_arrays])
+    embeddings = {
+        'embeddings': arrays['embeddings'],
+        'keys': arrays['keys']
+    }
+    return store, embeddings
+
+
+def convert_pickle(graph_file_path, graph_embeddings_path, path):
+    """Convert the pickled list of graphs and the embeddings into the binary
+    dataset format.
+
+        Keyword arguments:
+        graph_file_path -- path to the pickled graphs
+        graph_embeddings_path -- path to the pickled embeddings
+        path -- directory of the dataset
+    """
+    with open(graph_file_path, 'rb') as f:
+        graphs = pickle.load(f)
+    with open(graph_embeddings_path, 'rb') as f:
+        embeddings = pickle.load(f)
+    save_dataset(path, TemporalGraphStore.from_graphs(graphs), embeddings)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4:
+        print('Usage: python dataset.py <graphs.pkl> <embeddings.pkl> <out>')
+        sys.exit(1)
+    convert_pickle(*sys.argv[1:])
+    print('Dataset written to ' + sys.argv[3])
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+detail - level of detail of large summary graphs. The nodes of a summary
+         graph are ranked once - by degree or stratified over its communities
+         - and a reduced graph is a prefix of the ranking with the edges
+         between its nodes. An edge enters with the later of its two nodes,
+         so the reduced graphs of growing budgets are nested and a
+         refinement only adds nodes and edges.
+"""
+
+# Author: Eren Cakmak <eren.cakmak@uni-konstanz.de>
+#
+# License: MIT
+
+from collections import namedtuple
+
+import numpy as np
+import scipy.sparse as sp
+
+import communities
+
+methods = ['degree', 'stratified']
+
+# node budgets of the progressive tiers
+tier_nodes = [250, 1000, 4000, 16000]
+
+# reduction of a request - ranking method, node and edge budget (None for no
+# budget) and the number of nodes of the ranking the client already has
+Detail = namedtuple('Detail', ['method', 'max_nodes', 'max_edges', 'since'])
+
+
+def tier(method, level, since=0):
+    """Return the Detail of a progressive tier.
+
+        Keyword arguments:
+        method -- ranking method, see methods
+        level -- position of the tier in tier_nodes
+        since -- number of nodes of the ranking the client already has
+    """
+    if not 0 <= level < len(tier_nodes):
+        raise ValueError('Unknown detail tier: ' + str(level))
+    return Detail(method, tier_nodes[level], None, since)
+
+
+class Ranking:
+    def __init__(self, index, edges, entry):
+        """Initialize the ranking of a summary graph.
+
+            Keyword arguments:
+            index -- node indices of the store in rank order
+            edges -- edge positions of the store sorted by entry rank
+            entry -- sorted entry ranks of the edges - the larger rank of
+                     their nodes
+        """
+        self.index = index
+        self.edges = edges
+        self.entry = entry
+
+    def __len__(self):
+        return len(self.index)
+
+    def __repr__(self):
+        return 'Ranking: ' + str(len(self)) + ' nodes - ' + str(
+            len(self.edges)) + ' edges'
+
+    def size(self):
+        """Return the memory of the ranking in bytes
+        """
+        return self.index.nbytes + self.edges.nbytes + self.entry.nbytes
+
+    def prefix(self, max_nodes=None, max_edges=None):
+        """Return the number of ranked nodes of the largest reduced graph
+        within the budgets.
+
+            Keyword arguments:
+            max_nodes -- maximum number of nodes, None for no budget
+            max_edges -- maximum number of edges, None for no budget
+        """
+        size = len(self.index)
+        if max_nodes is not None:
+            size = min(size, max(int(max_nodes), 0))
+        if max_edges is not None and max(int(max_edges), 0) < len(self.entry):
+            # the edge max_edges enters with this node
+            size = min(size, int(self.entry[max(int(max_edges), 0)]))
+        return size
+
+    def reduce(self, size, since=0):
+        """Return the node indices and edge positions added to the reduced
+        graph of since nodes by the reduced graph of size nodes.
+
+            Keyword arguments:
+            size -- number of ranked nodes of the reduced graph
+            since -- number of ranked nodes of the previous reduced graph
+        """
+        since = min(since, size)
+        lo, hi = np.searchsorted(self.entry, [since, size])
+        return self.index[since:size], self.edges[lo:hi]
+
+    def tiers(self):
+        """Return the number of nodes of the progressive tiers
+        """
+        return sorted({self.prefix(n) for n in tier_nodes})
+
+
+def rank(store, index, edges, counts, method='degree'):
+    """Return the Ranking of the summary graph. degree ranks the nodes by
+    their degree and then by their occurences. stratified ranks the nodes by
+    their degree within their community and interleaves the communities
+    proportionally to their size, so every prefix keeps the community
+    structure.
+
+        Keyword arguments:
+        store -- TemporalGraphStore of the graphs
+        index -- sorted node indices of the summary graph
+        edges -- edge positions of the summary graph
+        counts -- number of time steps the nodes occur in
+        method -- ranking method, see methods
+    """
+    if not len(index):
+        return Ranking(index, edges, np.empty(0, dtype=np.int64))
+    u = np.searchsorted(index, store.edge_u[edges])
+    v = np.searchsorted(index, store.edge_v[edges])
+    loops = u == v
+    degree = np.bincount(u[~loops], minlength=len(index)) + np.bincount(
+        v[~loops], minlength=len(index))
+
+    if method == 'degree':
+        order = np.lexsort((-counts, -degree))
+    elif method == 'stratified':
+        A = sp.coo_matrix((np.ones(2 * np.count_nonzero(~loops)),
+                           (np.concatenate([u[~loops], v[~loops]]),
+                            np.concatenate([v[~loops], u[~loops]]))),
+                          shape=(len(index), len(index))).tocsr()
+        A.data[:] = 1
+        labels = communities.sort_labels(communities.label_propagation(A))
+        # position of the nodes by degree within their community
+        by_degree = np.lexsort((-counts, -degree, labels))
+        sizes = np.bincount(labels)
+        starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        within = np.empty(len(index), dtype=np.int64)
+        within[by_degree] = np.arange(len(index)) - np.repeat(starts, sizes)
+        # the quantile of the node in its community
+        quantile = (within + 0.5) / sizes[labels]
+        order = np.lexsort((-degree, quantile))
+    else:
+        raise ValueError('Unknown detail method: ' + str(method))
+
+    ranks = np.empty(len(index), dtype=np.int64)
+    ranks[order] = np.arange(len(index))
+    entry = np.maximum(ranks[u], ranks[v])
+    by_entry = np.argsort(entry, kind='stable')
+    return Ranking(index[order], edges[by_entry], entry[by_entry])
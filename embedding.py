@@ -0,0 +1,354 @@
+# -*- coding: utf-8 -*-
+"""
+embedding - embedding stage of the summary graphs of all snapshots of the
+            hierarchy. The summary graphs are generated in parallel from the
+            graph store. The embeddings of inductive models (wl, fgsd) are
+            cached per summary graph by its content hash - only new or
+            changed snapshots are embedded. The default model is Graph2Vec
+            like the notebook, it is fitted on all summary graphs.
+
+Embed the snapshots of a dataset with:
+
+    python embedding.py data/reddit --model graph2vec
+"""
+
+# Author: Eren Cakmak <eren.cakmak@uni-konstanz.de>
+#
+# License: MIT
+
+import os
+import math
+import hashlib
+import logging
+import argparse
+from multiprocessing import Pool
+
+import networkx as nx
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+num_summary_graphs = 3  # union, disjoint and intersection graph
+
+embedders = {}  # registered embedding models - name: (function, inductive)
+
+
+def register_embedder(name, inductive=True):
+    """Register an embedding model of a list of summary graphs. Inductive
+    models embed every graph on its own and are cached per graph, the others
+    are fitted on all graphs at once.
+
+        Keyword arguments:
+        name -- name of the model
+        inductive -- true if the embedding of a graph does not depend on the
+                     other graphs
+    """
+    def decorator(func):
+        embedders[name] = (func, inductive)
+        return func
+
+    return decorator
+
+
+def _mix(x):
+    """Return the splitmix64 hash of the uint64 array x
+    """
+    with np.errstate(over='ignore'):
+        x = x + np.uint64(0x9E3779B97F4A7C15)
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return x ^ (x >> np.uint64(31))
+
+
+@register_embedder('wl')
+def wl_embedding(graphs, dims=128, iterations=2):
+    """Return the Weisfeiler-Lehman embeddings of the graphs. The subtree
+    features of the nodes (starting with the degree like Graph2Vec) are
+    hashed into dims signed buckets and the vectors are normalized.
+
+        Keyword arguments:
+        graphs -- list of (number of nodes, edge_u, edge_v) summary graphs
+        dims -- dimensions of the embeddings
+        iterations -- number of Weisfeiler-Lehman iterations
+    """
+    vectors = np.zeros((len(graphs), dims))
+    for i, (n, u, v) in enumerate(graphs):
+        if not n:
+            continue
+        src = np.concatenate([u, v])
+        nbr = np.concatenate([v, u])
+        order = np.argsort(src, kind='stable')
+        src, nbr = src[order], nbr[order]
+        nodes, starts = np.unique(src, return_index=True)
+
+        labels = np.bincount(src, minlength=n).astype(np.uint64)
+        features = [labels]
+        for _ in range(iterations):
+            # the sum of the hashed neighbor labels is a multiset hash
+            agg = np.zeros(n, dtype=np.uint64)
+            if len(src):
+                agg[nodes] = np.add.reduceat(_mix(labels[nbr]), starts)
+            with np.errstate(over='ignore'):
+                labels = _mix(labels * np.uint64(31) + agg)
+            features.append(labels)
+
+        features = _mix(np.concatenate(features))
+        sign = np.where(features >> np.uint64(63), -1.0, 1.0)
+        vector = np.bincount((features % np.uint64(dims)).astype(np.int64),
+                             weights=sign,
+                             minlength=dims)
+        norm = np.linalg.norm(vector)
+        vectors[i] = vector / norm if norm else vector
+    return vectors
+
+
+def _karateclub(name, **params):
+    """Return the embedding function of a karateclub model
+    """
+    def embed(graphs):
+        try:
+            import karateclub
+        except ImportError:
+            raise ImportError('The ' + name + ' model requires karateclub')
+        model = getattr(karateclub, name)(**params)
+        model.fit([to_networkx(g) for g in graphs])
+        return model.get_embedding()
+
+    return embed
+
+
+register_embedder('fgsd')(_karateclub('FGSD', hist_bins=128))
+register_embedder('graph2vec', False)(_karateclub('Graph2Vec',
+                                                  workers=16,
+                                                  epochs=100))
+register_embedder('gl2vec', False)(_karateclub('GL2Vec', workers=16,
+                                               epochs=100))
+
+# model of the embeddings of the notebook - changing it changes the results
+# of the similarity search
+default_model = 'graph2vec'
+
+
+def to_networkx(graph):
+    """Return the summary graph as networkX graph with the nodes 0..n-1
+    """
+    n, u, v = graph
+    G = nx.Graph()
+    G.add_nodes_from(range(n))
+    G.add_edges_from(zip(u.tolist(), v.tolist()))
+    return G
+
+
+def level_bounds(length, level):
+    """Return the bounds of the snapshots of a level like Level.get_bounds
+    """
+    window_size = int(math.pow(2, (level - 1)))
+    overlap = int(window_size / 2)
+    if length > window_size:
+        return [(i, i + window_size) for i in range(0, length, overlap)]
+    return [(0, window_size)]
+
+
+def level_keys(length):
+    """Return the (level, num) keys of all snapshots of the hierarchy in the
+    order of the embeddings
+    """
+    keys = []
+    height = 1
+    window = 2
+    while window < length:
+        height = height + 1
+        window = int(math.pow(2, (height - 1)))
+        keys += [(height, num)
+                 for num in range(len(level_bounds(length, height)))]
+    return keys
+
+
+def summary_graphs(store, indx1, indx2, k=2):
+    """Return the union, disjoint and intersection graph of the time steps
+    [indx1, indx2) as (number of nodes, edge_u, edge_v) with the nodes
+    0..n-1 and the content hash of each graph.
+
+        Keyword arguments:
+        store -- TemporalGraphStore of the graphs
+        indx1 -- first time step
+        indx2 -- end of the time steps (exclusive)
+        k -- number of occurences of the disjoint graph (at most k) and the
+             intersection graph (at least k)
+    """
+    view = store.view(indx1, indx2)
+    index, counts = view.node_occurences()
+    edges = view.union_edges()
+    result = []
+    for select in [None, counts <= k, counts >= k]:
+        nodes = index if select is None else index[select]
+        positions = store.induced_edges(edges, nodes)
+        # nodes 0..n-1 in the order of the node table
+        u = np.searchsorted(nodes, store.edge_u[positions]).astype(np.int32)
+        v = np.searchsorted(nodes, store.edge_v[positions]).astype(np.int32)
+        pairs = np.unique(np.column_stack([np.minimum(u, v),
+                                           np.maximum(u, v)]),
+                          axis=0) if len(u) else np.empty((0, 2), np.int32)
+        h = hashlib.sha1()
+        h.update(np.ascontiguousarray(store.ids[nodes],
+                                      dtype=np.int64).tobytes())
+        h.update(np.ascontiguousarray(pairs, dtype=np.int32).tobytes())
+        result.append(((len(nodes), pairs[:, 0], pairs[:, 1]), h.hexdigest()))
+    return result
+
+
+# state of the worker processes
+_store = None
+_cache = None
+
+
+def _init_worker(store, cache):
+    global _store, _cache
+    _store = store
+    _cache = cache
+
+
+def _embed_task(args):
+    """Return the hashes and the embeddings of the summary graphs of the
+    snapshots of a task. Inductive models embed the graphs which are not
+    cached, otherwise the graphs are returned.
+    """
+    snapshots, model, k = args
+    func, inductive = embedders[model]
+    hashes = []
+    graphs = []
+    for indx1, indx2 in snapshots:
+        for graph, h in summary_graphs(_store, indx1, indx2, k):
+            hashes.append(h)
+            graphs.append(graph)
+    if not inductive:
+        return hashes, None, graphs
+
+    missing = [i for i, h in enumerate(hashes) if h not in _cache]
+    vectors = func([graphs[i] for i in missing]) if missing else []
+    return hashes, dict(zip([hashes[i] for i in missing], vectors)), None
+
+
+def load_embedding_cache(path):
+    """Return the cached embeddings of the summary graphs as dict of the
+    content hashes to the vectors
+    """
+    if not path or not os.path.exists(path):
+        return {}
+    with np.load(path) as f:
+        return dict(zip(f['hashes'].tolist(), f['vectors']))
+
+
+def save_embedding_cache(path, cache):
+    """Write the cached embeddings of the summary graphs
+    """
+    with open(path, 'wb') as f:
+        np.savez(f,
+                 hashes=np.array(list(cache), dtype=str),
+                 vectors=np.array(list(cache.values())))
+
+
+def embed_snapshots(store,
+                    model=default_model,
+                    k=2,
+                    processes=None,
+                    cache_path=None):
+    """Return the embeddings of the summary graphs of all snapshots of the
+    hierarchy with the keys 'level_num' - three per snapshot in the order
+    union, disjoint, intersection - as consumed by the Hierarchy.
+
+        Keyword arguments:
+        store -- TemporalGraphStore of the graphs
+        model -- name of the registered embedding model
+        k -- number of occurences of the disjoint and intersection graph
+        processes -- number of worker processes, os.cpu_count() if None
+        cache_path -- path of the embedding cache of the model (.npz), only
+                      inductive models are cached
+    """
+    func, inductive = embedders[model]
+    keys = level_keys(len(store))
+    bounds = {}
+    for level in sorted(set(level for level, _ in keys)):
+        bounds[level] = level_bounds(len(store), level)
+
+    cache = load_embedding_cache(cache_path) if inductive else {}
+    # tasks of similar size across all levels - the upper levels have few
+    # large snapshots
+    processes = processes or os.cpu_count()
+    tasks = []
+    for level, snapshots in bounds.items():
+        step = max(1, int(len(snapshots) / (4 * processes)))
+        for i in range(0, len(snapshots), step):
+            tasks.append(([(b[0], min(b[1], len(store)))
+                           for b in snapshots[i:i + step]], model, k))
+
+    if processes == 1 or len(tasks) < 2:
+        _init_worker(store, cache)
+        results = list(map(_embed_task, tasks))
+    else:
+        with Pool(processes, _init_worker, (store, cache)) as pool:
+            results = pool.map(_embed_task, tasks)
+
+    hashes = [h for r in results for h in r[0]]
+    if inductive:
+        computed = len(set().union(*[r[1] for r in results]))
+        for r in results:
+            cache.update(r[1])
+        vectors = np.array([cache[h] for h in hashes])
+        if cache_path:
+            save_embedding_cache(cache_path, cache)
+    else:
+        computed = len(hashes)
+        vectors = np.asarray(func([g for r in results for g in r[2]]))
+    logger.info('Embedded %d of %d summary graphs', computed, len(hashes))
+
+    return {
+        'embeddings':
+        vectors,
+        'keys': [
+            str(level) + '_' + str(num) for level, num in keys
+            for _ in range(num_summary_graphs)
+        ]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Embed the summary graphs of all snapshots of a dataset '
+        'in the binary dataset format.')
+    parser.add_argument('dataset', help='directory of the dataset')
+    parser.add_argument('--model',
+                        choices=sorted(embedders),
+                        default=default_model,
+                        help='embedding model, only wl and fgsd are cached')
+    parser.add_argument('--k',
+                        type=int,
+                        default=2,
+                        help='occurences of the disjoint and intersection '
+                        'graphs')
+    parser.add_argument('--processes',
+                        type=int,
+                        default=None,
+                        help='number of worker processes')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    from dataset import open_dataset, save_embeddings
+    store, _ = open_dataset(args.dataset)
+    embeddings = embed_snapshots(store, args.model, args.k, args.processes,
+                                 embedding_cache_path(args.dataset, args.model))
+    save_embeddings(args.dataset, embeddings)
+    logger.info('Embeddings written to %s', args.dataset)
+
+
+def embedding_cache_path(path, model):
+    """Return the path of the embedding cache of the model next to the
+    dataset or graph file path
+    """
+    return os.path.join(
+        os.path.dirname(path.rstrip('/')) or '.',
+        'embeddings_' + model + '.npz')
+
+
+if __name__ == "__main__":
+    main()
@@ -77,9 +77,13 @@ export class Cell {
     // first time data loading
     // load the data and draw
     if (typeof this._data === 'undefined') {
-      getGraphData(this._level, this._position, this._graphType).then(function(
+      getGraphData(this._level, this._position, this._graphType, function(
         data
       ) {
+        // refined level of detail
+        that._data = data;
+        that.redraw();
+      }).then(function(data) {
         that._data = data;
         if (Object.keys(that._data).length === 0) {
           that.redraw();
@@ -154,9 +158,17 @@ export class Cell {
       } else if (this._visualization === 'animation') {
         //  get the animation data as an array of graphs
         if (typeof this._animationData === 'undefined') {
-          getAnimationData(this._level, this._position).then(function(data) {
+          // start the animation with the first graph of the stream
+          getAnimationData(this._level, this._position, function(data) {
             that._animationData = data;
             that.drawAnimation();
+          }).then(function(data) {
+            that._animationData = data;
+            if (data.length && that._visualization === 'animation') {
+              // redraw the time slider with the range of all graphs
+              that._g.select('#time-slider').remove();
+              that.drawAnimation();
+            }
           });
         } else {
           this.drawAnimation();
@@ -16,6 +16,19 @@ const url = 'http://127.0.0.1:8000/';
 const JSONAPI_MIMETYPE = 'application/vnd.api+json';
 
 let clusterBool = false;
+// token of the node filter of the backend - null if no filter is set
+let filterToken = null;
+
+// response format of the batched graphs - columnar or node_link json
+const graphFormat = 'columnar';
+
+// ranking method of the level of detail of the not clustered graphs - the
+// graphs are loaded as a coarse tier first and refined tier by tier
+const detailMethod = 'degree';
+const detailTiers = 4;
+
+// graph requests and existence checks of the same tick are sent as a batch
+let pendingRequests = [];
 
 /**
  * Load the dynamic graph data
@@ -47,24 +60,79 @@ export function loadMetaData() {
  * @param  {Number} level Level of snapshot
  * @param  {Number} pos Positions of the snapshot
  * @param  {String} graphType Graph type
- * @return {Promise} Return promise
+ * @param  {Function} onRefine Called with the refined graph after each
+ * further tier of the level of detail
+ * @return {Promise} Return promise of the first tier
  */
-export function getGraphData(level, pos, graphType) {
+export function getGraphData(level, pos, graphType, onRefine) {
   // show spinner again
   $(selSpinner).show();
-  const tmpURL =
-    url +
-    'graph?level=' +
-    level +
-    '&num=' +
-    pos +
-    '&graph_type=' +
-    graphType +
-    '&k=' +
-    Math.pow(2, level - 1) +
-    '&cluster=' +
-    clusterBool;
-  return d3.json(tmpURL);
+  const request = {
+    level: level,
+    num: pos,
+    graph_type: graphType,
+    k: Math.pow(2, level - 1),
+    cluster: clusterBool,
+  };
+  if (!clusterBool) {
+    request['detail'] = detailMethod;
+    request['tier'] = 0;
+  }
+  return batchRequest(request).then(function(result) {
+    const graph = result['graph'] ? decodeGraph(result['graph']) : {};
+    if (onRefine && !clusterBool) {
+      refineGraph(request, graph, 1, onRefine);
+    }
+    return graph;
+  });
+}
+
+/**
+ * Load the next tiers of the level of detail and merge them into the graph
+ * @param  {Object} request batched request of the graph
+ * @param  {Object} graph graph in the node-link format
+ * @param  {Number} tier Next tier
+ * @param  {Function} onRefine Called with the refined graph
+ */
+function refineGraph(request, graph, tier, onRefine) {
+  const detail = graph['graph'] ? graph['graph']['detail'] : undefined;
+  if (
+    !detail ||
+    tier >= detailTiers ||
+    detail['nodes'] >= detail['total_nodes']
+  ) {
+    return;
+  }
+  batchRequest(
+    Object.assign({}, request, { tier: tier, since: detail['nodes'] })
+  ).then(function(result) {
+    if (!result['graph']) {
+      return;
+    }
+    const refined = mergeGraph(graph, decodeGraph(result['graph']));
+    onRefine(refined);
+    refineGraph(request, refined, tier + 1, onRefine);
+  });
+}
+
+/**
+ * Return the graph with the nodes and links of a refinement
+ * @param  {Object} graph graph in the node-link format
+ * @param  {Object} refinement added nodes and links in the node-link format
+ * @return {Object} merged graph in the node-link format
+ */
+function mergeGraph(graph, refinement) {
+  const nodes = new Map();
+  graph['nodes'].concat(refinement['nodes']).forEach(function(n) {
+    nodes.set(n['id'], n);
+  });
+  return {
+    directed: false,
+    multigraph: false,
+    graph: refinement['graph'],
+    nodes: Array.from(nodes.values()),
+    links: graph['links'].concat(refinement['links']),
+  };
 }
 
 /**
@@ -74,17 +142,110 @@ export function getGraphData(level, pos, graphType) {
  * @return {Promise} Return promise
  */
 export function checkGraphData(level, pos) {
-  const tmpURL = url + 'check_graph?level=' + level + '&num=' + pos;
-  return d3.json(tmpURL);
+  return batchRequest({ level: level, num: pos }).then(function(result) {
+    return Boolean(result['exists']);
+  });
+}
+
+/**
+ * Add a request to the batch of the current tick
+ * @param  {Object} request level, num and optional graph_type, k and cluster
+ * @return {Promise} Return promise of the result of the request
+ */
+function batchRequest(request) {
+  return new Promise(function(resolve, reject) {
+    pendingRequests.push({
+      request: request,
+      resolve: resolve,
+      reject: reject,
+    });
+    if (pendingRequests.length === 1) {
+      setTimeout(sendBatch, 0);
+    }
+  });
+}
+
+/**
+ * Send the pending requests as one batch. The results are streamed and
+ * resolved as they complete.
+ */
+function sendBatch() {
+  const batch = pendingRequests;
+  pendingRequests = [];
+  fetch(url + 'graphs', {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({
+      requests: batch.map(function(b) {
+        return b.request;
+      }),
+      format: graphFormat,
+      filter: filterToken,
+      stream: true,
+    }),
+  })
+    .then(function(response) {
+      return readLines(response, function(result) {
+        batch[result['index']].resolve(result);
+      });
+    })
+    .then(function() {
+      // requests without a result
+      batch.forEach(function(b) {
+        b.resolve({});
+      });
+    })
+    .catch(function(error) {
+      batch.forEach(function(b) {
+        b.reject(error);
+      });
+    });
+}
+
+/**
+ * Read a newline delimited json response
+ * @param  {Response} response fetch response
+ * @param  {Function} onLine Called with every parsed line
+ * @return {Promise} Return promise resolved at the end of the response
+ */
+function readLines(response, onLine) {
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+
+  const parse = function(text) {
+    buffer += text;
+    const lines = buffer.split('\n');
+    buffer = lines.pop();
+    lines.forEach(function(line) {
+      if (line.length) {
+        onLine(JSON.parse(line));
+      }
+    });
+  };
+
+  const read = function() {
+    return reader.read().then(function(chunk) {
+      if (chunk.done) {
+        parse(decoder.decode() + '\n');
+        return;
+      }
+      parse(decoder.decode(chunk.value, { stream: true }));
+      return read();
+    });
+  };
+  return read();
 }
 
 /**
  * Get the time series data between the two
  * @param {String} start first date
  * @param {End} end end date
+ * @param {Number} maxPoints maximum number of points, longer ranges are
+ * downsampled to the min, max and mean per window
  * @return {Promise} promise to get the data
  */
-export function getTimeSeries(start, end) {
+export function getTimeSeries(start, end, maxPoints) {
   return $.ajax({
     url: url + 'timeseries',
     type: 'GET',
@@ -96,23 +257,30 @@ export function getTimeSeries(start, end) {
     data: {
       start_dateTime: start,
       end_dateTime: end,
+      max_points: maxPoints,
     },
   });
 }
 
 /**
- * Get the nodes with ids
- * @return {Promise} Return promise
+ * Search the nodes by name - ranked by the number of time steps they occur in
+ * @param  {String} query Substring of the node names, empty for all nodes
+ * @param  {Number} limit Maximum number of nodes
+ * @return {Promise} Return promise of the total and the page of nodes
  */
-export function getNodes() {
+export function searchNodes(query, limit) {
   return $.ajax({
-    url: url + 'get_all_nodes',
+    url: url + 'search_nodes',
     type: 'GET',
     dataType: 'json',
     contentType: 'application/json; charset=utf-8',
     headers: {
       Accept: JSONAPI_MIMETYPE,
     },
+    data: {
+      q: query,
+      limit: limit,
+    },
   });
 }
 
@@ -140,6 +308,14 @@ export function searchAllLevels(embeddings, levels, k) {
   });
 }
 
+/**
+ * Return the filter url parameter of the current node filter
+ * @return {String} url parameter or empty string
+ */
+function filterParam() {
+  return filterToken ? '&filter=' + filterToken : '';
+}
+
 /**
  * Set the selected nodes needed for filtering
  * @param  {Array} ids    String Array of ids
@@ -154,23 +330,99 @@ export function setFilteredNodes(ids) {
       Accept: JSONAPI_MIMETYPE,
     },
     data: JSON.stringify(ids),
-    success: function() {
+    success: function(data) {
+      filterToken = data.filter;
       updateHierarchyData();
     },
   });
 }
 
 /**
- * Returns a list of graphs
+ * Returns a list of graphs. The graphs are streamed as the first graph and
+ * the changes of the following graphs.
  * @param  {Number} level Level of snapshot
  * @param  {Number} pos Positions of the snapshot
- * @return {Promise} Return promise
+ * @param  {Function} onFrame Called with the list of graphs after the first
+ * graph arrived - the list grows while the stream is read
+ * @return {Promise} Return promise of the complete list of graphs
  */
-export function getAnimationData(level, pos) {
+export function getAnimationData(level, pos, onFrame) {
   // show spinner again
   $(selSpinner).show();
-  const tmpURL = url + 'animation_data?level=' + level + '&num=' + pos;
-  return d3.json(tmpURL);
+  const tmpURL =
+    url + 'animation_stream?level=' + level + '&num=' + pos + filterParam();
+  const frames = [];
+  const state = { nodes: new Map(), links: new Map() };
+
+  return fetch(tmpURL)
+    .then(function(response) {
+      return readLines(response, function(frame) {
+        frames.push(applyFrame(state, frame));
+        if (frames.length === 1 && onFrame) {
+          onFrame(frames);
+        }
+      });
+    })
+    .then(function() {
+      return frames;
+    });
+}
+
+/**
+ * Return the key of an undirected link
+ * @param  {Number} source Source node id
+ * @param  {Number} target Target node id
+ * @return {String} key
+ */
+function linkKey(source, target) {
+  return source < target ? source + '-' + target : target + '-' + source;
+}
+
+/**
+ * Apply a streamed frame to the current nodes and links and return the graph
+ * @param  {Object} state Maps of the current nodes and links
+ * @param  {Object} frame Full graph or the changes to the previous graph
+ * @return {Object} graph in the node-link format
+ */
+function applyFrame(state, frame) {
+  let graph;
+  if (frame['type'] === 'frame') {
+    graph = frame['graph'];
+    state.nodes.clear();
+    state.links.clear();
+    graph['nodes'].forEach(function(n) {
+      state.nodes.set(n['id'], n);
+    });
+    graph['links'].forEach(function(l) {
+      state.links.set(linkKey(l['source'], l['target']), l);
+    });
+  } else {
+    graph = { time: frame['time'] };
+    frame['nodes_removed'].forEach(function(id) {
+      state.nodes.delete(id);
+    });
+    frame['nodes_added'].forEach(function(n) {
+      state.nodes.set(n['id'], n);
+    });
+    frame['links_removed'].forEach(function(l) {
+      state.links.delete(linkKey(l[0], l[1]));
+    });
+    frame['links_added'].forEach(function(l) {
+      state.links.set(linkKey(l['source'], l['target']), l);
+    });
+  }
+  // copies - the drawing modifies the node and link objects
+  return {
+    directed: false,
+    multigraph: false,
+    graph: frame['type'] === 'frame' ? graph['graph'] : graph,
+    nodes: Array.from(state.nodes.values(), function(n) {
+      return Object.assign({}, n);
+    }),
+    links: Array.from(state.links.values(), function(l) {
+      return Object.assign({}, l);
+    }),
+  };
 }
 
 /**
@@ -195,6 +447,61 @@ export function searchIntervalTree(start, end) {
   });
 }
 
+/**
+ * DECODING OF THE GRAPH FORMATS
+ */
+
+/**
+ * Convert the columns of a columnar graph to an array of objects
+ * @param  {Object} columns Object of parallel arrays
+ * @param  {Array} dates names of the columns in seconds since epoch
+ * @return {Array} Array of objects
+ */
+function columnsToObjects(columns, dates) {
+  const keys = Object.keys(columns);
+  const length = keys.length ? columns[keys[0]].length : 0;
+  const objects = [];
+  for (let i = 0; i < length; i++) {
+    const d = {};
+    keys.forEach(function(key) {
+      const value = columns[key][i];
+      if (value === null || typeof value === 'undefined') {
+        return;
+      }
+      d[key] = dates.includes(key)
+        ? new Date(value * 1000).toUTCString()
+        : value;
+    });
+    objects.push(d);
+  }
+  return objects;
+}
+
+/**
+ * Decode a columnar graph into the node-link format
+ * @param  {Object} data columnar graph
+ * @return {Object} graph in the node-link format
+ */
+export function decodeGraph(data) {
+  if (!data || data['format'] !== 'columnar') {
+    return data;
+  }
+  const nodes = columnsToObjects(data['nodes'], data['dates']['nodes']);
+  const links = columnsToObjects(data['links'], data['dates']['links']);
+  // edges reference the nodes by index
+  links.forEach(function(l) {
+    l['source'] = nodes[l['source']]['id'];
+    l['target'] = nodes[l['target']]['id'];
+  });
+  return {
+    directed: false,
+    multigraph: false,
+    graph: data['graph'],
+    nodes: nodes,
+    links: links,
+  };
+}
+
 /**
  * SETTER AND GETTER
  */
@@ -7,7 +7,7 @@
  */
 
 import {
-  getNodes,
+  searchNodes,
   setFilteredNodes,
   setClusterBool,
   searchIntervalTree,
@@ -26,6 +26,9 @@ import {
 import { drwaQueryPlot } from './query_plot.js';
 
 let filteredNodes = [];
+// number of nodes of a node search shown in the nodes filter
+const nodeSearchLimit = 100;
+let nodeSearchTimer = null;
 
 /**
  * Initilaize the responsive SVGs in the overview and details div
@@ -127,26 +130,25 @@ export function initToolbar() {
     const sel = $(this).attr('graph-type');
     changeGraphType(sel);
   });
-  // get the promise for the nodes
-  getNodes().then(function(nodes) {
-    const nodesOptions = nodes
-      .map(function(d) {
-        return '<option id="' + d[0] + '">' + d[1] + '</option>';
-      })
-      .join();
-    // update the filter in the toolbar
-    $('#nodes-filter')
-      .append(nodesOptions)
-      .selectpicker('refresh')
-      .selectpicker('selectAll');
+  // the options of the nodes filter are the selected nodes and the results
+  // of the node search of the backend
+  _searchNodes('');
+  $('#nodes-filter')
+    .parent()
+    .on('input', '.bs-searchbox input', function() {
+      const query = $(this).val();
+      clearTimeout(nodeSearchTimer);
+      nodeSearchTimer = setTimeout(function() {
+        _searchNodes(query);
+      }, 150);
+    });
 
-    /**
-     * On click listener for the nodes filter option
-     */
-    $('#nodes-filter').on('change', function() {
-      filteredNodes = $.map($(this).find('option:selected'), function(o) {
-        return o['id'];
-      });
+  /**
+   * On click listener for the nodes filter option
+   */
+  $('#nodes-filter').on('change', function() {
+    filteredNodes = $.map($(this).find('option:selected'), function(o) {
+      return o['id'];
     });
   });
   // submit button for filtering
@@ -211,24 +213,56 @@ export function initToolbar() {
   });
 }
 
+/**
+ * Replace the not selected options of the nodes filter with the nodes
+ * matching the query
+ * @param {String} query Substring of the node names
+ */
+function _searchNodes(query) {
+  searchNodes(query, nodeSearchLimit).then(function(data) {
+    const sel = $('#nodes-filter');
+    sel.find('option:not(:selected)').remove();
+    const selected = new Set(
+      $.map(sel.find('option'), function(o) {
+        return o['id'];
+      })
+    );
+    data['nodes'].forEach(function(d) {
+      if (!selected.has(String(d['id']))) {
+        sel.append(
+          $('<option>')
+            .attr('id', d['id'])
+            .text(d['name'])
+        );
+      }
+    });
+    sel.selectpicker('refresh');
+  });
+}
+
 /**
  * Filter the node in the nodes filter bar
- * @param {selector} node node
+ * @param {Number|Array} nodeId id or ids of the node
+ * @param {String|Array} nodeName name or names of the node
  */
-export function filterNode(nodeName) {
+export function filterNode(nodeId, nodeName) {
   const sel = $('#nodes-filter');
-  // reset if all selected
-  if (!sel.find('option:not(:selected)').length) {
-    sel.selectpicker('deselectAll');
-  }
-  // get selected values and add the clicked node to it
-  let selVals = sel.selectpicker('val');
-  if (Array.isArray(nodeName)) {
-    selVals = selVals.concat(nodeName);
-  } else {
-    selVals.push(nodeName);
-  }
-  sel.selectpicker('val', selVals).selectpicker('refresh');
+  const ids = [].concat(nodeId);
+  const names = [].concat(nodeName);
+  // select the clicked nodes - add them if they are not in the options
+  ids.forEach(function(id, i) {
+    let option = sel.find('option').filter(function() {
+      return this.id === String(id);
+    });
+    if (!option.length) {
+      option = $('<option>')
+        .attr('id', id)
+        .text(i < names.length ? names[i] : id);
+      sel.append(option);
+    }
+    option.prop('selected', true);
+  });
+  sel.selectpicker('refresh');
 
   // change the filtered data
   filteredNodes = $.map(sel.find('option:selected'), function(o) {
@@ -166,7 +166,7 @@ export function drawAnimation() {
     .on('mouseover', nodeMouseOver)
     .on('mouseout', nodeMouseOut)
     .on('click', function(d) {
-      filterNode(d['name']);
+      filterNode(d['is_cluster'] ? d['ids'] : d['id'], d['name']);
     })
     .call(
       d3
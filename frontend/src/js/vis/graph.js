@@ -161,7 +161,7 @@ export function drawStaticGraph() {
     .on('mouseover', nodeMouseOver)
     .on('mouseout', nodeMouseOut)
     .on('click', function(d) {
-      filterNode(d['name']);
+      filterNode(d['is_cluster'] ? d['ids'] : d['id'], d['name']);
     })
     .call(
       d3
@@ -49,7 +49,9 @@ export function drawTimeline() {
   let maxValue = 1;
   const lineData = [];
 
-  let promise = getTimeSeries(this._start, this._end);
+  // at most one point per pixel - long ranges are downsampled to min, max
+  // and mean per window
+  let promise = getTimeSeries(this._start, this._end, Math.round(width));
 
   promise.then(function(data) {
     that._removeAll();
@@ -60,11 +62,14 @@ export function drawTimeline() {
         values: [],
       });
       data.forEach(function(d) {
+        const high = key + '_max' in d ? d[key + '_max'] : d[key];
         lineData[i]['values'].push({
           date: dateTime(d['date']),
           value: d[key],
+          min: key + '_min' in d ? d[key + '_min'] : d[key],
+          max: high,
         });
-        maxValue = maxValue > d[key] ? maxValue : d[key];
+        maxValue = maxValue > high ? maxValue : high;
       });
     });
 
@@ -173,6 +178,20 @@ export function drawTimeline() {
       })
       .curve(d3.curveLinear);
 
+    // min max band of the downsampled windows
+    const band = d3
+      .area()
+      .x(function(d) {
+        return xScale(d['date']);
+      })
+      .y0(function(d) {
+        return yScale(d['min']);
+      })
+      .y1(function(d) {
+        return yScale(d['max']);
+      })
+      .curve(d3.curveLinear);
+
     const series = g
       .selectAll('.line-g')
       .data(lineData)
@@ -180,6 +199,17 @@ export function drawTimeline() {
       .append('g')
       .attr('class', 'line-g');
 
+    series
+      .append('path')
+      .attr('class', 'line-chart-band')
+      .attr('fill', function(d) {
+        return color(d['key']);
+      })
+      .attr('opacity', 0.2)
+      .attr('d', function(d) {
+        return band(d['values']);
+      });
+
     series
       .append('path')
       .attr('class', 'line-chart-line')
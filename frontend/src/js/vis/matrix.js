@@ -53,6 +53,8 @@ export function drawMatrix() {
 
   // as the links do not have the coordinates of ndoes
   let nodeNames = {};
+  // ids of the nodes of a cluster for the nodes filter
+  let nodeIds = {};
   this._data['nodes'].forEach(function(d) {
     // check if clustered
     if (clusterBool) {
@@ -61,6 +63,7 @@ export function drawMatrix() {
         : d['name'];
     }
     nodeNames[d['id']] = d['name'];
+    nodeIds[d['id']] = d['is_cluster'] ? d['ids'] : d['id'];
   });
 
   // get the layout of columns and rows
@@ -228,8 +231,8 @@ export function drawMatrix() {
     .on('mouseover', nodeMouseOver)
     .on('mouseout', nodeMouseOut)
     .on('click', function(d) {
-      filterNode(d['sourceName']);
-      filterNode(d['targetName']);
+      filterNode(nodeIds[d['source']], d['sourceName']);
+      filterNode(nodeIds[d['target']], d['targetName']);
     })
     .transition()
     .delay(function(d, i) {
@@ -0,0 +1,347 @@
+# -*- coding: utf-8 -*-
+"""
+instrument - timing of the model phases per request, latency histograms of
+             the routes in the Prometheus text format and profiles of slow
+             requests
+"""
+
+# Author: Eren Cakmak <eren.cakmak@uni-konstanz.de>
+#
+# License: MIT
+
+import os
+import re
+import time
+import pstats
+import cProfile
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# upper bounds of the latency histogram buckets in seconds
+buckets = [
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+    30
+]
+
+# requests slower than profile_threshold seconds are profiled to
+# profile_dir - None to disable profiling
+profile_threshold = None
+profile_dir = 'profiles'
+
+_local = threading.local()  # phases of the request of the thread
+
+
+class Histogram:
+    def __init__(self, bounds):
+        """Initialize a histogram with cumulative buckets.
+
+            Keyword arguments:
+            bounds -- sorted upper bounds of the buckets
+        """
+        self.bounds = bounds
+        self.counts = [0] * len(bounds)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        """Add a value to the histogram
+        """
+        for i, bound in enumerate(self.bounds):
+            if value <= bound:
+                self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+
+
+class Registry:
+    def __init__(self):
+        """Initialize the registry of the request latencies and the phase
+        durations.
+        """
+        self.latency = {}  # (endpoint, status): Histogram
+        self.phases = {}  # (endpoint, phase): Histogram
+        self.profiles = 0
+        self.lock = threading.Lock()
+
+    def observe(self, endpoint, status, duration, phases):
+        """Add the duration and the phase durations of a request.
+
+            Keyword arguments:
+            endpoint -- name of the route
+            status -- status code of the response
+            duration -- duration of the request in seconds
+            phases -- list of (phase, duration) of the request
+        """
+        with self.lock:
+            self.latency.setdefault((endpoint, str(status)),
+                                    Histogram(buckets)).observe(duration)
+            for name, d in phases:
+                self.phases.setdefault((endpoint, name),
+                                       Histogram(buckets)).observe(d)
+
+    def exposition(self, gauges=()):
+        """Return the metrics in the Prometheus text format.
+
+            Keyword arguments:
+            gauges -- list of (name, help, [(labels, value)]) of the gauges
+        """
+        lines = []
+        with self.lock:
+            histograms = [
+                ('msnap_request_duration_seconds',
+                 'Duration of the requests by route and status',
+                 [({
+                     'endpoint': endpoint,
+                     'status': status
+                 }, h) for (endpoint, status), h in sorted(self.latency.items())
+                  ]),
+                ('msnap_phase_duration_seconds',
+                 'Duration of the model phases of the requests by route',
+                 [({
+                     'endpoint': endpoint,
+                     'phase': name
+                 }, h) for (endpoint, name), h in sorted(self.phases.items())])
+            ]
+            for name, help_text, series in histograms:
+                lines += [
+                    '# HELP ' + name + ' ' + help_text,
+                    '# TYPE ' + name + ' histogram'
+                ]
+                for labels, h in series:
+                    for bound, count in zip(h.bounds, h.counts):
+                        lines.append(name + '_bucket' +
+                                     _labels(dict(labels, le=repr(bound))) +
+                                     ' ' + str(count))
+                    lines.append(name + '_bucket' +
+                                 _labels(dict(labels, le='+Inf')) + ' ' +
+                                 str(h.count))
+                    lines.append(name + '_sum' + _labels(labels) + ' ' +
+                                 repr(h.sum))
+                    lines.append(name + '_count' + _labels(labels) + ' ' +
+                                 str(h.count))
+            lines += [
+                '# HELP msnap_profiles_total Profiles of slow requests',
+                '# TYPE msnap_profiles_total counter',
+                'msnap_profiles_total ' + str(self.profiles)
+            ]
+
+        for name, help_text, series in gauges:
+            lines += [
+                '# HELP ' + name + ' ' + help_text, '# TYPE ' + name + ' gauge'
+            ]
+            for labels, value in series:
+                lines.append(name + _labels(labels) + ' ' + repr(float(value)))
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def _labels(labels):
+    """Return the Prometheus label set of the dict
+    """
+    if not labels:
+        return ''
+    return '{' + ','.join(
+        key + '="' + str(value).replace('\\', '\\\\').replace('"', '\\"') +
+        '"' for key, value in labels.items()) + '}'
+
+
+def configure_profiling(threshold=None, directory='profiles'):
+    """Configure the profiling of slow requests.
+
+        Keyword arguments:
+        threshold -- minimum duration of a profiled request in seconds, None
+                     to disable profiling
+        directory -- directory of the profiles
+    """
+    global profile_threshold, profile_dir
+    profile_threshold = threshold
+    profile_dir = directory
+
+
+def start_request():
+    """Start the timing (and profiling) of the request of the thread
+    """
+    _local.phases = []
+    _local.start = time.perf_counter()
+    _local.profile = None
+    if profile_threshold is not None:
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+            _local.profile = profile
+        except ValueError:
+            # another profiler is active
+            pass
+
+
+def end_request(endpoint, status, state=None):
+    """End the timing of the request of the thread. Returns the list of
+    (phase, duration) and the total duration in seconds. The profile of a
+    slow request is written to the profile directory.
+
+        Keyword arguments:
+        endpoint -- name of the route
+        status -- status code of the response
+        state -- timing state of a detached request (see detach_request),
+                 the request of the thread if None
+    """
+    if state is None:
+        state = detach_request()
+    phases, start, profile = state
+    if phases is None:
+        return [], 0.0
+    duration = time.perf_counter() - start
+
+    if profile is not None:
+        profile.disable()
+        if duration >= profile_threshold:
+            dump_profile(profile, endpoint, duration)
+    registry.observe(endpoint, status, duration, list(phases))
+    return phases, duration
+
+
+def detach_request():
+    """Return the timing state (phases, start, profile) of the request of
+    the thread and stop recording its phases in the thread - the body of a
+    streamed response is produced after the request handler returned
+    """
+    state = (getattr(_local, 'phases', None), getattr(_local, 'start', None),
+             getattr(_local, 'profile', None))
+    _local.phases = None
+    _local.profile = None
+    return state
+
+
+def request_phases():
+    """Return the list of the phases of the request of the thread or None
+    outside of requests - to be attached in other threads
+    """
+    return getattr(_local, 'phases', None)
+
+
+@contextmanager
+def attached(phases):
+    """Record the phases of the thread into the phases of a request, e.g. in
+    a worker thread of the request.
+
+        Keyword arguments:
+        phases -- list of the phases of the request (see request_phases),
+                  nothing is recorded if None
+    """
+    previous = getattr(_local, 'phases', None)
+    _local.phases = phases
+    try:
+        yield
+    finally:
+        _local.phases = previous
+
+
+def record(phases):
+    """Add the phases measured in another process to the request of the
+    thread.
+
+        Keyword arguments:
+        phases -- list of (phase, duration)
+    """
+    current = getattr(_local, 'phases', None)
+    if current is not None:
+        current.extend(phases)
+
+
+def stream(items, phases, name='stream'):
+    """Yield the items of a streamed response body and record their phases
+    into the phases of the request. The time spent producing the items -
+    without the time the client takes to receive them - is recorded as the
+    phase name when the stream is closed.
+
+        Keyword arguments:
+        items -- iterable of the response body
+        phases -- list of the phases of the request (see request_phases)
+        name -- name of the phase of the whole stream
+    """
+    items = iter(items)
+    duration = 0.0
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                with attached(phases):
+                    item = next(items)
+            except StopIteration:
+                return
+            finally:
+                duration += time.perf_counter() - start
+            yield item
+    finally:
+        # close the body early if the client is gone
+        close = getattr(items, 'close', None)
+        if close is not None:
+            close()
+        if phases is not None:
+            phases.append((name, duration))
+
+
+def abandon_request():
+    """Stop the timing (and profiling) of the request of the thread without
+    recording it - e.g. in a process forked from a request thread
+    """
+    profile = getattr(_local, 'profile', None)
+    if profile is not None:
+        profile.disable()
+    _local.phases = None
+    _local.profile = None
+
+
+def dump_profile(profile, endpoint, duration):
+    """Write the profile of a slow request to the profile directory
+    """
+    os.makedirs(profile_dir, exist_ok=True)
+    path = os.path.join(
+        profile_dir, '{}_{}_{}ms.prof'.format(
+            time.strftime('%Y%m%d-%H%M%S'), re.sub(r'\W', '_', endpoint),
+            int(1000 * duration)))
+    pstats.Stats(profile).dump_stats(path)
+    with registry.lock:
+        registry.profiles += 1
+    logger.info('Profile of slow request %s (%.0fms) written to %s', endpoint,
+                1000 * duration, path)
+
+
+@contextmanager
+def phase(name):
+    """Time a phase of the request of the thread. Nested phases are counted
+    in their parent phases too. Outside of requests nothing is recorded.
+
+        Keyword arguments:
+        name -- name of the phase
+    """
+    phases = getattr(_local, 'phases', None)
+    if phases is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases.append((name, time.perf_counter() - start))
+
+
+def server_timing(phases, duration):
+    """Return the Server-Timing header value of the phases. The durations of
+    repeated phases are summed.
+
+        Keyword arguments:
+        phases -- list of (phase, duration in seconds)
+        duration -- total duration in seconds
+    """
+    totals = {}
+    for name, d in phases:
+        totals[name] = totals.get(name, 0.0) + d
+    totals['total'] = duration
+    return ', '.join('{};dur={:.2f}'.format(name, 1000 * d)
+                     for name, d in totals.items())
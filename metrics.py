@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+"""
+metrics - precomputed columnar table of the graph metrics per time step and
+          the sparse matrix metrics engine of single graphs
+"""
+
+# Author: Eren Cakmak <eren.cakmak@uni-konstanz.de>
+#
+# License: MIT
+
+import os
+from multiprocessing import Pool
+
+import networkx as nx
+import numpy as np
+import scipy.sparse as sp
+
+# registered graph metrics - name: (function, dtype, sparse)
+graph_metrics = {}
+
+
+class GraphMetrics:
+    def __init__(self, G):
+        """Initialize the metrics engine of the graph. The adjacency matrix
+        is built once as a CSR matrix in the node order of G and all metrics
+        are computed with sparse matrix operations. The results equal the
+        networkX implementations.
+
+            Keyword arguments:
+            G -- undirected networkX graph
+        """
+        self.graph = G
+        self.nodes = list(G)
+        n = len(self.nodes)
+        position = {x: i for i, x in enumerate(self.nodes)}
+        m = G.number_of_edges()
+        edges = np.fromiter((position[x] for e in G.edges() for x in e),
+                            dtype=np.int64,
+                            count=2 * m).reshape(-1, 2)
+        u, v = edges[:, 0], edges[:, 1]
+        loops = u == v
+        self.number_of_edges = m
+        self.self_loops = np.bincount(u[loops], minlength=n)
+
+        # symmetric 0/1 adjacency without self loops - parallel edges of
+        # multigraphs are merged
+        u, v = u[~loops], v[~loops]
+        A = sp.csr_matrix((np.ones(2 * len(u), dtype=np.int64),
+                           (np.concatenate([u, v]), np.concatenate([v, u]))),
+                          shape=(n, n))
+        A.data[:] = 1
+        self.adjacency = A
+
+        self._triangles = None
+
+    def __repr__(self):
+        return 'GraphMetrics(nodes={}, edges={})'.format(
+            len(self.nodes), self.number_of_edges)
+
+    @property
+    def neighbors(self):
+        """Return the number of distinct neighbors of the nodes without the
+        node itself
+        """
+        return np.diff(self.adjacency.indptr)
+
+    @property
+    def triangles(self):
+        """Return the number of triangles of the nodes - diag(A^3) / 2
+        """
+        if self._triangles is None:
+            A = self.adjacency
+            self._triangles = np.asarray(
+                (A @ A).multiply(A).sum(axis=1)).ravel() // 2
+        return self._triangles
+
+    def degree(self):
+        """Return the degrees of the nodes, self loops count twice
+        """
+        A = self.adjacency
+        if A.nnz + 2 * self.self_loops.sum() == 2 * self.number_of_edges:
+            return self.neighbors + 2 * self.self_loops
+        # parallel edges of multigraphs count once per edge
+        return np.array([d for _, d in self.graph.degree()], dtype=np.int64)
+
+    def density(self):
+        """Return the density of the graph
+        """
+        n = len(self.nodes)
+        m = self.number_of_edges
+        if m == 0 or n <= 1:
+            return 0
+        return m / (n * (n - 1)) * 2
+
+    def clustering(self):
+        """Return the clustering coefficients of the nodes
+        """
+        t = 2 * self.triangles
+        d = self.neighbors
+        possible = d * (d - 1)
+        c = np.zeros(len(t))
+        np.divide(t, possible, out=c, where=t > 0)
+        return c
+
+    def average_clustering(self):
+        """Return the average clustering coefficient of the graph
+        """
+        # summed in node order like networkX
+        return sum(self.clustering().tolist()) / len(self.nodes)
+
+    def transitivity(self):
+        """Return the transitivity of the graph
+        """
+        triangles = int(2 * self.triangles.sum())
+        if triangles == 0:
+            return 0
+        d = self.neighbors
+        return triangles / int((d * (d - 1)).sum())
+
+    def degree_centrality(self):
+        """Return the degree centralities of the nodes
+        """
+        n = len(self.nodes)
+        if n <= 1:
+            return np.ones(n, dtype=np.int64)
+        return self.degree() * (1.0 / (n - 1))
+
+    def node_metrics(self):
+        """Return the dicts of the node metrics clustering, degree_centrality
+        and degree by node
+        """
+        return {
+            'clustering':
+            dict(zip(self.nodes, self.clustering().tolist())),
+            'degree_centrality':
+            dict(zip(self.nodes, self.degree_centrality().tolist())),
+            'degree':
+            dict(zip(self.nodes, self.degree().tolist()))
+        }
+
+
+def register_metric(name, dtype=float, sparse=False):
+    """Register a graph metric for the metrics table.
+
+        Keyword arguments:
+        name -- name of the metric column
+        dtype -- numpy dtype of the metric column
+        sparse -- the metric is computed from the GraphMetrics of the graph
+                  instead of the graph
+    """
+    def decorator(func):
+        graph_metrics[name] = (func, dtype, sparse)
+        return func
+
+    return decorator
+
+
+register_metric('number_of_nodes', int)(nx.number_of_nodes)
+register_metric('number_of_edges', int)(nx.number_of_edges)
+register_metric('number_connected_components',
+                int)(nx.number_connected_components)
+register_metric('density', sparse=True)(GraphMetrics.density)
+register_metric('average_clustering',
+                sparse=True)(GraphMetrics.average_clustering)
+register_metric('transitivity', sparse=True)(GraphMetrics.transitivity)
+
+
+def _compute_row(args):
+    """Return the values of the metrics names for the graph G
+    """
+    G, names = args
+    M = None
+    row = []
+    for name in names:
+        func, _, sparse = graph_metrics[name]
+        if sparse:
+            # the adjacency matrix is built once per graph
+            if M is None:
+                M = GraphMetrics(G)
+            row.append(func(M))
+        else:
+            row.append(func(G))
+    return row
+
+
+def compute_metrics_table(graphs, names=None, processes=None):
+    """Return the metrics table of the graphs as a dict of numpy arrays.
+
+        Keyword arguments:
+        graphs -- list of networkX graphs or a TemporalGraphStore
+        names -- metric names to compute, all registered metrics if None
+        processes -- number of worker processes, os.cpu_count() if None
+    """
+    if names is None:
+        names = list(graph_metrics)
+    # generator - the graphs of a store are materialized one by one
+    tasks = ((G, names) for G in graphs)
+
+    if processes == 1 or len(graphs) < 2:
+        rows = list(map(_compute_row, tasks))
+    else:
+        processes = processes or os.cpu_count()
+        chunksize = max(1, len(graphs) // (4 * processes))
+        with Pool(processes) as pool:
+            rows = list(pool.imap(_compute_row, tasks, chunksize=chunksize))
+
+    table = {}
+    for i, name in enumerate(names):
+        table[name] = np.array([row[i] for row in rows],
+                               dtype=graph_metrics[name][1])
+    return table
+
+
+def window_aggregates(table, overlap, size):
+    """Return the min, max and mean of the metrics of the windows
+    [num * overlap, num * overlap + 2 * overlap) as a dict of dicts of numpy
+    arrays by metric name. A window is the union of two consecutive blocks
+    of overlap time steps, the blocks are reduced once.
+
+        Keyword arguments:
+        table -- metrics table as a dict of numpy arrays
+        overlap -- number of time steps between the starts of two windows
+        size -- number of windows
+    """
+    aggregates = {}
+    for name, values in table.items():
+        if not len(values):
+            aggregates[name] = {
+                key: np.full(size, np.nan)
+                for key in ['min', 'max', 'mean']
+            }
+            continue
+        starts = np.arange(0, len(values), overlap)
+        counts = np.diff(np.append(starts, len(values)))
+        # reduce the blocks of the windows
+        values = values.astype(float)
+        blocks = [
+            np.minimum.reduceat(values, starts),
+            np.maximum.reduceat(values, starts),
+            np.add.reduceat(values, starts), counts
+        ]
+        # the second block of the window - empty after the last block
+        fills = [np.inf, -np.inf, 0, 0]
+        second = [np.append(b[1:], fill) for b, fill in zip(blocks, fills)]
+        low = np.minimum(blocks[0], second[0])
+        high = np.maximum(blocks[1], second[1])
+        mean = (blocks[2] + second[2]) / (blocks[3] + second[3])
+        # pad the windows without time steps
+        pad = max(size - len(starts), 0)
+        aggregates[name] = {
+            key: np.append(a[:size], np.full(pad, np.nan))
+            for key, a in zip(['min', 'max', 'mean'], [low, high, mean])
+        }
+    return aggregates
+
+
+def load_metrics_table(path, graphs, content_hash, processes=None):
+    """Return the metrics table of the graphs. The table is read from path if
+    it exists and was computed from the same data; missing metrics are
+    computed and the table is written to path.
+
+        Keyword arguments:
+        path -- path of the persisted metrics table (.npz)
+        graphs -- list of networkX graphs or a TemporalGraphStore
+        content_hash -- content hash of the graphs (see
+                        TemporalGraphStore.content_hash), stored in the table
+        processes -- number of worker processes for missing metrics
+    """
+    table = {}
+    if os.path.exists(path):
+        with np.load(path) as f:
+            # a table of other data is outdated - even of the same length
+            if 'content_hash' in f.files and str(
+                    f['content_hash']) == content_hash:
+                table = {
+                    name: f[name]
+                    for name in f.files
+                    if name in graph_metrics and len(f[name]) == len(graphs)
+                }
+
+    missing = [name for name in graph_metrics if name not in table]
+    if missing:
+        table.update(compute_metrics_table(graphs, missing, processes))
+        with open(path, 'wb') as f:
+            np.savez(f, content_hash=np.array(content_hash), **table)
+
+    return {name: table[name] for name in graph_metrics}
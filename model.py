@@ -8,68 +8,227 @@ model - the multiscale temporal aggregation implementation with the hierarchy
 #
 # License: MIT
 
+import os
+import re
+import logging
 import pickle
+import hashlib
 import datetime
-from collections import Counter
 import math
+import tempfile
+import threading
+from collections import namedtuple
 import networkx as nx
-from networkx.algorithms.community import greedy_modularity_communities
 import numpy as np
 from sklearn.neighbors import NearestNeighbors
 from intervaltree import Interval, IntervalTree
 
+import communities
+import detail
+from ann import IVFIndex
+from cache import GraphCache
+from dataset import is_dataset, open_dataset
+from instrument import phase
+from metrics import (GraphMetrics, compute_metrics_table, load_metrics_table,
+                     window_aggregates)
+from node_index import NodeIndex
+from serialize import animation_stream
+from store import TemporalGraphStore, extend_buffer
+
+logger = logging.getLogger(__name__)
+
 hierarchy = None
 num_summary_graphs = 3  # number of summary graphs
 
 interval_tree = IntervalTree() # one interval tree interval search queries
 
-def load_data(graph_file_path, graph_embeddings_path):
-    """Load the graph data with the vectors.
+# interval tree data - position of a snapshot in the hierarchy
+SnapshotKey = namedtuple('SnapshotKey', ['level', 'num'])
+
+graph_cache = GraphCache()  # snapshots of all levels
+node_filters = GraphCache(64 * 1024 * 1024)  # node filters by token
+
+time_format = '%a, %d %b %Y %H:%M:%S GMT'  # format of the request dates
+
+# levels with at least ann_min_size embeddings are searched with the
+# approximate nearest neighbor index - None for exact search only
+ann_min_size = None
+ann_probes = 8  # number of clusters of the approximate index searched
+
+# community detection method of the clustered snapshots, see
+# communities.methods
+cluster_method = 'label_propagation'
+
+# directory of the node ids of the registered node filters - shares the
+# filters between the server processes, None to keep them in memory only
+filter_dir = None
+
+
+def parse_time(s):
+    """Return the request date string as a numpy datetime64.
 
         Keyword arguments:
-        graph_file_path -- path to the graph file
-        graph_embeddings_path -- path to the graph embeddings
+        s -- date string in the time_format
     """
-    global hierarchy
-    with open(graph_file_path, 'rb') as f:
-        graphs = pickle.load(f)
-    with open(graph_embeddings_path, 'rb') as f:
-        embeddings = pickle.load(f)
+    return np.datetime64(datetime.datetime.strptime(s, time_format), 's')
+
+
+def configure_search(min_size=None, probes=8):
+    """Configure the approximate similarity search.
+
+        Keyword arguments:
+        min_size -- minimum number of embeddings of a level for the
+                    approximate index, None for exact search only
+        probes -- number of clusters searched per query
+    """
+    global ann_min_size, ann_probes
+    ann_min_size = min_size
+    ann_probes = probes
+
+
+def configure_clustering(method):
+    """Configure the default community detection method of the clustered
+    snapshots.
+
+        Keyword arguments:
+        method -- community detection method, see communities.methods
+    """
+    global cluster_method
+    if method not in communities.methods:
+        raise ValueError('Unknown community detection method: ' + method)
+    cluster_method = method
+
+
+def configure_filters(directory=None):
+    """Configure the directory of the registered node filters.
+
+        Keyword arguments:
+        directory -- directory shared by the server processes, None to keep
+                     the filters in memory only
+    """
+    global filter_dir
+    if directory is not None:
+        os.makedirs(directory, exist_ok=True)
+    filter_dir = directory
+
+
+def clear_filters():
+    """Remove the registered node filters of the filter directory - at
+    server start and shutdown, the tokens are not valid across runs
+    """
+    if filter_dir is None:
+        return
+    for name in os.listdir(filter_dir):
+        if re.fullmatch('[0-9a-f]{40}(\\.npy|\\..*\\.tmp)', name):
+            try:
+                os.remove(os.path.join(filter_dir, name))
+            except FileNotFoundError:
+                pass
+
+
+def reset_locks():
+    """Replace the locks of the module state - a process forked from a
+    server thread does not inherit the other threads which may hold them
+    """
+    graph_cache.lock = threading.Lock()
+    node_filters.lock = threading.Lock()
+    if hierarchy is not None:
+        hierarchy.lock = threading.Lock()
+
+
+def load_data(graph_file_path, graph_embeddings_path=None, lazy=False):
+    """Load the graph data with the vectors. The graph file is either a
+    directory in the binary dataset format (see dataset.py) or a pickled list
+    of graphs with the pickled embeddings.
 
-    hierarchy = Hierarchy(graphs, embeddings)
-    print('Data loading done.')
+        Keyword arguments:
+        graph_file_path -- path to the graph file or the dataset directory
+        graph_embeddings_path -- path to the graph embeddings, not required
+                                 for the binary dataset format
+        lazy -- build the snapshots of the hierarchy on first access
+    """
+    global hierarchy
+    if is_dataset(graph_file_path):
+        store, embeddings = open_dataset(graph_file_path)
+        graphs = store
+    else:
+        with open(graph_file_path, 'rb') as f:
+            graphs = pickle.load(f)
+        with open(graph_embeddings_path, 'rb') as f:
+            embeddings = pickle.load(f)
+        store = TemporalGraphStore.from_graphs(graphs)
+    # the metrics table is persisted next to the graph file
+    metrics_path = os.path.splitext(
+        graph_file_path.rstrip('/'))[0] + '_metrics.npz'
+    metrics_table = load_metrics_table(metrics_path, graphs,
+                                       store.content_hash())
+    del graphs
+
+    # the derived structures are cached next to the graph file
+    cache_dir = os.path.dirname(graph_file_path.rstrip('/')) or '.'
+    hierarchy = Hierarchy(store, embeddings, metrics_table, lazy, cache_dir)
+    logger.info('Data loading done.')
 
 
 class Hierarchy:
-    def __init__(self, graphs, embeddings):
-        """Initialize the hierarchy from a list of graphs.
+    def __init__(self,
+                 store,
+                 embeddings,
+                 metrics_table=None,
+                 lazy=False,
+                 cache_dir=None):
+        """Initialize the hierarchy from a graph store.
 
             Keyword arguments:
-            graphs -- list of networkX graphs 
+            store -- TemporalGraphStore or a list of networkX graphs
             embeddings -- all the embeddings
+            metrics_table -- dict of metric arrays per graph, computed if None
+            lazy -- build the snapshots on first access instead of eagerly
+            cache_dir -- directory of the cache of the derived structures,
+                         the cache is keyed by the content hash of the store
         """
-        self.graphs = graphs
+        if not isinstance(store, TemporalGraphStore):
+            store = TemporalGraphStore.from_graphs(store)
+        self.store = store
         self.levels = {}
         self.height = 1
 
-        self.embeddings = embeddings['embeddings']
-        keys = np.array(embeddings['keys'])
+        # sorted time steps of the graphs - used for all time range queries
+        self.times = self.store.times
 
-        window = 2
-        while window < len(self.graphs):
-            self.height = self.height + 1
-            # get the embeddings for the level
-            level_vectors = self.embeddings[np.flatnonzero(
-                np.core.defchararray.find(keys,
-                                          str(self.height) + '_') != -1)]
+        # columnar table of the graph metrics per time step
+        if metrics_table is None:
+            metrics_table = compute_metrics_table(self.store)
+        self.metrics_table = metrics_table
+        # buffers of the metrics columns with spare capacity for appends
+        self.metrics_buffers = {}
 
-            # window size
-            window = int(math.pow(2, (self.height - 1)))
-            self.levels[self.height] = Level(self.graphs, self.height,
-                                             level_vectors)
+        self.embeddings = embeddings['embeddings']
+        # empty keys are no string array
+        self.keys = np.asarray(embeddings['keys'], dtype=str)
+        # appends are serialized
+        self.lock = threading.Lock()
+
+        # warm start from the cached occurences of a previous run
+        cache = {}
+        cache_path = None
+        if cache_dir:
+            cache_path = os.path.join(
+                cache_dir, 'hierarchy_' + self.store.content_hash() + '.npz')
+            cache = self.load_cache(cache_path)
+
+        self.lazy = lazy
+        while self.get_window_size() < len(self.store):
+            self.add_level(cache.get(self.height + 1))
+
+        # only a completely built hierarchy is cached
+        if cache_path and not cache and not lazy:
+            self.save_cache(cache_path)
 
         self.nodes_list = None
-        self.filter_node_ids = []
+        # search index of the node names - rebuilt after appends
+        self.node_index = NodeIndex(self.store.ids, self.store.names,
+                                    self.node_occurences())
 
     def __repr__(self):
         return str(self.levels)
@@ -77,6 +236,140 @@ class Hierarchy:
     def __str__(self):
         return str(self.levels)
 
+    def get_window_size(self):
+        """Return the window size of the top level - 2 without levels
+        """
+        return int(math.pow(2, (self.height - 1))) if self.height > 1 else 2
+
+    def add_level(self, occurences=None):
+        """Add a new top level to the hierarchy.
+
+            Keyword arguments:
+            occurences -- cached occurences of the level snapshots
+        """
+        self.height = self.height + 1
+        # get the embeddings for the level
+        level_vectors = self.embeddings[np.flatnonzero(
+            np.char.startswith(self.keys,
+                               str(self.height) + '_'))]
+        self.levels[self.height] = Level(self.store, self.height,
+                                         level_vectors,
+                                         self.levels.get(self.height - 1),
+                                         self.lazy, occurences)
+
+    def append(self, G, embeddings=None):
+        """Append the graph of the next time step. Only the trailing
+        snapshots of each level which contain the new time step are updated
+        and a new top level is added if the length of the hierarchy crosses a
+        power of two. Returns the keys of the changed snapshots.
+
+            Keyword arguments:
+            G -- networkX graph of the time step (see TemporalGraphStore.append)
+            embeddings -- dict of the embeddings of changed snapshots with
+                          keys 'level_num', snapshots without embeddings are
+                          excluded from the similarity search
+        """
+        with self.lock:
+            if self.store.append(G):
+                self.nodes_list = None
+            # the occurences changed
+            self.node_index = None
+            self.times = self.store.times
+            row = compute_metrics_table([G], list(self.metrics_table), 1)
+            for name, values in row.items():
+                self.metrics_table[name], self.metrics_buffers[
+                    name] = extend_buffer(self.metrics_table[name],
+                                          self.metrics_buffers.get(name),
+                                          values)
+
+            changed = []
+            for key, l in self.levels.items():
+                changed += [SnapshotKey(key, num) for num in l.extend()]
+            while self.get_window_size() < len(self.store):
+                self.add_level()
+                changed.append(SnapshotKey(self.height, 0))
+
+            for key, vectors in (embeddings or {}).items():
+                level, num = map(int, key.split('_'))
+                self.levels[level].set_embeddings(num, vectors)
+                changed.append(SnapshotKey(level, num))
+
+            # the cached graphs of the changed snapshots are outdated
+            changed = set(changed)
+            graph_cache.invalidate(lambda key: any(k in changed for k in key))
+        return sorted(changed)
+
+    def load_cache(self, path):
+        """Return the cached occurences per level as a dict of
+        (bounds, offsets, index, counts) tuples or an empty dict if there is
+        no valid cache.
+
+            Keyword arguments:
+            path -- path of the cache file
+        """
+        if not os.path.exists(path):
+            return {}
+        with np.load(path) as f:
+            if not np.array_equal(f['times'], self.times):
+                return {}
+            cache = {}
+            for name in f.files:
+                if name.endswith('_offsets'):
+                    level = int(name.split('_')[0])
+                    cache[level] = (f[str(level) + '_bounds'], f[name],
+                                    f[str(level) + '_index'],
+                                    f[str(level) + '_counts'])
+        return cache
+
+    def save_cache(self, path):
+        """Write the derived structures (time index, snapshot bounds and
+        occurences) of all levels to the cache file. Lazy snapshots are
+        built.
+
+            Keyword arguments:
+            path -- path of the cache file
+        """
+        arrays = {'times': self.times}
+        for key, l in self.levels.items():
+            occ = [s.get_occurences() for s in l.snapshots]
+            arrays[str(key) + '_bounds'] = np.array(l.bounds)
+            arrays[str(key) + '_offsets'] = np.cumsum([0] +
+                                                      [len(o[0]) for o in occ])
+            arrays[str(key) + '_index'] = np.concatenate([o[0] for o in occ])
+            arrays[str(key) + '_counts'] = np.concatenate([o[1] for o in occ])
+        with open(path, 'wb') as f:
+            np.savez(f, **arrays)
+
+    def memory_usage(self):
+        """Return the estimated memory of the hierarchy in bytes by part as
+        a dict. Memory mapped arrays are included.
+        """
+        store = sum(
+            a.nbytes for a in vars(self.store).values()
+            if isinstance(a, np.ndarray))
+        occurences = 0
+        for l in self.levels.values():
+            if isinstance(l.snapshots, LazySnapshots):
+                for snap in l.snapshots.items:
+                    if snap is not None and snap.occurences is not None:
+                        occurences += sum(a.nbytes for a in snap.occurences)
+                    if snap is not None and snap.union_e is not None:
+                        occurences += snap.union_e.nbytes
+        if self.store.time_index is not None:
+            store += self.store.time_index.nbytes
+        metrics = sum(a.nbytes for a in self.metrics_table.values())
+        for l in self.levels.values():
+            aggregates = l.aggregates
+            if aggregates is not None:
+                metrics += sum(a.nbytes for columns in aggregates.values()
+                               for a in columns.values())
+        return {
+            'store': store,
+            'embeddings': self.embeddings.nbytes,
+            'metrics_table': metrics,
+            'snapshots': occurences
+        }
+
     def get_hierarchy_meta(self):
         """Return the hierarchy meta data as a dict
         """
@@ -89,75 +382,274 @@ class Hierarchy:
             }
 
         # time
-        time1 = datetime.datetime.combine(
-            self.graphs[0].graph['time'][0],
-            datetime.time(self.graphs[0].graph['time'][1].item()))
-        time2 = datetime.datetime.combine(
-            self.graphs[-1].graph['time'][0],
-            datetime.time(self.graphs[-1].graph['time'][1].item()))
+        time1 = self.times[0].item()
+        time2 = self.times[-1].item()
         return {
             'height': self.height,
-            'time_steps': len(self.graphs),
+            'time_steps': len(self.store),
             'levels': level_dict,
             'time_1': time1,
             'time_2': time2
         }
 
-    def get_snapshot(self, level, num, graph_type, k=None, cluster=False):
+    def get_snapshot(self,
+                     level,
+                     num,
+                     graph_type,
+                     k=None,
+                     cluster=False,
+                     node_filter=None,
+                     level_of_detail=None):
         """Return the snapshot (level,num) of type of graph 
         """
         if level > self.height:
-            print('Hierarchy height overflow')
+            logger.warning('Hierarchy height overflow')
             return None
         level = self.levels[level]
-        return level.get_snapshot(num, graph_type, k, cluster,
-                                  self.filter_node_ids)
+        return level.get_snapshot(num, graph_type, k, cluster, node_filter,
+                                  level_of_detail)
+
+    def get_timeseries(self, start, end, max_points=None):
+        """Return the metrics of the graphs between start and end. If the
+        range has more than max_points time steps, the metrics are
+        downsampled to the windows of the lowest level with at most
+        max_points windows in the range. The rows of a window contain the
+        mean of each metric and its min and max as name_min and name_max.
 
-    def get_timeseries(self, start, end):
-        """Return graphs between start and end
+            Keyword arguments:
+            start -- first date string in the time_format
+            end -- last date string in the time_format
+            max_points -- maximum number of rows, all time steps if None
         """
-        start = datetime.datetime.strptime(start, '%a, %d %b %Y %H:%M:%S GMT')
-        end = datetime.datetime.strptime(end, '%a, %d %b %Y %H:%M:%S GMT')
+        # binary search of the index range of the graphs in [start, end]
+        indx1 = np.searchsorted(self.times, parse_time(start), side='left')
+        indx2 = np.searchsorted(self.times, parse_time(end), side='right')
+        if max_points is not None and self.levels:
+            max_points = max(int(max_points), 1)
+            if indx2 - indx1 > max_points:
+                return self.get_downsampled(indx1, indx2, max_points)
         result = []
 
-        # get all graphs
-        for G in self.graphs:
-            t = datetime.datetime.combine(
-                G.graph['time'][0], datetime.time(G.graph['time'][1].item()))
-            if start <= t <= end:
-                result.append({
-                    'date':
-                    t,
-                    'number_of_nodes':
-                    nx.number_of_nodes(G),
-                    'number_of_edges':
-                    nx.number_of_edges(G),
-                    'number_connected_components':
-                    nx.number_connected_components(G),
-                    'density':
-                    nx.density(G),
-                    'average_clustering':
-                    nx.average_clustering(G),
-                    'transitivity':
-                    nx.transitivity(G)
-                })
+        # slice the metrics table
+        with phase('slice'):
+            dates = self.times[indx1:indx2].tolist()
+            columns = {
+                name: values[indx1:indx2].tolist()
+                for name, values in self.metrics_table.items()
+            }
+            for i, t in enumerate(dates):
+                row = {'date': t}
+                for name, values in columns.items():
+                    row[name] = values[i]
+                result.append(row)
+        return result
+
+    def get_downsampled(self, indx1, indx2, max_points):
+        """Return the metrics of the time steps [indx1, indx2) aggregated per
+        window of the lowest level with at most max_points windows in the
+        range. Every second snapshot of the level is used, so the windows
+        tile the range without overlap.
+
+            Keyword arguments:
+            indx1 -- first time step of the range
+            indx2 -- end of the range (exclusive)
+            max_points -- maximum number of rows
+        """
+        level = self.levels[self.height]
+        for key in sorted(self.levels):
+            l = self.levels[key]
+            w = l.window_size
+            if (indx2 - 1) // w - indx1 // w + 1 <= max_points:
+                level = l
+                break
+
+        with phase('slice'):
+            aggregates = level.get_aggregates(self.metrics_table)
+            w = level.window_size
+            # the snapshots 2 * j cover the time steps [j * w, (j + 1) * w)
+            nums = np.arange(2 * (indx1 // w), 2 * ((indx2 - 1) // w) + 1, 2)
+            nums = nums[nums < len(level.bounds)]
+            first = nums * level.overlap
+            last = np.minimum(first + w, len(self.times)) - 1
+            columns = {
+                'date': self.times[first].tolist(),
+                'date_end': self.times[last].tolist(),
+                'num': nums.tolist()
+            }
+            for name, a in aggregates.items():
+                columns[name] = a['mean'][nums].tolist()
+                columns[name + '_min'] = a['min'][nums].tolist()
+                columns[name + '_max'] = a['max'][nums].tolist()
+            result = [
+                dict(zip(columns, values), level=level.level)
+                for values in zip(*columns.values())
+            ]
+        return result
+
+    def node_timeline(self, node_ids, start=None, end=None):
+        """Return the presence of the nodes in the time steps between start
+        and end as dict with the nodes (id, name, occurences and intervals of
+        consecutive time steps) and the number of the nodes present per time
+        step. Unknown node ids are ignored.
+
+            Keyword arguments:
+            node_ids -- list of node ids
+            start -- first date string in the time_format, all if None
+            end -- last date string in the time_format, all if None
+        """
+        indx1 = 0 if start is None else int(
+            np.searchsorted(self.times, parse_time(start), side='left'))
+        indx2 = len(self.times) if end is None else int(
+            np.searchsorted(self.times, parse_time(end), side='right'))
+        indx2 = max(indx1, indx2)
+
+        with phase('search'):
+            positions = self.store.node_positions(node_ids)
+            node, steps = self.store.node_times().occurences(positions)
+            inside = (steps >= indx1) & (steps < indx2)
+            node, steps = node[inside], steps[inside]
+            presence = np.bincount(steps - indx1, minlength=indx2 - indx1)
+
+            # runs of consecutive time steps of a node
+            breaks = np.flatnonzero((np.diff(node) != 0)
+                                    | (np.diff(steps) != 1)) + 1
+            first = np.concatenate([[0], breaks]) if len(node) else breaks
+            last = np.append(breaks, len(node)) - 1 if len(node) else breaks
+            run_node = np.searchsorted(positions, node[first])
+
+        with phase('slice'):
+            times = self.times[indx1:indx2].tolist()
+            intervals = [[] for _ in positions]
+            for i, j, k in zip(run_node.tolist(),
+                               (steps[first] - indx1).tolist(),
+                               (steps[last] - indx1).tolist()):
+                intervals[i].append([times[j], times[k]])
+            counts = np.bincount(np.searchsorted(positions, node),
+                                 minlength=len(positions))
+            return {
+                'nodes': [{
+                    'id': x,
+                    'name': name,
+                    'occurences': c,
+                    'intervals': i
+                } for x, name, c, i in zip(self.store.ids[positions].tolist(
+                ), self.store.names[positions].tolist(), counts.tolist(),
+                                           intervals)],
+                'presence': [{
+                    'date': t,
+                    'nodes': c
+                } for t, c in zip(times, presence.tolist())]
+            }
+
+    def node_snapshots(self, node_ids, levels=None):
+        """Return the snapshots per level which contain any of the nodes as
+        dict of the level to the snapshot positions and the number of the
+        nodes in them. A time step is in the two overlapping snapshots of
+        each level which cover it.
+
+            Keyword arguments:
+            node_ids -- list of node ids
+            levels -- list of levels, all levels if None
+        """
+        with phase('search'):
+            positions = self.store.node_positions(node_ids)
+            node, steps = self.store.node_times().occurences(positions)
+            result = {}
+            for key, l in self.levels.items():
+                if levels is not None and key not in levels:
+                    continue
+                size = len(l.bounds)
+                windows = np.concatenate(
+                    [steps // l.overlap, steps // l.overlap - 1])
+                nodes = np.concatenate([node, node])
+                valid = (windows >= 0) & (windows < size)
+                # each node once per snapshot
+                pairs = np.unique(nodes[valid] * size + windows[valid])
+                counts = np.bincount(pairs % size, minlength=size)
+                nums = np.flatnonzero(counts)
+                result[key] = {
+                    'num': nums.tolist(),
+                    'nodes': counts[nums].tolist()
+                }
         return result
 
     def get_nodes(self):
         """Return all nodes of the graph
         """
         if not self.nodes_list:
-            s = set()
-            for G in self.graphs:
-                s.update(list(G.nodes(data='name', default='')))
-            self.nodes_list = list(s)
+            self.nodes_list = self.store.get_nodes()
 
         return self.nodes_list
 
+    def node_occurences(self):
+        """Return the number of time steps every node of the node table
+        occurs in - the occurences of the top level snapshot if it is built
+        """
+        top = self.levels.get(self.height)
+        if top is None or top.overlap == 0 or self.lazy:
+            return np.bincount(self.store.node_index,
+                               minlength=len(self.store.ids))
+        index, counts = top.snapshots[0].get_occurences()
+        occurences = np.zeros(len(self.store.ids), dtype=np.int64)
+        occurences[index] = counts
+        return occurences
+
+    def search_nodes(self, query, mode='substring', offset=0, limit=50):
+        """Return a page of the nodes with names matching the query ranked by
+        their occurences (see NodeIndex.search).
+
+            Keyword arguments:
+            query -- prefix or substring of the node names
+            mode -- prefix or substring
+            offset -- position of the first node of the page
+            limit -- maximum number of nodes of the page
+        """
+        node_index = self.node_index
+        if node_index is None:
+            with self.lock:
+                node_index = NodeIndex(self.store.ids, self.store.names,
+                                       self.node_occurences())
+                self.node_index = node_index
+        with phase('search'):
+            return node_index.search(query, mode, offset, limit)
+
     def filter_nodes(self, node_ids):
-        """Set fillter for the hierarchy get data stuff
+        """Register a node filter and return its token. Returns None for an
+        empty filter. The token is passed with the requests to filter them.
+
+            Keyword arguments:
+            node_ids -- list of node ids
+        """
+        if not len(node_ids):
+            return None
+        node_filter = NodeFilter(self.store, node_ids)
+        node_filters.put(node_filter.token, node_filter,
+                         node_filter.mask.nbytes)
+        path = os.path.join(filter_dir or '', node_filter.token + '.npy')
+        if filter_dir is not None and not os.path.exists(path):
+            # written atomically - read concurrently by the other processes
+            # and threads, the temporary name is unique per writer
+            with tempfile.NamedTemporaryFile(dir=filter_dir,
+                                             prefix=node_filter.token + '.',
+                                             suffix='.tmp',
+                                             delete=False) as f:
+                np.save(f, node_filter.ids)
+            os.replace(f.name, path)
+        return node_filter.token
+
+    def get_filter(self, token):
+        """Return the registered node filter of the token or None. Filters
+        registered by other server processes are read from the filter
+        directory.
         """
-        self.filter_node_ids = node_ids
+        node_filter = node_filters.get(token)
+        if node_filter is not None or filter_dir is None:
+            return node_filter
+        path = os.path.join(filter_dir, token + '.npy')
+        if not re.fullmatch('[0-9a-f]{40}', token) or not os.path.exists(path):
+            return None
+        self.filter_nodes(np.load(path))
+        return node_filters.get(token)
 
     def check_snapshot(
             self,
@@ -171,70 +663,84 @@ class Hierarchy:
         level = self.levels[level]
         return level.check_snapshot(num)
 
-    def getAllNearestNeighbors(self, embedding, levels, k):
+    def getAllNearestNeighbors(self,
+                               embedding,
+                               levels,
+                               k,
+                               merge=False,
+                               exact=False):
         """The k-nearest neigbors for all levels to the vector embedding
+
+            Keyword arguments:
+            embedding -- a single embedding or a list of embeddings (batch)
+            levels -- list of levels which are searched
+            k -- number of nearest neighbors
+            merge -- if true return the k nearest neighbors over all levels
+                     instead of k nearest neighbors per level
+            exact -- exact search also on the levels with approximate index
         """
-        vec = np.array([embedding])
-        # result
-        result = {}
-        for key, l in self.levels.items():
-            if key in levels:
-                # check how many embeddings are there
-                if k > len(l.embeddings):
-                    k = len(l.embeddings)
-                # sklearn nearest neigbors kball
-                nbrs = NearestNeighbors(n_neighbors=k,
-                                        algorithm='ball_tree').fit(l.embeddings)
-                neigh = nbrs.kneighbors(vec)
-
-                # iterate over the results of the knn
-                for i, index in enumerate(neigh[1][0]):
-                    pos = int(math.floor(index / num_summary_graphs))
-                    types = ['union', 'disjoint', 'intersection']
-                    graph_type = types[index % num_summary_graphs]
-                    # get more features if possible and append to results
-                    if pos < len(l.snapshots):
-                        start = l.snapshots[pos].time1
-                        end = l.snapshots[pos].time2
-                        n = {
-                            'level': l.level,
-                            'position': pos,
-                            'graph_type': graph_type,
-                            'distance': neigh[0][0][i],
-                            'time1': start,
-                            'time2': end
-                        }
-                        if key in result:
-                            result[key].append(n)
-                        else:
-                            result[key] = [n]
-        return result
+        vecs = np.array(embedding, dtype=float)
+        batched = vecs.ndim == 2
+        vecs = np.atleast_2d(vecs)
+
+        searched = [l for key, l in self.levels.items() if key in levels]
+        # query every level once with the whole batch
+        with phase('search'):
+            neighbors = [l.kneighbors(vecs, k, exact) for l in searched]
+
+        results = []
+        for q in range(len(vecs)):
+            if merge:
+                # merge the per level top-k lists into one top-k list
+                candidates = [(dist[q][i], l, index)
+                              for l, (dist, indices) in zip(searched, neighbors)
+                              for i, index in enumerate(indices[q])]
+                candidates.sort(key=lambda c: c[0])
+                result = []
+                for dist, l, index in candidates:
+                    n = l.neighbor_info(index, dist)
+                    if n:
+                        result.append(n)
+                    if len(result) == k:
+                        break
+            else:
+                result = {}
+                for l, (dist, indices) in zip(searched, neighbors):
+                    for i, index in enumerate(indices[q]):
+                        n = l.neighbor_info(index, dist[q][i])
+                        if n:
+                            result.setdefault(l.level, []).append(n)
+            results.append(result)
 
-    def get_animation_data(self, level, num):
+        return results if batched else results[0]
+
+    def get_animation_data(self, level, num, node_filter=None):
         """Return the animation data list of graphs
         """
         if level > self.height:
-            print('Hierarchy height overflow')
+            logger.warning('Hierarchy height overflow')
             return None
         level = self.levels[level]
-        return level.get_animation_data(num, self.filter_node_ids)
+        return level.get_animation_data(num, node_filter)
+
+    def get_animation_stream(self, level, num, node_filter=None):
+        """Return a generator of the encoded animation frames
+        """
+        if level > self.height:
+            logger.warning('Hierarchy height overflow')
+            return None
+        level = self.levels[level]
+        return level.get_animation_stream(num, node_filter)
 
     def get_interval_tree(self, start, end):
         """Return the correct interval in the intervall tree
         """
-        start = datetime.datetime.strptime(start, '%a, %d %b %Y %H:%M:%S GMT')
-        end = datetime.datetime.strptime(end, '%a, %d %b %Y %H:%M:%S GMT')
-
-        indx1 = None
-        indx2 = None
-        # get indices of the dates of the graphs
-        for idx, G in enumerate(self.graphs):
-            t = datetime.datetime.combine(
-                G.graph['time'][0], datetime.time(G.graph['time'][1].item()))
-            if start <= t and indx1 is None:
-                indx1 = idx
-            if end <= t and indx2 is None:
-                indx2 = idx - 1
+        # indices of the first graph at or after start and the last graph
+        # before end
+        indx1 = int(
+            np.searchsorted(self.times, parse_time(start), side='left'))
+        indx2 = int(
+            np.searchsorted(self.times, parse_time(end), side='left')) - 1
 
         # query the interval tree and get the longest period
         query_result = sorted(interval_tree.envelop(indx1, indx2))
@@ -250,45 +756,70 @@ class Hierarchy:
 
 
 class Level:
-    def __init__(self, graphs, level, embeddings):
-        """Initialize a level from from a list of graphs.
+    def __init__(self,
+                 store,
+                 level,
+                 embeddings,
+                 lower_level=None,
+                 lazy=False,
+                 occurences=None):
+        """Initialize a level from from a graph store.
 
             Keyword arguments:
-            graphs -- list of networkX graphs 
+            store -- TemporalGraphStore of the graphs
             level -- number for the level used to create window size 
             embeddings -- embeddings of the level
+            lower_level -- the level below, None for the lowest level. The
+                           snapshots are merged from its snapshots.
+            lazy -- create the snapshots on first access
+            occurences -- cached (bounds, offsets, index, counts) occurences
+                          of the snapshots
         """
-        self.graphs = graphs
+        self.store = store
+        self.lower_level = lower_level
         self.level = level
         self.window_size = int(math.pow(2, (level - 1)))
         self.overlap = int(self.window_size / 2)
         self.embeddings = embeddings
+        # buffer of the embeddings with spare capacity for appends
+        self.embedding_buffer = None
+        self.lazy = lazy
+        # nearest neighbor indices - built on the first similarity search
+        self.nbrs = None
+        self.ann = None
+        # rows of the embeddings in the nearest neighbor index
+        self.indexed = None
+        # min, max and mean of the metrics per snapshot - built on the first
+        # downsampled time series
+        self.aggregates = None
 
         # initialize the snapshots
         if self.window_size < 1:
             raise ValueError('Window size of level below 1')
         if self.overlap > 0:
-            self.snapshots = []
-
-            # split the numpy array in n-sized chuncks
-            snap_vectors = []
-            for i in range(0, len(self.embeddings), num_summary_graphs):
-                snap_vectors.append(self.embeddings[i:i + num_summary_graphs])
-
-            indx = 0
-
-            if len(self.graphs) > self.window_size:
-                for i in range(0, len(self.graphs), self.overlap):
-                    self.snapshots.append(
-                        Snapshot(self.graphs, i, i + self.window_size,
-                                 snap_vectors[indx], self.level, indx))
-                    indx = indx + 1
-            else:
-                self.snapshots.append(
-                    Snapshot(self.graphs, 0, self.window_size,
-                             snap_vectors[indx], self.level, indx))
+            # bounds of the snapshots in the overall graph list
+            self.bounds = self.get_bounds()
+            self.pad_embeddings()
+            # add to interval graph
+            for indx, (indx1, indx2) in enumerate(self.bounds):
+                interval_tree[indx1:indx2] = SnapshotKey(self.level, indx)
+
+            # cached occurences of other bounds are outdated
+            if occurences is not None and not np.array_equal(
+                    occurences[0], self.bounds):
+                occurences = None
+            self.occurences = occurences
+            # number of leading snapshots with valid cached occurences
+            self.num_cached = len(self.bounds)
+
+            self.snapshots = LazySnapshots(self.create_snapshot,
+                                           len(self.bounds))
+            if not lazy:
+                # build bottom up - the lower level is already built
+                for snap in self.snapshots:
+                    snap.get_occurences()
         else:
-            self.snapshots = self.graphs
+            self.snapshots = self.store
 
     def __repr__(self):
         return 'Level: ' + str(self.level) + ' - ' + str(
@@ -298,19 +829,138 @@ class Level:
         return 'Level: ' + str(self.level) + ' - ' + str(
             self.window_size) + ' - ' + str(self.overlap)
 
+    def get_bounds(self):
+        """Return the (indx1, indx2) bounds of the snapshots of the level in
+        the overall graph list
+        """
+        if len(self.store) > self.window_size:
+            return [(i, i + self.window_size)
+                    for i in range(0, len(self.store), self.overlap)]
+        return [(0, self.window_size)]
+
+    def get_new_bounds(self):
+        """Return the bounds of the snapshots added by the time steps
+        appended to the store since the bounds were computed
+        """
+        if len(self.store) <= self.window_size:
+            return []
+        return [(i, i + self.window_size)
+                for i in range(
+                    len(self.bounds) * self.overlap, len(self.store),
+                    self.overlap)]
+
+    def pad_embeddings(self):
+        """Pad the embeddings with nan rows for the snapshots without
+        embeddings
+        """
+        missing = num_summary_graphs * len(self.bounds) - len(self.embeddings)
+        if missing > 0:
+            self.embeddings, self.embedding_buffer = extend_buffer(
+                self.embeddings, self.embedding_buffer,
+                np.full((missing, ) + self.embeddings.shape[1:], np.nan))
+
+    def get_snap_vectors(self, num):
+        """Return the num_summary_graphs embeddings of the snapshot num
+        """
+        return self.embeddings[num * num_summary_graphs:(num + 1) *
+                               num_summary_graphs]
+
+    def extend(self):
+        """Update the level to the time step appended to the store. The
+        snapshots containing the new time step are rebuilt and new snapshots
+        are added. Returns the positions of the changed snapshots.
+        """
+        last = len(self.store) - 1
+        # only the trailing snapshots can contain the new time step
+        changed = [
+            num for num in range(max(0,
+                                     len(self.bounds) - 2), len(self.bounds))
+            if self.bounds[num][0] <= last < self.bounds[num][1]
+        ]
+        bounds = self.get_new_bounds()
+        added = list(range(len(self.bounds), len(self.bounds) + len(bounds)))
+        for num, (indx1, indx2) in zip(added, bounds):
+            interval_tree[indx1:indx2] = SnapshotKey(self.level, num)
+
+        self.bounds.extend(bounds)
+        self.pad_embeddings()
+        # the aggregates of the trailing snapshots are outdated
+        self.aggregates = None
+        if changed:
+            self.num_cached = min(self.num_cached, changed[0])
+        self.snapshots.extend(len(self.bounds))
+        for num in changed:
+            self.snapshots.reset(num)
+        if not self.lazy:
+            # bottom up - the lower level is already updated
+            for num in changed + added:
+                self.snapshots[num].get_occurences()
+        return changed + added
+
+    def get_aggregates(self, metrics_table):
+        """Return the min, max and mean of the metrics per snapshot of the
+        level as a dict of dicts of numpy arrays by metric name. The
+        aggregates are computed once.
+
+            Keyword arguments:
+            metrics_table -- metrics table of the hierarchy
+        """
+        aggregates = self.aggregates
+        if aggregates is None:
+            aggregates = window_aggregates(metrics_table, self.overlap,
+                                           len(self.bounds))
+            self.aggregates = aggregates
+        return aggregates
+
+    def set_embeddings(self, num, vectors):
+        """Set the num_summary_graphs embeddings of the snapshot num
+
+            Keyword arguments:
+            num -- position of the snapshot in the level
+            vectors -- embeddings of the union, disjoint and intersection graph
+        """
+        if not 0 <= num < len(self.bounds):
+            raise ValueError('Snapshot ' + str(num) + ' not in level ' +
+                             str(self.level))
+        self.embeddings[num * num_summary_graphs:(num + 1) *
+                        num_summary_graphs] = vectors
+        snap = self.snapshots.items[num]
+        if snap is not None:
+            snap.embeddings = self.get_snap_vectors(num)
+        # the indices are rebuilt on the next search
+        self.nbrs = None
+        self.ann = None
+        self.indexed = None
+
+    def create_snapshot(self, num):
+        """Return a new snapshot (num) of the level
+
+            Keyword arguments:
+            num -- position of the snapshot in the level
+        """
+        indx1, indx2 = self.bounds[num]
+        occurences = None
+        if self.occurences is not None and num < self.num_cached:
+            _, offsets, index, counts = self.occurences
+            occurences = (index[offsets[num]:offsets[num + 1]],
+                          counts[offsets[num]:offsets[num + 1]])
+        return Snapshot(self.store, indx1, indx2, self.get_snap_vectors(num),
+                        self.level, num, self.lower_level, occurences)
+
     def get_snapshot(self,
                      num,
                      graph_type,
                      k=None,
                      cluster=False,
-                     filter_node_ids=[]):
+                     node_filter=None,
+                     level_of_detail=None):
         """Return the snapshot (num) of type of graph 
         """
         if num > len(self.snapshots):
-            print('Snapshot number is bigger than level')
+            logger.warning('Snapshot number is bigger than level')
             return None
         return self.snapshots[num].get_snapshot(graph_type, k, cluster,
-                                                filter_node_ids)
+                                                node_filter, level_of_detail)
 
     def check_snapshot(self, num):
         """Return true if the snapshot is in the level 
@@ -319,54 +969,196 @@ class Level:
             return False
         return True
 
-    def get_animation_data(self, num, filter_node_ids=[]):
+    def get_nearest_neighbors_index(self, exact=False):
+        """Return the nearest neighbor index of the level embeddings. Levels
+        with at least ann_min_size embeddings use the approximate index
+        unless exact is true. Snapshots without embeddings are not indexed.
+        """
+        if self.indexed is None:
+            self.indexed = np.flatnonzero(
+                np.isfinite(self.embeddings).all(axis=1))
+            if not self.embeddings.size:
+                # dataset without embeddings
+                self.indexed = self.indexed[:0]
+
+        if not exact and ann_min_size is not None and len(
+                self.indexed) >= ann_min_size:
+            if self.ann is None:
+                with phase('index'):
+                    self.ann = IVFIndex(n_probe=ann_probes).fit(
+                        self.embeddings[self.indexed])
+            return self.ann
+
+        if self.nbrs is None:
+            with phase('index'):
+                self.nbrs = NearestNeighbors(algorithm='ball_tree')
+                if len(self.indexed):
+                    self.nbrs.fit(self.embeddings[self.indexed])
+        return self.nbrs
+
+    def kneighbors(self, vecs, k, exact=False):
+        """Return the distances and indices of the k-nearest neighbors for
+        each vector in vecs
+
+            Keyword arguments:
+            vecs -- 2d array of query embeddings
+            k -- number of nearest neighbors
+            exact -- exact search also if the level has an approximate index
+        """
+        nbrs = self.get_nearest_neighbors_index(exact)
+        # check how many embeddings are there
+        k = min(k, len(self.indexed))
+        if k == 0:
+            return np.empty((len(vecs), 0)), np.empty((len(vecs), 0), dtype=int)
+        dist, indices = nbrs.kneighbors(vecs, n_neighbors=k)
+        return dist, self.indexed[indices]
+
+    def neighbor_info(self, index, distance):
+        """Return the search result dict of the embedding index or None if
+        there is no snapshot for the embedding
+
+            Keyword arguments:
+            index -- index of the embedding in the level embeddings
+            distance -- distance to the query embedding
+        """
+        pos = int(math.floor(index / num_summary_graphs))
+        types = ['union', 'disjoint', 'intersection']
+        graph_type = types[index % num_summary_graphs]
+        # get more features if possible
+        if pos >= len(self.snapshots):
+            return None
+        return {
+            'level': self.level,
+            'position': pos,
+            'graph_type': graph_type,
+            'distance': float(distance),
+            'time1': self.snapshots[pos].time1,
+            'time2': self.snapshots[pos].time2
+        }
+
+    def get_animation_data(self, num, node_filter=None):
         """Return the list of snapshots (num) of type of graph 
         """
         if num > len(self.snapshots):
-            print('Snapshot number is bigger than level')
+            logger.warning('Snapshot number is bigger than level')
             return None
-        return self.snapshots[num].get_animation_data(filter_node_ids)
+        return self.snapshots[num].get_animation_data(node_filter)
+
+    def get_animation_stream(self, num, node_filter=None):
+        """Return a generator of the encoded animation frames of snapshot num
+        """
+        if num >= len(self.snapshots):
+            logger.warning('Snapshot number is bigger than level')
+            return None
+        return self.snapshots[num].get_animation_stream(node_filter)
+
+
+class NodeFilter:
+    def __init__(self, store, node_ids):
+        """Initialize a node filter as a bitmap over the node table.
+
+            Keyword arguments:
+            store -- TemporalGraphStore of the graphs
+            node_ids -- list of node ids
+        """
+        self.store = store
+        self.ids = np.unique(np.asarray(node_ids, dtype=np.int64))
+        # same nodes - same token
+        self.token = hashlib.sha1(self.ids.tobytes()).hexdigest()
+        self.node_mask = store.node_mask(self.ids)
+
+    @property
+    def mask(self):
+        """Boolean mask over the node table - updated for appended nodes
+        """
+        if len(self.node_mask) != len(self.store.ids):
+            self.node_mask = self.store.node_mask(self.ids)
+        return self.node_mask
+
+    def __repr__(self):
+        return 'NodeFilter: ' + self.token + ' - ' + str(
+            np.count_nonzero(self.mask)) + ' nodes'
+
+
+class LazySnapshots:
+    def __init__(self, create, length):
+        """Initialize a list of snapshots which are created on first access.
+
+            Keyword arguments:
+            create -- function returning the snapshot of a position
+            length -- number of snapshots
+        """
+        self.create = create
+        self.items = [None] * length
+
+    def __len__(self):
+        return len(self.items)
+
+    def __getitem__(self, num):
+        if self.items[num] is None:
+            self.items[num] = self.create(range(len(self.items))[num])
+        return self.items[num]
+
+    def __iter__(self):
+        for num in range(len(self.items)):
+            yield self[num]
+
+    def __repr__(self):
+        return repr(self.items)
+
+    def extend(self, length):
+        """Extend the list to length snapshots
+        """
+        self.items.extend([None] * (length - len(self.items)))
+
+    def reset(self, num):
+        """Recreate the snapshot num on the next access
+        """
+        self.items[num] = None
 
 
 class Snapshot:
-    def __init__(self, graphs, indx1, indx2, embeddings, level, num):
-        """Initialize snapshot from a list of graphs.
+    def __init__(self,
+                 store,
+                 indx1,
+                 indx2,
+                 embeddings,
+                 level,
+                 num,
+                 lower_level=None,
+                 occurences=None):
+        """Initialize snapshot from a graph store.
 
             Keyword arguments:
-            graphs -- list of networkX graphs 
+            store -- TemporalGraphStore of the graphs
             indx1 -- first index in the overall graph list
             indx2 -- last index in the overall graph list
             embeddings -- embeddings of the snap with num_summary_graphs graphs 
                           The order is [union_graph, disjoin_graph, intersection_graph)
             level - required for interval tree
             num - required for interval tree
+            lower_level -- the level below, None to build from the store
+            occurences -- cached (index, counts) occurences of the nodes
         """
-        self.graphs = graphs[indx1:indx2]
+        self.store = store
+        # zero copy view of the time steps of the snapshot
+        self.view = store.view(indx1, indx2)
+        self.lower_level = lower_level
         self.indx1 = indx1
         self.indx2 = indx2
         self.embeddings = embeddings
         self.level = level
         self.num = num
-        self.time1 = datetime.datetime.combine(
-            self.graphs[0].graph['time'][0],
-            datetime.time(self.graphs[0].graph['time'][1].item()))
-        self.time2 = datetime.datetime.combine(
-            self.graphs[-1].graph['time'][0],
-            datetime.time(self.graphs[-1].graph['time'][1].item()))
+        self.times = self.view.times
+        self.time1 = self.times[0].item()
+        self.time2 = self.times[-1].item()
         self.duration = self.time2 - self.time1
-        # store the snapshot union graph for the snapshot - saves time
-        # As the graph does not have to be recomputed - important for root for exampel
-        self.union_g = None
-
-        # occurences of nodes over time in a dict
-        nodes = []
-        for g in self.graphs:
-            nodes.append(g.nodes)
-        # get number of occurences
-        self.node_occ = Counter(x for xs in nodes for x in set(xs))
+        # positions of the union graph edges in the store
+        self.union_e = None
 
-        # add to interval graph
-        interval_tree[self.indx1:self.indx2] = self
+        # occurences of nodes over time - sorted node indices of the store
+        # with the number of time steps they occur in - computed on first use
+        self.occurences = occurences
 
     def __repr__(self):
         return 'Snapshot: ' + str(self.time1) + ' - ' + str(self.time2)
@@ -374,65 +1166,158 @@ class Snapshot:
     def __str__(self):
         return 'Snapshot: ' + str(self.time1) + ' - ' + str(self.time2)
 
-    def union_graph(self):
-        # if already computed just return
-        if not self.union_g:
-            G = nx.Graph()
-            for graph in self.graphs:
-                G.add_nodes_from(graph.nodes(data=True))
-                G.add_edges_from(graph.edges(data=True))
-
-            G.graph['time'] = [self.time1, self.time2]
-            # return embedding as graph attribute
-            G.graph['embeddings'] = self.embeddings[0].tolist()
-            self.union_g = G
-
-        #filter the union graph
-        if len(self.filter_node_ids):
-            G = self.union_g.subgraph(self.filter_node_ids)
-        else:
-            G = self.union_g
+    @property
+    def children(self):
+        """The snapshots of the lower level which split the window into two
+        disjoint halves. None for the lowest level.
+        """
+        if self.lower_level is None:
+            return None
+        lower = self.lower_level
+        # the window of the lower level is the overlap of this level
+        overlap = int((self.indx2 - self.indx1) / 2)
+        return [
+            lower.snapshots[i // lower.overlap]
+            for i in [self.indx1, self.indx1 + overlap] if i < len(self.store)
+        ]
+
+    def built_children(self):
+        """The children with computed occurences or None if there are no
+        children or any of them is not built yet
+        """
+        if self.lower_level is None:
+            return None
+        lower = self.lower_level
+        overlap = int((self.indx2 - self.indx1) / 2)
+        children = [
+            lower.snapshots.items[i // lower.overlap]
+            for i in [self.indx1, self.indx1 + overlap] if i < len(self.store)
+        ]
+        if any(c is None or c.occurences is None for c in children):
+            return None
+        return children
+
+    def get_occurences(self):
+        """Return the sorted node indices of the store and the number of time
+        steps they occur in. They are merged from the children if they are
+        built, otherwise counted in the window with the node time index.
+        """
+        if self.occurences is None:
+            children = self.built_children()
+            if children:
+                # the halves are disjoint - the occurences add up
+                occ = [c.get_occurences() for c in children]
+                index, inverse = np.unique(np.concatenate([o[0] for o in occ]),
+                                           return_inverse=True)
+                counts = np.bincount(inverse,
+                                     weights=np.concatenate(
+                                         [o[1] for o in occ])).astype(np.int64)
+                self.occurences = (index, counts)
+            else:
+                self.occurences = self.view.node_occurences()
+        return self.occurences
+
+    def get_union_edges(self):
+        """Return the positions of the union graph edges in the store. They
+        are merged from the union edges of the children if there are any.
+        """
+        if self.union_e is None:
+            children = self.children
+            if children:
+                # in time order - later edges overwrite earlier ones
+                self.union_e = self.store.unique_edges(
+                    np.concatenate([c.get_union_edges() for c in children]))
+            else:
+                self.union_e = self.view.union_edges()
+        return self.union_e
+
+    def summary_arrays(self, select, node_filter=None):
+        """Return the node indices, their occurences and the edge positions
+        of the induced subgraph of the union graph on the selected nodes.
+        The nodes and edges are selected with vectorized masks.
+
+            Keyword arguments:
+            select -- boolean mask over the occurences or None for all nodes
+            node_filter -- NodeFilter of the request or None
+        """
+        with phase('union'):
+            index, counts = self.get_occurences()
+            union_e = self.get_union_edges()
+        with phase('subgraph'):
+            if select is not None:
+                index, counts = index[select], counts[select]
+            if node_filter is not None:
+                keep = node_filter.mask[index]
+                index, counts = index[keep], counts[keep]
+            edges = self.store.induced_edges(union_e, index)
+        return index, counts, edges
+
+    def summary_graph(self, select, embedding, node_filter=None):
+        """Return the induced subgraph of the union graph on the selected
+        nodes.
+
+            Keyword arguments:
+            select -- boolean mask over the occurences or None for all nodes
+            embedding -- embedding of the summary graph
+            node_filter -- NodeFilter of the request or None
+        """
+        index, _, edges = self.summary_arrays(select, node_filter)
+        with phase('subgraph'):
+            # the nodes in the order of their first occurence like the
+            # networkX union - the float sums of the metrics depend on it
+            G = self.store.to_graph([self.time1, self.time2],
+                                    self.view.appearance_order(index), edges)
+        return self.embed(G, embedding)
+
+    def embed(self, G, embedding):
+        """Return the graph with the embedding as graph attribute - None if
+        not embedded yet
+        """
+        embedded = embedding.size and np.isfinite(embedding).all()
+        G.graph['embeddings'] = embedding.tolist() if embedded else None
         return G
 
-    def disjoint_graph(self, num):
+    def summary_select(self, graph_type, k=None):
+        """Return the selection mask over the occurences and the embedding of
+        the summary graph type (see union_graph, disjoint_graph and
+        intersection_graph).
+        """
+        _, counts = self.get_occurences()
+        if graph_type == 'union':
+            return None, self.embeddings[0]
+        if graph_type == 'disjoint':
+            return counts <= k, self.embeddings[1]
+        if graph_type == 'intersection':
+            return counts >= 2, self.embeddings[2]
+        raise ValueError('Graph type not known: ' + str(graph_type))
+
+    def union_graph(self, node_filter=None):
+        """Return the union graph with the node filter.
+        """
+        return self.summary_graph(None, self.embeddings[0], node_filter)
+
+    def disjoint_graph(self, num, node_filter=None):
         """Return intersection graph .
 
             Keyword arguments:
             num -- number of occurences in the sequence of graphs required to be in the disjoint graph (below the number)
+            node_filter -- NodeFilter of the request or None
         """
-        # filter out all occurence values below 1 and return nodes
-        nodes_dict = {
-            x: self.node_occ[x]
-            for x in self.node_occ if self.node_occ[x] <= num
-        }
-        # union graph
-        union_g = self.union_graph()
-
-        # return the subgraph matching all the nodes dict
-        G = union_g.subgraph([*nodes_dict])
-        # return embedding as graph attribute
-        G.graph['embeddings'] = self.embeddings[1].tolist()
-        G.graph['time'] = [self.time1, self.time2]
-        return G
+        # filter out all occurence values above num
+        _, counts = self.get_occurences()
+        return self.summary_graph(counts <= num, self.embeddings[1],
+                                  node_filter)
 
-    def intersection_graph(self, num):
+    def intersection_graph(self, num, node_filter=None):
         """Return intersection graph .
 
             Keyword arguments:
             num -- number of occurences in the sequence of graphs required to be in the intersection graph 
+            node_filter -- NodeFilter of the request or None
         """
-        nodes_dict = {
-            x: self.node_occ[x]
-            for x in self.node_occ if self.node_occ[x] >= 2
-        }
-        # union graph
-        union_g = self.union_graph()
-
-        # return the subgraph matching all the nodes dict
-        G = union_g.subgraph([*nodes_dict])
-        G.graph['embeddings'] = self.embeddings[2].tolist()
-        G.graph['time'] = [self.time1, self.time2]
-        return G
+        _, counts = self.get_occurences()
+        return self.summary_graph(counts >= 2, self.embeddings[2],
+                                  node_filter)
 
     def get_summaries(self, num):
         """Return all graph summaries in a list.
@@ -450,106 +1335,227 @@ class Snapshot:
                      graph_type,
                      k=None,
                      cluster=False,
-                     filter_node_ids=[]):
+                     node_filter=None,
+                     level_of_detail=None):
         """Return the snapshot of type of graph. 
         k defines the number of times the nodes has to appear 
+        cluster is true for the default community detection method or the
+        name of the method (see communities.methods).
+        level_of_detail is a detail.Detail to reduce the graph to a budget.
+        The snapshots are kept in the graph cache.
         """
-        # update the filter
-        self.filter_node_ids = filter_node_ids
-
         if graph_type not in ['union', 'disjoint', 'intersection']:
-            print('Graph type is not defined')
+            logger.warning('Graph type is not defined')
             return None
 
-        if k and k <= 0:
-            print('The number k is not correctly defined')
+        if (k is not None and k <= 0) or (graph_type == 'disjoint'
+                                          and k is None):
+            logger.warning('The number k is not correctly defined')
             return None
 
+        if cluster and not isinstance(cluster, str):
+            cluster = cluster_method
+        if cluster and cluster not in communities.methods:
+            logger.warning('Community detection method not known.')
+            return None
+
+        if level_of_detail is not None:
+            if level_of_detail.method not in detail.methods:
+                logger.warning('Level of detail method not known.')
+                return None
+            return self.get_detail(graph_type, k, node_filter,
+                                   level_of_detail)
+
+        key = (SnapshotKey(self.level, self.num), graph_type, k, cluster
+               or False, node_filter.token if node_filter else None)
+        return graph_cache.get_or_compute(
+            key, lambda: self.compute_snapshot(graph_type, k, cluster,
+                                               node_filter))
+
+    def get_ranking(self, graph_type, k, method, node_filter=None):
+        """Return the detail.Ranking of the nodes of the summary graph - kept
+        in the graph cache.
+        """
+        key = ('ranking', SnapshotKey(self.level, self.num), graph_type, k,
+               method, node_filter.token if node_filter else None)
+
+        def compute():
+            select, _ = self.summary_select(graph_type, k)
+            index, counts, edges = self.summary_arrays(select, node_filter)
+            with phase('rank'):
+                return detail.rank(self.store, index, edges, counts, method)
+
+        return graph_cache.get_or_compute(key, compute, detail.Ranking.size)
+
+    def get_detail(self, graph_type, k, node_filter, level_of_detail):
+        """Return the reduced summary graph of the budget of the detail. The
+        graph has the ranked nodes of the largest prefix of the ranking
+        within the budget and the edges between them. With since only the
+        nodes and the edges added to the graph of the first since ranked
+        nodes are returned (with the nodes of the added edges). The detail
+        graph attribute holds the number of nodes of the graph and of the
+        tiers of the ranking.
+
+            Keyword arguments:
+            graph_type -- union, disjoint or intersection
+            k -- occurences of the disjoint graph
+            node_filter -- NodeFilter of the request or None
+            level_of_detail -- detail.Detail of the request
+        """
+        method, max_nodes, max_edges, since = level_of_detail
+        ranking = self.get_ranking(graph_type, k, method, node_filter)
+        size = ranking.prefix(max_nodes, max_edges)
+        since = min(max(int(since or 0), 0), size)
+
+        def key(since):
+            return (SnapshotKey(self.level, self.num), graph_type, k,
+                    ('detail', method, size, since),
+                    node_filter.token if node_filter else None)
+
+        def info(since):
+            return {
+                'method': method,
+                'nodes': size,
+                'since': since,
+                'total_nodes': len(ranking),
+                'total_edges': len(ranking.edges),
+                'tiers': ranking.tiers()
+            }
+
+        def compute():
+            G = self.compute_detail(ranking, size, graph_type, k)
+            G.graph['detail'] = info(0)
+            return G
+
+        # the metrics are computed on the complete reduced graph
+        G = graph_cache.get_or_compute(key(0), compute)
+        if not since:
+            return G
+
+        def compute_delta():
+            index, edges = ranking.reduce(size, since)
+            ids = self.store.ids
+            with phase('subgraph'):
+                H = nx.Graph()
+                H.graph = dict(G.graph, detail=info(since))
+                H.add_nodes_from((x, G.nodes[x]) for x in ids[index].tolist())
+                H.add_edges_from(
+                    (u, v, G.edges[u, v])
+                    for u, v in zip(ids[self.store.edge_u[edges]].tolist(),
+                                    ids[self.store.edge_v[edges]].tolist()))
+                # the nodes of the added edges which were sent before
+                for x, d in H.nodes(data=True):
+                    if not d:
+                        d.update(G.nodes[x])
+            return H
+
+        return graph_cache.get_or_compute(key(since), compute_delta)
+
+    def compute_detail(self, ranking, size, graph_type, k):
+        """Return the reduced summary graph of the first size ranked nodes
+        with the metrics.
+        """
+        index, edges = ranking.reduce(size)
+        _, embedding = self.summary_select(graph_type, k)
+        with phase('subgraph'):
+            # the graph is built from sorted node indices like the summary
+            G = self.store.to_graph([self.time1, self.time2], np.sort(index),
+                                    np.sort(edges))
+        return self.add_metrics(self.embed(G, embedding))
+
+    def compute_snapshot(self,
+                         graph_type,
+                         k=None,
+                         cluster=False,
+                         node_filter=None):
+        """Return a new snapshot of type of graph with the metrics. 
+        """
         if graph_type == 'union':
-            G = self.union_graph()
+            G = self.union_graph(node_filter)
         elif graph_type == 'disjoint':
-            G = self.disjoint_graph(k)
+            G = self.disjoint_graph(k, node_filter)
         elif graph_type == 'intersection':
-            G = self.intersection_graph(k)
+            G = self.intersection_graph(k, node_filter)
         else:
-            print('Graph type not known.')
+            logger.warning('Graph type not known.')
             return None
 
-        # do the clustering
+        # do the clustering - meta nodes of the communities
         if cluster and len(G.nodes) > 100:
-            # H will be the new graph with meta nodes
-            H = nx.Graph()
-            H.graph = G.graph
-            # coompute
-            partition = greedy_modularity_communities(G, weight='sentiment')
-
-            B = nx.quotient_graph(G,
-                                  partition,
-                                  create_using=nx.MultiGraph,
-                                  relabel=True)
-            # iterate over the node groups
-            for i, meta_node in enumerate(B.nodes()):
-                G_tmp = B.nodes[meta_node]['graph']
-                ids = list(G_tmp)
-                names = list(
-                    dict(G_tmp.nodes(data='name', default='')).values())
-                # coordinates mean
-                coord = list(
-                    dict(G_tmp.nodes(data='coord', default='')).values())
-                coord = [float(sum(l)) / len(l) for l in zip(*coord)]
-                H.add_node(i,
-                           ids=ids,
-                           name=names,
-                           coord=coord,
-                           is_cluster=True,
-                           cluster_size=len(ids))
-            # iterate over the groups
-            for u, v, d in B.edges(data=True):
-                H.add_edge(u,
-                           v,
-                           sentiment=d['sentiment'],
-                           time=d['time'],
-                           is_cluster=True)
-            # replace G with H
-            G = H
-        # compute metrics
-        metrics = {}
-        metrics['number_of_nodes'] = nx.number_of_nodes(G)
-        if metrics['number_of_nodes']:
-            metrics['number_of_edges'] = nx.number_of_edges(G)
-            metrics['size'] = G.size()
-            metrics['density'] = nx.density(G)
-            metrics['average_clustering'] = nx.average_clustering(G)
-            metrics['transitivity'] = nx.transitivity(G)
-            G.graph['metrics'] = metrics
-
-            # compute node attributes
-            nx.set_node_attributes(G, nx.clustering(G), 'clustering')
-            nx.set_node_attributes(G, nx.degree_centrality(G),
-                                   'degree_centrality')
-            nx.set_node_attributes(G, dict(G.degree()), 'degree')
+            with phase('cluster'):
+                key = ('partition', SnapshotKey(self.level, self.num),
+                       graph_type, k, cluster,
+                       node_filter.token if node_filter else None)
+                ids = np.array(list(G), dtype=np.int64)
+                # the partition of an overlapping parent is the warm start
+                parent = self.parent_partition(key)
+                init = communities.warm_start(ids, parent) if parent else None
+                labels = communities.partition(G, cluster, init)
+
+                order = np.argsort(ids)
+                graph_cache.put(key, (ids[order], labels[order]),
+                                ids.nbytes + labels.nbytes)
+                G = communities.quotient_graph(G, labels)
+        return self.add_metrics(G)
+
+    def add_metrics(self, G):
+        """Return the graph with the graph metrics and the node metrics as
+        attributes
+        """
+        with phase('metrics'):
+            metrics = {}
+            metrics['number_of_nodes'] = nx.number_of_nodes(G)
+            if metrics['number_of_nodes']:
+                # sparse adjacency matrix of the summary graph
+                M = GraphMetrics(G)
+                metrics['number_of_edges'] = M.number_of_edges
+                metrics['size'] = M.number_of_edges
+                metrics['density'] = M.density()
+                metrics['average_clustering'] = M.average_clustering()
+                metrics['transitivity'] = M.transitivity()
+                G.graph['metrics'] = metrics
+
+                # compute node attributes
+                for name, values in M.node_metrics().items():
+                    nx.set_node_attributes(G, values, name)
 
         return G
 
-    def get_animation_data(self, filter_node_ids=[]):
+    def parent_partition(self, key):
+        """Return the cached (ids, labels) partition of a snapshot of the
+        level above containing this snapshot or None.
+
+            Keyword arguments:
+            key -- partition key of this snapshot
+        """
+        window = self.indx2 - self.indx1
+        # the snapshots above overlap by the window of this level
+        parents = [self.indx1 // window]
+        if self.indx1 % window == 0 and self.indx1 > 0:
+            parents.append(self.indx1 // window - 1)
+        for num in parents:
+            parent = graph_cache.get(key[:1] +
+                                     (SnapshotKey(self.level + 1, num), ) +
+                                     key[2:])
+            if parent is not None:
+                return parent
+        return None
+
+    def get_animation_data(self, node_filter=None):
         """Returns the list of snapshots with filtering
         """
-        self.filter_node_ids = filter_node_ids
-
-        #filter the graphs
-        graphs = []
-        for H in self.graphs:
-            # a little hack - requires more memory - easier to handle
-            G = nx.Graph()
-            G.add_nodes_from(H.nodes(data=True))
-            G.add_edges_from(H.edges(data=True))
-
-            G.graph['time'] = datetime.datetime.combine(
-                H.graph['time'][0], datetime.time(H.graph['time'][1].item()))
-
-            if len(self.filter_node_ids):
-                graphs.append(G.subgraph(self.filter_node_ids))
-            else:
-                graphs.append(G)
-
-        return graphs
\ No newline at end of file
+        mask = node_filter.mask if node_filter is not None else None
+        # the filtered graphs are materialized from the store
+        with phase('frames'):
+            return [
+                self.store.graph(i, mask)
+                for i in range(self.view.indx1, self.view.indx2)
+            ]
+
+    def get_animation_stream(self, node_filter=None):
+        """Returns a generator of the encoded animation frames with filtering
+        - the first frame in full and the changes afterwards
+        """
+        mask = node_filter.mask if node_filter is not None else None
+        return animation_stream(self.store,
+                                range(self.view.indx1, self.view.indx2), mask)
\ No newline at end of file
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+node_index - search index of the node names. Prefix queries are answered
+             with a binary search over the sorted names, substring queries
+             with an inverted index of the name trigrams. The matches are
+             ranked by the number of time steps the nodes occur in.
+"""
+
+# Author: Eren Cakmak <eren.cakmak@uni-konstanz.de>
+#
+# License: MIT
+
+import numpy as np
+
+modes = ['prefix', 'substring']
+max_limit = 1000  # maximum number of nodes of a result page
+gram_size = 3  # length of the indexed substrings
+
+
+class NodeIndex:
+    def __init__(self, ids, names, counts):
+        """Initialize the index of the node table.
+
+            Keyword arguments:
+            ids -- node ids of the node table
+            names -- node names of the node table
+            counts -- number of time steps each node occurs in
+        """
+        self.ids = np.asarray(ids)
+        self.names = np.asarray(names, dtype=str)
+        self.counts = np.asarray(counts, dtype=np.int64)
+        self.lower = np.char.lower(self.names)
+
+        # rank of the nodes - most occurences first, ties by name
+        order = np.lexsort((self.lower, -self.counts))
+        self.rank = np.empty(len(order), dtype=np.int64)
+        self.rank[order] = np.arange(len(order))
+
+        # sorted names for the prefix search
+        self.sorted = np.argsort(self.lower, kind='stable')
+        self.sorted_lower = self.lower[self.sorted]
+
+        # trigram -> positions in the node table
+        grams = {}
+        for i, name in enumerate(self.lower.tolist()):
+            for gram in {
+                    name[j:j + gram_size]
+                    for j in range(len(name) - gram_size + 1)
+            }:
+                grams.setdefault(gram, []).append(i)
+        self.grams = {
+            gram: np.array(positions, dtype=np.int64)
+            for gram, positions in grams.items()
+        }
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __repr__(self):
+        return 'NodeIndex: ' + str(len(self)) + ' nodes - ' + str(
+            len(self.grams)) + ' trigrams'
+
+    def prefix_matches(self, query):
+        """Return the positions of the nodes with names starting with query
+        """
+        lo = np.searchsorted(self.sorted_lower, query, side='left')
+        hi = np.searchsorted(self.sorted_lower, query + '\U0010ffff',
+                             side='left')
+        return self.sorted[lo:hi]
+
+    def substring_matches(self, query):
+        """Return the positions of the nodes with names containing query
+        """
+        if len(query) < gram_size:
+            return np.flatnonzero(np.char.find(self.lower, query) >= 0)
+        postings = []
+        for j in range(len(query) - gram_size + 1):
+            positions = self.grams.get(query[j:j + gram_size])
+            if positions is None:
+                return np.empty(0, dtype=np.int64)
+            postings.append(positions)
+        postings.sort(key=len)
+        candidates = postings[0]
+        for positions in postings[1:]:
+            candidates = np.intersect1d(candidates,
+                                        positions,
+                                        assume_unique=True)
+        if len(query) == gram_size:
+            return candidates
+        # the trigrams may be at other positions of the name
+        return candidates[np.char.find(self.lower[candidates], query) >= 0]
+
+    def search(self, query, mode='substring', offset=0, limit=50):
+        """Return a page of the nodes matching the query as dict with the
+        total number of matches and the nodes (id, name, occurences) ranked
+        by their occurences. The search is case insensitive, an empty query
+        matches all nodes.
+
+            Keyword arguments:
+            query -- prefix or substring of the node names
+            mode -- prefix or substring
+            offset -- position of the first node of the page in the ranking
+            limit -- maximum number of nodes of the page
+        """
+        if mode not in modes:
+            raise ValueError('Unknown search mode: ' + str(mode))
+        offset = max(int(offset), 0)
+        limit = min(max(int(limit), 0), max_limit)
+        query = query.lower()
+
+        if not query:
+            matches = np.arange(len(self))
+        elif mode == 'prefix':
+            matches = self.prefix_matches(query)
+        else:
+            matches = self.substring_matches(query)
+
+        ranks = self.rank[matches]
+        if offset + limit < len(matches):
+            # only the page is sorted
+            top = np.argpartition(ranks, offset + limit - 1)[:offset + limit]
+            page = top[np.argsort(ranks[top])][offset:]
+        else:
+            page = np.argsort(ranks)[offset:offset + limit]
+        page = matches[page]
+        return {
+            'total': int(len(matches)),
+            'offset': offset,
+            'limit': limit,
+            'nodes': [{
+                'id': i,
+                'name': name,
+                'occurences': count
+            } for i, name, count in zip(self.ids[page].tolist(),
+                                        self.names[page].tolist(),
+                                        self.counts[page].tolist())]
+        }
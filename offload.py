@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+"""
+offload - bounded pool of worker processes for the CPU heavy model calls.
+          The workers are forked from the process with the loaded hierarchy
+          and share it copy-on-write. Every call has a time budget and is
+          cancelled when the client is gone or a newer request for the same
+          view arrived - the worker of a cancelled call is replaced.
+"""
+
+# Author: Eren Cakmak <eren.cakmak@uni-konstanz.de>
+#
+# License: MIT
+
+import time
+import signal
+import socket
+import hashlib
+import logging
+import threading
+import multiprocessing
+from collections import namedtuple
+
+from instrument import attached, phase, record
+
+logger = logging.getLogger(__name__)
+
+pool = None  # WorkerPool of the process, calls run in the thread if None
+views = None  # ViewRegistry shared by all processes
+default_timeout = 30.0  # time budget of a call in seconds
+max_timeout = 120.0  # maximum time budget requested by a client
+poll_interval = 0.05  # seconds between the checks of a running call
+
+# time budget of a request - the monotonic deadline of its calls and a
+# function returning true if the request is obsolete (or None)
+Budget = namedtuple('Budget', ['deadline', 'cancelled'])
+
+
+class Timeout(Exception):
+    """The call did not finish within its time budget"""
+
+
+class Cancelled(Exception):
+    """The call was cancelled"""
+
+
+def _worker_loop(conn, after_fork):
+    """Run the calls received on the connection until it is closed
+    """
+    # the signal handlers of the server process are inherited - the worker
+    # is terminated by the pool and ignores the interrupts of the terminal
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    for func in after_fork:
+        func()
+    while True:
+        try:
+            func, args = conn.recv()
+        except (EOFError, OSError):
+            return
+        # the phases of the call are sent back to the request
+        phases = []
+        try:
+            with attached(phases):
+                result = (True, func(*args), phases)
+        except Exception as e:
+            result = (False, e, phases)
+        try:
+            conn.send(result)
+        except Exception as e:
+            # results or exceptions which can not be pickled
+            conn.send((False, RuntimeError(repr(e)), phases))
+
+
+class Worker:
+    def __init__(self, context, after_fork):
+        """Start a forked worker process connected with a pipe.
+
+            Keyword arguments:
+            context -- multiprocessing fork context
+            after_fork -- functions called in the worker after the fork
+        """
+        self.conn, child = context.Pipe()
+        self.process = context.Process(target=_worker_loop,
+                                       args=(child, after_fork),
+                                       daemon=True)
+        self.process.start()
+        child.close()
+
+    def stop(self):
+        """Terminate the worker process
+        """
+        self.conn.close()
+        self.process.terminate()
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+
+
+class WorkerPool:
+    def __init__(self, processes, after_fork=()):
+        """Initialize the pool with processes forked worker processes. The
+        number of concurrent calls is bounded by the number of processes.
+
+            Keyword arguments:
+            processes -- number of worker processes
+            after_fork -- functions called in each worker after the fork
+        """
+        self.context = multiprocessing.get_context('fork')
+        self.after_fork = list(after_fork)
+        self.idle = [
+            Worker(self.context, self.after_fork) for _ in range(processes)
+        ]
+        self.available = threading.Semaphore(processes)
+        self.lock = threading.Lock()
+        self.replaced = 0
+
+    def __repr__(self):
+        return 'WorkerPool: ' + str(len(self.idle)) + ' idle workers'
+
+    def replace(self, worker):
+        """Stop the worker and return a new one
+        """
+        worker.stop()
+        with self.lock:
+            self.replaced += 1
+        return Worker(self.context, self.after_fork)
+
+    def call(self, func, args, timeout, cancelled=None):
+        """Return the result of func(*args) computed by a worker. Raises
+        Timeout if the call (including the wait for a free worker) takes
+        longer than timeout and Cancelled if cancelled() becomes true. The
+        worker of an unfinished call is replaced.
+
+            Keyword arguments:
+            func -- module level function
+            args -- tuple of picklable arguments
+            timeout -- time budget in seconds
+            cancelled -- function returning true if the call is obsolete
+        """
+        deadline = time.monotonic() + timeout
+        if not self.available.acquire(timeout=timeout):
+            raise Timeout(
+                'No worker available within {:.1f}s'.format(timeout))
+        with self.lock:
+            worker = self.idle.pop()
+        try:
+            worker.conn.send((func, args))
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    worker = self.replace(worker)
+                    raise Timeout('Call exceeded {:.1f}s'.format(timeout))
+                if worker.conn.poll(min(poll_interval, remaining)):
+                    ok, value, phases = worker.conn.recv()
+                    # the phases of the worker belong to the calling request
+                    record(phases)
+                    if not ok:
+                        raise value
+                    return value
+                if cancelled is not None and cancelled():
+                    worker = self.replace(worker)
+                    raise Cancelled('Call cancelled')
+                if not worker.process.is_alive():
+                    worker = self.replace(worker)
+                    raise RuntimeError('Worker process died')
+        finally:
+            with self.lock:
+                self.idle.append(worker)
+            self.available.release()
+
+    def close(self):
+        """Stop all worker processes
+        """
+        with self.lock:
+            for worker in self.idle:
+                worker.stop()
+            self.idle = []
+
+
+class ViewRegistry:
+    def __init__(self, slots=4096):
+        """Initialize the registry of the latest request of every view in
+        shared memory. Created before the fork it is shared by all
+        processes. Views with the same slot replace each other.
+
+            Keyword arguments:
+            slots -- number of slots
+        """
+        context = multiprocessing.get_context('fork')
+        self.hashes = context.RawArray('q', slots)
+        self.stamps = context.RawArray('q', slots)
+        self.counter = context.Value('q', 0)
+
+    def _slot(self, view):
+        """Return the (slot, hash) of the view
+        """
+        h = int.from_bytes(hashlib.sha1(view.encode()).digest()[:7], 'little')
+        return h % len(self.hashes), h
+
+    def start(self, view):
+        """Register a new request of the view and return its stamp
+        """
+        with self.counter.get_lock():
+            self.counter.value += 1
+            stamp = self.counter.value
+        slot, h = self._slot(view)
+        self.hashes[slot] = h
+        self.stamps[slot] = stamp
+        return stamp
+
+    def superseded(self, view, stamp):
+        """Return true if a newer request of the view was registered
+        """
+        slot, h = self._slot(view)
+        return self.hashes[slot] == h and self.stamps[slot] > stamp
+
+
+def configure(timeout=30.0, maximum=120.0):
+    """Configure the time budget of the calls.
+
+        Keyword arguments:
+        timeout -- default time budget in seconds
+        maximum -- maximum time budget requested by a client
+    """
+    global default_timeout, max_timeout
+    default_timeout = timeout
+    max_timeout = maximum
+
+
+def start(processes, after_fork=()):
+    """Start the worker pool of the process - after the hierarchy is loaded.
+
+        Keyword arguments:
+        processes -- number of worker processes
+        after_fork -- functions called in each worker after the fork
+    """
+    global pool
+    pool = WorkerPool(processes, after_fork)
+    logger.info('Started %d worker processes', processes)
+
+
+def client_disconnected(environ):
+    """Return true if the client of the request closed the connection. Only
+    the socket of gunicorn workers is checked.
+
+        Keyword arguments:
+        environ -- WSGI environment of the request
+    """
+    sock = environ.get('gunicorn.socket')
+    if sock is None:
+        return False
+    try:
+        data = sock.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT)
+    except BlockingIOError:
+        return False
+    except OSError:
+        return True
+    return data == b''
+
+
+def budget(timeout=None, cancelled=None):
+    """Return the Budget of a request starting now.
+
+        Keyword arguments:
+        timeout -- time budget in seconds, the default timeout if None -
+                   limited to the maximum timeout
+        cancelled -- function returning true if the request is obsolete
+    """
+    if timeout is None:
+        timeout = default_timeout
+    return Budget(time.monotonic() + min(timeout, max_timeout), cancelled)
+
+
+def run(func, args, request_budget=None):
+    """Return func(*args) computed in the worker pool within the budget of
+    the request, or computed in the calling thread without a pool.
+
+        Keyword arguments:
+        func -- module level function
+        args -- tuple of picklable arguments
+        request_budget -- Budget of the request, the default timeout if None
+    """
+    if pool is None:
+        return func(*args)
+    request_budget = request_budget or budget()
+    timeout = request_budget.deadline - time.monotonic()
+    if timeout <= 0:
+        raise Timeout('Time budget of the request exhausted')
+    if request_budget.cancelled is not None and request_budget.cancelled():
+        raise Cancelled('Request cancelled')
+    with phase('offload'):
+        return pool.call(func, args, timeout, request_budget.cancelled)
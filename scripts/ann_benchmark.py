@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+ann_benchmark - recall and latency of the approximate nearest neighbor index
+                (see ann.py) compared to the exact ball tree search of the
+                levels. The embeddings are clustered random vectors or the
+                embeddings of a dataset. Usage:
+
+    python scripts/ann_benchmark.py --size 200000 --probes 1 2 4 8 16
+    python scripts/ann_benchmark.py --dataset data/reddit --json results.json
+"""
+
+# Author: Eren Cakmak <eren.cakmak@uni-konstanz.de>
+#
+# License: MIT
+
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+from sklearn.neighbors import NearestNeighbors
+
+# the modules of the app are in the parent directory
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..'))
+
+from ann import IVFIndex
+
+
+def clustered_embeddings(size, dims, clusters, seed=0):
+    """Return size random embeddings around clusters random centers
+    """
+    rng = np.random.RandomState(seed)
+    centers = rng.normal(size=(clusters, dims))
+    labels = rng.randint(clusters, size=size)
+    return centers[labels] + 0.3 * rng.normal(size=(size, dims))
+
+
+def dataset_embeddings(path):
+    """Return the finite embeddings of a dataset in the binary format
+    """
+    from dataset import open_dataset
+    _, embeddings = open_dataset(path)
+    X = np.asarray(embeddings['embeddings'], dtype=float)
+    return X[np.isfinite(X).all(axis=1)]
+
+
+def recall(exact, approximate):
+    """Return the mean fraction of the exact neighbors found per query
+    """
+    return float(
+        np.mean([
+            len(np.intersect1d(e, a)) / len(e)
+            for e, a in zip(exact, approximate)
+        ]))
+
+
+def run(X, queries, k, probes, n_lists=None):
+    """Return the benchmark results of the exact search and the approximate
+    index with each number of probes.
+
+        Keyword arguments:
+        X -- 2d array of the indexed embeddings
+        queries -- 2d array of the query embeddings
+        k -- number of nearest neighbors
+        probes -- list of the numbers of clusters searched
+        n_lists -- number of clusters of the index, sqrt(n) if None
+    """
+    start = time.time()
+    nbrs = NearestNeighbors(algorithm='ball_tree').fit(X)
+    build = time.time() - start
+    start = time.time()
+    _, exact = nbrs.kneighbors(queries, k)
+    results = [{
+        'index': 'exact',
+        'build_s': build,
+        'query_ms': 1000 * (time.time() - start) / len(queries),
+        'recall': 1.0
+    }]
+
+    start = time.time()
+    ann = IVFIndex(n_lists=n_lists).fit(X)
+    build = time.time() - start
+    for n_probe in probes:
+        ann.n_probe = n_probe
+        start = time.time()
+        _, approximate = ann.kneighbors(queries, k)
+        results.append({
+            'index': 'ivf',
+            'lists': len(ann.centroids),
+            'probes': n_probe,
+            'build_s': build,
+            'query_ms': 1000 * (time.time() - start) / len(queries),
+            'recall': recall(exact, approximate)
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the approximate nearest neighbor index against '
+        'the exact search.')
+    parser.add_argument('--dataset',
+                        help='directory of a dataset, random embeddings if '
+                        'not given')
+    parser.add_argument('--size', type=int, default=100000,
+                        help='number of random embeddings')
+    parser.add_argument('--dims', type=int, default=128,
+                        help='dimensions of the random embeddings')
+    parser.add_argument('--clusters', type=int, default=1000,
+                        help='clusters of the random embeddings')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--lists', type=int, default=None,
+                        help='clusters of the index, sqrt(n) if not given')
+    parser.add_argument('--probes', type=int, nargs='+',
+                        default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument('--json', help='write the results to a json file')
+    args = parser.parse_args()
+
+    if args.dataset:
+        X = dataset_embeddings(args.dataset)
+    else:
+        X = clustered_embeddings(args.size, args.dims, args.clusters)
+    # queries are perturbed embeddings of the index
+    rng = np.random.RandomState(1)
+    queries = X[rng.choice(len(X), min(args.queries, len(X)), replace=False)]
+    queries = queries + 0.01 * rng.normal(size=queries.shape)
+
+    results = run(X, queries, args.k, args.probes, args.lists)
+    print(str(len(X)) + ' embeddings - ' + str(X.shape[1]) + ' dimensions - ' +
+          str(len(queries)) + ' queries - k=' + str(args.k))
+    for r in results:
+        print('{:<6} probes={:<4} build={:>7.2f}s query={:>8.3f}ms '
+              'recall={:.3f}'.format(r['index'], str(r.get('probes', '-')),
+                                     r['build_s'], r['query_ms'],
+                                     r['recall']))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(
+                {
+                    'size': len(X),
+                    'dims': int(X.shape[1]),
+                    'queries': len(queries),
+                    'k': args.k,
+                    'results': results
+                },
+                f,
+                indent=2)
+
+
+if __name__ == "__main__":
+    main()
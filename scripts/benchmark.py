@@ -0,0 +1,486 @@
+# -*- coding: utf-8 -*-
+"""
+benchmark - end-to-end benchmark of the hierarchy and the API on synthetic
+            dynamic graphs (see generate.py) of several sizes. Every size is
+            measured in a new process: the load and build times of the
+            hierarchy, the peak memory and the latency of every route of the
+            API through the Flask test client. Usage:
+
+    python scripts/benchmark.py --steps 512 2048 8192 --json results.json
+    python scripts/benchmark.py --compare results.json
+"""
+
+# Author: Eren Cakmak <eren.cakmak@uni-konstanz.de>
+#
+# License: MIT
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import resource
+import argparse
+import datetime
+import tempfile
+import traceback
+import subprocess
+import multiprocessing
+
+import numpy as np
+
+# the modules of the app are in the parent directory
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, root)
+
+from generate import generate_store, no_embeddings, random_embeddings, write
+
+
+def peak_memory_mb():
+    """Return the peak resident memory of the process in MB
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes on Linux
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def route_requests(hierarchy, time_format):
+    """Return the benchmarked requests as (endpoint, label, method, path,
+    query, body). The ingest requests are last - they change the hierarchy.
+
+        Keyword arguments:
+        hierarchy -- the loaded Hierarchy
+        time_format -- format of the request dates
+    """
+    height = hierarchy.height
+    levels = sorted(hierarchy.levels)
+    middle = levels[len(levels) // 2]
+    times = hierarchy.times
+    start = times[0].item().strftime(time_format)
+    end = times[-1].item().strftime(time_format)
+    quarter = times[len(times) // 4].item().strftime(time_format)
+    node_ids = hierarchy.store.ids[:50].tolist()
+    embedding = [0.0] * (hierarchy.embeddings.shape[1]
+                         if hierarchy.embeddings.ndim == 2 else 128)
+
+    requests = [
+        ('get_hierarchy_meta', 'meta', 'GET', '/hierarchy_meta', {}, None),
+        ('get_intervall_tree', 'quarter', 'GET', '/intervall_tree', {
+            'start_dateTime': start,
+            'end_dateTime': quarter
+        }, None),
+        ('get_timeseries', 'all', 'GET', '/timeseries', {
+            'start_dateTime': start,
+            'end_dateTime': end
+        }, None),
+        ('get_timeseries', '1000 points', 'GET', '/timeseries', {
+            'start_dateTime': start,
+            'end_dateTime': end,
+            'max_points': 1000
+        }, None),
+        ('get_all_nodes', 'all', 'GET', '/get_all_nodes', {}, None),
+        ('search_nodes', 'prefix', 'GET', '/search_nodes', {
+            'q': 'node_1',
+            'mode': 'prefix'
+        }, None),
+        ('search_nodes', 'substring', 'GET', '/search_nodes', {
+            'q': '_12'
+        }, None),
+        ('node_timeline', '50 nodes', 'POST', '/node_timeline', {},
+         json.dumps({'nodes': node_ids})),
+        ('node_snapshots', '50 nodes', 'POST', '/node_snapshots', {},
+         json.dumps({'nodes': node_ids})),
+        ('filter_nodes', '50 nodes', 'POST', '/filter_nodes', {},
+         json.dumps(node_ids)),
+        ('check_graph', 'root', 'GET', '/check_graph', {
+            'level': height,
+            'num': 0
+        }, None),
+        ('search_all_levels', 'k=10', 'GET', '/search_all_levels', {
+            'embedding': json.dumps(embedding),
+            'levels': json.dumps(levels),
+            'k': 10
+        }, None),
+        ('get_animation_data', 'level 2', 'GET', '/animation_data', {
+            'level': 2,
+            'num': 0
+        }, None),
+        ('get_animation_stream', 'level ' + str(middle), 'GET',
+         '/animation_stream', {
+             'level': middle,
+             'num': 0
+         }, None),
+    ]
+    for level in [2, middle, height]:
+        for graph_type in ['union', 'disjoint', 'intersection']:
+            requests.append(
+                ('get_graph', graph_type + ' level ' + str(level), 'GET',
+                 '/graph', {
+                     'level': level,
+                     'num': 0,
+                     'graph_type': graph_type,
+                     'k': 2,
+                     'cluster': 'false'
+                 }, None))
+    for fmt in ['columnar', 'binary']:
+        requests.append(('get_graph', 'union root ' + fmt, 'GET', '/graph', {
+            'level': height,
+            'num': 0,
+            'graph_type': 'union',
+            'cluster': 'false',
+            'format': fmt
+        }, None))
+    for method in ['label_propagation', 'greedy']:
+        requests.append(('get_graph', 'union root cluster ' + method, 'GET',
+                         '/graph', {
+                             'level': height,
+                             'num': 0,
+                             'graph_type': 'union',
+                             'cluster': 'true',
+                             'cluster_method': method
+                         }, None))
+    for method in ['degree', 'stratified']:
+        for tier, since in [(0, None), (1, 250)]:
+            query = {
+                'level': height,
+                'num': 0,
+                'graph_type': 'union',
+                'cluster': 'false',
+                'detail': method,
+                'tier': tier
+            }
+            if since is not None:
+                query['since'] = since
+            requests.append(('get_graph', 'union root detail ' + method +
+                             ' tier ' + str(tier), 'GET', '/graph', query,
+                             None))
+    cells = [{
+        'level': middle,
+        'num': num,
+        'graph_type': 'union',
+        'k': 2
+    } for num in range(min(32, len(hierarchy.levels[middle].snapshots)))]
+    requests.append(('get_graphs', str(len(cells)) + ' cells level ' +
+                     str(middle), 'POST', '/graphs', {},
+                     json.dumps({
+                         'requests': cells,
+                         'format': 'columnar'
+                     })))
+    requests.append(('get_cache_stats', 'stats', 'GET', '/cache_stats', {},
+                     None))
+    requests.append(('get_metrics', 'prometheus', 'GET', '/metrics', {},
+                     None))
+    requests.append(('ingest', 'next time step', 'POST', '/ingest', {},
+                     None))
+    return requests
+
+
+def ingest_body(hierarchy, rng):
+    """Return the ingest request body of a graph of the next time step
+    """
+    t = hierarchy.times[-1] + np.timedelta64(1, 'h')
+    day = t.astype('datetime64[D]')
+    ids = hierarchy.store.ids
+    nodes = rng.choice(ids, min(20, len(ids)), replace=False).tolist()
+    links = [{
+        'source': nodes[i],
+        'target': nodes[i + 1],
+        'sentiment': 1,
+        'time': str(t)
+    } for i in range(len(nodes) - 1)]
+    return json.dumps({
+        'graph': {
+            'time': [str(day), int((t - day) // np.timedelta64(1, 'h'))],
+            'nodes': [{
+                'id': x
+            } for x in nodes],
+            'links': links
+        }
+    })
+
+
+def measure(client, method, path, query, body, repeats):
+    """Return the latency statistics of the request in ms. The first request
+    is cold, the following repeats hit the caches.
+    """
+    latencies = []
+    status = None
+    size = 0
+    for _ in range(repeats + 1):
+        start = time.perf_counter()
+        if method == 'POST':
+            response = client.post(path, query_string=query, data=body())
+        else:
+            response = client.get(path, query_string=query)
+        data = response.get_data()
+        latencies.append(1000 * (time.perf_counter() - start))
+        status = response.status_code
+        size = len(data)
+    warm = latencies[1:] or latencies
+    return {
+        'status': status,
+        'bytes': size,
+        'cold_ms': latencies[0],
+        'median_ms': float(np.median(warm)),
+        'p95_ms': float(np.percentile(warm, 95))
+    }
+
+
+def generate(config, path):
+    """Write the synthetic dataset of the config to path. Returns the time
+    in seconds.
+    """
+    start = time.perf_counter()
+    store = generate_store(config['steps'], config['nodes'], config['active'],
+                           config['churn'], config['density'],
+                           seed=config['seed'])
+    if config['embeddings']:
+        embeddings = random_embeddings(len(store), config['dims'],
+                                       config['seed'])
+    else:
+        embeddings = no_embeddings(config['dims'])
+    write(path, store, embeddings)
+    return time.perf_counter() - start
+
+
+def run_queued(queue, config, path):
+    """Put the (ok, result or traceback) of run on the queue
+    """
+    try:
+        queue.put((True, run(config, path)))
+    except Exception:
+        queue.put((False, traceback.format_exc()))
+
+
+def run_process(context, config, path):
+    """Return the results of run computed in a new process. The process is
+    not daemonic - the metrics table is computed with a process pool.
+
+        Keyword arguments:
+        context -- multiprocessing context
+        config -- dict of the benchmark parameters
+        path -- directory of the dataset
+    """
+    queue = context.Queue()
+    process = context.Process(target=run_queued, args=(queue, config, path))
+    process.start()
+    try:
+        ok, result = queue.get()
+    finally:
+        process.join()
+    if not ok:
+        raise RuntimeError('Benchmark of ' + path + ' failed:\n' + result)
+    return result
+
+
+def run(config, path):
+    """Return the benchmark results of the dataset. Runs in its own process
+    - the peak memory and the module state are per dataset.
+
+        Keyword arguments:
+        config -- dict of the benchmark parameters
+        path -- directory of the dataset, the caches are written next to it
+    """
+    import model
+    from app import app
+    from dataset import open_dataset
+    from metrics import load_metrics_table
+
+    directory = os.path.dirname(path)
+    memory_before = peak_memory_mb()
+
+    # the steps of load_data
+    start = time.perf_counter()
+    store, embeddings = open_dataset(path)
+    open_s = time.perf_counter() - start
+    start = time.perf_counter()
+    metrics_table = load_metrics_table(path + '_metrics.npz', store,
+                                       store.content_hash())
+    metrics_s = time.perf_counter() - start
+    start = time.perf_counter()
+    model.hierarchy = model.Hierarchy(store, embeddings, metrics_table,
+                                      config['lazy'], directory)
+    build_s = time.perf_counter() - start
+    memory_after = peak_memory_mb()
+
+    # second build from the warm-start cache
+    start = time.perf_counter()
+    model.hierarchy = model.Hierarchy(store, embeddings, metrics_table,
+                                      config['lazy'], directory)
+    warm_build_s = time.perf_counter() - start
+
+    rng = np.random.RandomState(config['seed'])
+    client = app.test_client()
+    routes = []
+    for endpoint, label, method, url, query, body in route_requests(
+            model.hierarchy, model.time_format):
+        if endpoint == 'ingest':
+            body = lambda: ingest_body(model.hierarchy, rng)
+        else:
+            body = (lambda b: lambda: b)(body)
+        result = measure(client, method, url, query, body, config['repeats'])
+        result.update({'endpoint': endpoint, 'request': label})
+        routes.append(result)
+
+    # every route of the blueprint is benchmarked
+    endpoints = {r['endpoint'] for r in routes}
+    missing = sorted(
+        rule.endpoint.split('.', 1)[1] for rule in app.url_map.iter_rules()
+        if rule.endpoint.startswith('api.')
+        and rule.endpoint.split('.', 1)[1] not in endpoints)
+
+    return {
+        'steps': config['steps'],
+        'nodes': len(store.ids),
+        'edges': len(store.edge_u),
+        'height': model.hierarchy.height,
+        'open_s': open_s,
+        'metrics_s': metrics_s,
+        'build_s': build_s,
+        'warm_build_s': warm_build_s,
+        'peak_memory_mb': memory_after,
+        'build_memory_mb': memory_after - memory_before,
+        'routes': routes,
+        'missing_routes': missing
+    }
+
+
+def report(r):
+    """Print the results of one dataset
+    """
+    print('{} steps - {} nodes - {} edges - height {}'.format(
+        r['steps'], r['nodes'], r['edges'], r['height']))
+    print('  open={:.2f}s metrics={:.2f}s build={:.2f}s warm build={:.2f}s '
+          'peak memory={:.0f}MB'.format(r['open_s'], r['metrics_s'],
+                                        r['build_s'], r['warm_build_s'],
+                                        r['peak_memory_mb']))
+    for x in r['routes']:
+        print('  {:<22} {:<40} {:>4} cold={:>9.2f}ms median={:>9.2f}ms '
+              'p95={:>9.2f}ms'.format(x['endpoint'], x['request'], x['status'],
+                                      x['cold_ms'], x['median_ms'],
+                                      x['p95_ms']))
+    if r['missing_routes']:
+        print('  not benchmarked: ' + ', '.join(r['missing_routes']))
+
+
+def git_commit():
+    """Return the commit of the working tree or None
+    """
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                       cwd=root,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold):
+    """Print the timings which changed by more than threshold relative to the
+    baseline results. Returns the number of regressions.
+    """
+    regressions = 0
+    previous = {r['steps']: r for r in baseline['results']}
+    for r in results['results']:
+        b = previous.get(r['steps'])
+        if b is None:
+            continue
+        pairs = [(name, r[name], b[name])
+                 for name in ['open_s', 'metrics_s', 'build_s', 'warm_build_s']]
+        old_routes = {(x['endpoint'], x['request']): x for x in b['routes']}
+        for x in r['routes']:
+            old = old_routes.get((x['endpoint'], x['request']))
+            if old:
+                pairs.append((x['endpoint'] + ' ' + x['request'],
+                              x['median_ms'], old['median_ms']))
+        for name, new, old in pairs:
+            if old <= 0:
+                continue
+            change = (new - old) / old
+            if abs(change) > threshold:
+                regressions += change > 0
+                print('{:>6} steps {:<50} {:>10.3f} -> {:>10.3f} {:+.0%}'.format(
+                    r['steps'], name, old, new, change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the hierarchy build and the API routes on '
+        'synthetic dynamic graphs.')
+    parser.add_argument('--steps', type=int, nargs='+',
+                        default=[512, 2048, 8192],
+                        help='numbers of time steps of the datasets')
+    parser.add_argument('--nodes', type=int, default=1000,
+                        help='number of nodes of the node pool')
+    parser.add_argument('--active', type=int, default=200,
+                        help='number of active nodes per time step')
+    parser.add_argument('--churn', type=float, default=0.1,
+                        help='fraction of the active nodes replaced per '
+                        'time step')
+    parser.add_argument('--density', type=float, default=0.02,
+                        help='edge density of the graphs of the active nodes')
+    parser.add_argument('--no-embeddings', action='store_true',
+                        help='datasets without embeddings')
+    parser.add_argument('--dims', type=int, default=128)
+    parser.add_argument('--lazy', action='store_true',
+                        help='lazy hierarchy construction')
+    parser.add_argument('--repeats', type=int, default=5,
+                        help='warm requests per route')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='write the results to a json file')
+    parser.add_argument('--compare',
+                        help='json results of a previous run to compare to')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='relative change reported by --compare')
+    args = parser.parse_args()
+
+    results = {
+        'date': datetime.datetime.utcnow().isoformat(),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'parameters': {
+            'nodes': args.nodes,
+            'active': args.active,
+            'churn': args.churn,
+            'density': args.density,
+            'embeddings': not args.no_embeddings,
+            'lazy': args.lazy,
+            'repeats': args.repeats
+        },
+        'results': []
+    }
+    # a new process per size
+    context = multiprocessing.get_context('spawn')
+    directory = tempfile.mkdtemp(prefix='benchmark_')
+    try:
+        for steps in args.steps:
+            config = dict(results['parameters'],
+                          steps=steps,
+                          dims=args.dims,
+                          seed=args.seed)
+            path = os.path.join(directory, 'synthetic_' + str(steps))
+            generate_s = generate(config, path)
+            r = run_process(context, config, path)
+            r['generate_s'] = generate_s
+            results['results'].append(r)
+            report(r)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        print(str(regressions) + ' regressions above ' +
+              str(round(100 * args.threshold)) + '%')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+generate - synthetic dynamic graphs for tests and benchmarks. Every time step
+           connects random pairs of the active nodes, a fraction of the
+           active nodes is replaced by inactive nodes of the node pool per
+           time step. The graphs are written in the binary dataset format or
+           as pickled graphs and embeddings - both are accepted by load_data.
+           Usage:
+
+    python scripts/generate.py data/synthetic --steps 4096 --nodes 5000
+    python scripts/generate.py data/synthetic.pkl --format pickle
+"""
+
+# Author: Eren Cakmak <eren.cakmak@uni-konstanz.de>
+#
+# License: MIT
+
+import os
+import sys
+import time
+import pickle
+import argparse
+
+import numpy as np
+
+# the modules of the app are in the parent directory
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..'))
+
+from dataset import save_dataset
+from embedding import (embedders, embed_snapshots, level_keys,
+                       num_summary_graphs)
+from store import TemporalGraphStore
+
+formats = ['dataset', 'pickle']
+
+
+def generate_store(steps,
+                   nodes=1000,
+                   active=200,
+                   churn=0.1,
+                   density=0.02,
+                   negative=0.1,
+                   start='2014-01-01',
+                   seed=0):
+    """Return a TemporalGraphStore of hourly synthetic graphs.
+
+        Keyword arguments:
+        steps -- number of time steps
+        nodes -- number of nodes of the node pool
+        active -- number of active nodes per time step
+        churn -- fraction of the active nodes replaced per time step
+        density -- edge density of the graphs of the active nodes
+        negative -- fraction of the edges with negative sentiment
+        start -- date of the first time step
+        seed -- seed of the random generator
+    """
+    rng = np.random.RandomState(seed)
+    active = min(active, nodes)
+    num_edges = int(round(density * active * (active - 1) / 2))
+    replaced = int(round(churn * active))
+    times = np.datetime64(start, 's') + np.arange(steps) * np.timedelta64(
+        1, 'h')
+
+    current = rng.choice(nodes, active, replace=False)
+    node_index = []
+    edge_u = []
+    edge_v = []
+    for _ in range(steps):
+        if replaced:
+            # replace random active nodes with inactive nodes
+            inactive = np.setdiff1d(np.arange(nodes), current)
+            count = min(replaced, len(inactive))
+            current[rng.choice(active, count, replace=False)] = rng.choice(
+                inactive, count, replace=False)
+        u = current[rng.randint(active, size=num_edges)]
+        v = current[rng.randint(active, size=num_edges)]
+        # no self loops, each undirected edge once
+        keys = np.unique(
+            np.minimum(u, v)[u != v].astype(np.int64) * nodes +
+            np.maximum(u, v)[u != v])
+        edge_u.append(keys // nodes)
+        edge_v.append(keys % nodes)
+        # the nodes of a graph are the nodes of its edges
+        node_index.append(np.unique(np.concatenate([edge_u[-1],
+                                                    edge_v[-1]])))
+
+    edge_counts = [len(u) for u in edge_u]
+    edge_u = np.concatenate(edge_u).astype(np.int32)
+    edge_v = np.concatenate(edge_v).astype(np.int32)
+    edge_time = np.repeat(times, edge_counts) + rng.randint(
+        3600, size=len(edge_u)).astype('timedelta64[s]')
+    edge_sentiment = np.where(
+        rng.random_sample(len(edge_u)) < negative, -1, 1).astype(np.int8)
+
+    return TemporalGraphStore(
+        times, np.concatenate([[0], np.cumsum([len(n) for n in node_index])]),
+        np.concatenate(node_index).astype(np.int32),
+        np.concatenate([[0], np.cumsum(edge_counts)]), edge_u, edge_v,
+        edge_sentiment, edge_time.astype('datetime64[s]'),
+        np.arange(nodes, dtype=np.int64),
+        np.array(['node_' + str(x) for x in range(nodes)], dtype=str),
+        rng.uniform(-1, 1, size=(nodes, 2)))
+
+
+def random_embeddings(length, dims=128, seed=0):
+    """Return random embeddings of all snapshots of a hierarchy of length
+    time steps with the keys 'level_num' like embed_snapshots.
+
+        Keyword arguments:
+        length -- number of time steps
+        dims -- dimensions of the embeddings
+        seed -- seed of the random generator
+    """
+    keys = [
+        str(level) + '_' + str(num) for level, num in level_keys(length)
+        for _ in range(num_summary_graphs)
+    ]
+    rng = np.random.RandomState(seed)
+    return {'embeddings': rng.normal(size=(len(keys), dims)), 'keys': keys}
+
+
+def no_embeddings(dims=128):
+    """Return the embeddings of a dataset without embeddings
+    """
+    return {
+        'embeddings': np.empty((0, dims)),
+        'keys': np.empty(0, dtype=str)
+    }
+
+
+def to_graphs(store):
+    """Return the graphs of the store as networkX graphs with the
+    (date, hour) tuple as time attribute like the pickled graphs
+    """
+    graphs = []
+    for i in range(len(store)):
+        G = store[i]
+        t = store.times[i]
+        G.graph['time'] = (str(t.astype('datetime64[D]')),
+                           int((t - t.astype('datetime64[D]')) //
+                               np.timedelta64(1, 'h')))
+        graphs.append(G)
+    return graphs
+
+
+def write(path, store, embeddings, fmt='dataset'):
+    """Write the graphs and the embeddings in a format of load_data. Returns
+    the arguments of load_data.
+
+        Keyword arguments:
+        path -- directory of the dataset or path of the pickled graphs, the
+                embeddings are pickled next to it ('_embeddings.pkl')
+        store -- TemporalGraphStore of the graphs
+        embeddings -- dict with the embeddings and keys
+        fmt -- 'dataset' or 'pickle'
+    """
+    if fmt == 'dataset':
+        save_dataset(path, store, embeddings)
+        return path, None
+    if fmt != 'pickle':
+        raise ValueError('Unknown format: ' + fmt)
+    embeddings_path = os.path.splitext(path)[0] + '_embeddings.pkl'
+    with open(path, 'wb') as f:
+        pickle.dump(to_graphs(store), f)
+    with open(embeddings_path, 'wb') as f:
+        pickle.dump(embeddings, f)
+    return path, embeddings_path
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Generate a synthetic dynamic graph in a format of '
+        'load_data.')
+    parser.add_argument('out',
+                        help='directory of the dataset or path of the '
+                        'pickled graphs')
+    parser.add_argument('--format', choices=formats, default='dataset')
+    parser.add_argument('--steps', type=int, default=2048,
+                        help='number of time steps')
+    parser.add_argument('--nodes', type=int, default=1000,
+                        help='number of nodes of the node pool')
+    parser.add_argument('--active', type=int, default=200,
+                        help='number of active nodes per time step')
+    parser.add_argument('--churn', type=float, default=0.1,
+                        help='fraction of the active nodes replaced per '
+                        'time step')
+    parser.add_argument('--density', type=float, default=0.02,
+                        help='edge density of the graphs of the active nodes')
+    parser.add_argument('--embeddings',
+                        choices=['none', 'random'] + sorted(embedders),
+                        default='random',
+                        help='random embeddings, an embedding model or none')
+    parser.add_argument('--dims', type=int, default=128,
+                        help='dimensions of the random embeddings')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--processes',
+                        type=int,
+                        default=None,
+                        help='number of worker processes of the embedding '
+                        'model')
+    args = parser.parse_args()
+
+    start = time.time()
+    store = generate_store(args.steps, args.nodes, args.active, args.churn,
+                           args.density, seed=args.seed)
+    print(store)
+    if args.embeddings == 'none':
+        embeddings = no_embeddings(args.dims)
+    elif args.embeddings == 'random':
+        embeddings = random_embeddings(len(store), args.dims, args.seed)
+    else:
+        embeddings = embed_snapshots(store, args.embeddings,
+                                     processes=args.processes)
+    write(args.out, store, embeddings, args.format)
+    print('Written to ' + args.out + ' in ' +
+          str(round(time.time() - start, 1)) + 's')
+
+
+if __name__ == "__main__":
+    main()
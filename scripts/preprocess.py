@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+"""
+preprocess - command line pipeline which converts the Reddit hyperlink network
+             of SNAP (https://snap.stanford.edu/data/soc-RedditHyperlinks.html)
+             into hourly graphs in the binary dataset format (see dataset.py).
+
+The TSV file is read in chunks and the hourly graphs are built with
+vectorized grouping of the edge arrays. Blocks of hours are independent and
+built in a process pool. Usage:
+
+    python scripts/preprocess.py soc-redditHyperlinks-body.tsv data/reddit
+"""
+
+# Author: Eren Cakmak <eren.cakmak@uni-konstanz.de>
+#
+# License: MIT
+
+import os
+import sys
+import time
+import pickle
+import logging
+import argparse
+from multiprocessing import Pool
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+
+# the modules of the app are in the parent directory
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..'))
+
+from dataset import save_dataset
+from embedding import (default_model, embedders, embed_snapshots,
+                       embedding_cache_path)
+from metrics import load_metrics_table
+from store import TemporalGraphStore
+
+columns = ['SOURCE_SUBREDDIT', 'TARGET_SUBREDDIT', 'TIMESTAMP', 'LINK_SENTIMENT']
+
+layouts = {
+    'spring': lambda G, iterations: nx.spring_layout(G, iterations=iterations),
+    'spectral': lambda G, iterations: nx.spectral_layout(G),
+    'circular': lambda G, iterations: nx.circular_layout(G),
+    'random': lambda G, iterations: nx.random_layout(G)
+}
+
+
+def read_edges(path, chunksize=1000000):
+    """Return the edge arrays (source, target, time, sentiment) of the TSV
+    file and the names of the subreddits. The subreddits are numbered in the
+    order of their first occurence, sources before targets of each chunk.
+
+        Keyword arguments:
+        path -- path of the SNAP TSV file
+        chunksize -- number of rows read at once
+    """
+    names = pd.Index([])
+    chunks = []
+    for df in pd.read_csv(path, sep='\t', usecols=columns,
+                          chunksize=chunksize):
+        # number the subreddits of the chunk which are not known yet
+        unique = pd.unique(df[['SOURCE_SUBREDDIT',
+                               'TARGET_SUBREDDIT']].values.ravel('K'))
+        names = names.append(pd.Index(unique[names.get_indexer(unique) < 0]))
+        chunks.append(
+            (names.get_indexer(df['SOURCE_SUBREDDIT'].values),
+             names.get_indexer(df['TARGET_SUBREDDIT'].values),
+             pd.to_datetime(df['TIMESTAMP']).values.astype('datetime64[s]'),
+             df['LINK_SENTIMENT'].values.astype(np.int8)))
+
+    source, target, times, sentiment = [
+        np.concatenate([c[i] for c in chunks]) for i in range(4)
+    ]
+    return source, target, times, sentiment, np.array(names, dtype=str)
+
+
+def first_occurences(keys):
+    """Return the positions of the first occurence of every key in the
+    order of the positions
+    """
+    _, first = np.unique(keys, return_index=True)
+    return np.sort(first)
+
+
+def build_block(args):
+    """Return the arrays of the hourly graphs of a block of edges. Every
+    graph contains the nodes in the order of their first occurence and each
+    undirected edge once with the attributes of its last occurence - like
+    adding the edges one by one to a networkX graph.
+
+        Keyword arguments:
+        args -- (hour, source, target, time, sentiment) edge arrays of whole
+                hours sorted by hour
+    """
+    hour, source, target, times, sentiment = args
+    hours, group = np.unique(hour, return_inverse=True)
+    group = group.astype(np.int64)
+    n = np.int64(max(source.max(), target.max()) + 1) if len(source) else 1
+
+    # nodes - source and target of each edge in order
+    node_group = np.repeat(group, 2)
+    nodes = np.column_stack([source, target]).ravel()
+    first = first_occurences(node_group * n + nodes)
+    node_counts = np.bincount(node_group[first], minlength=len(hours))
+
+    # edges - ordered by first occurence with the attributes of the last
+    u = np.minimum(source, target).astype(np.int64)
+    v = np.maximum(source, target).astype(np.int64)
+    keys = (group * n + u) * n + v
+    first_edges = first_occurences(keys)
+    unique, last = np.unique(keys[::-1], return_index=True)
+    # last occurence of the key of every first occurence
+    last = len(keys) - 1 - last[np.searchsorted(unique, keys[first_edges])]
+    edge_counts = np.bincount(group[first_edges], minlength=len(hours))
+
+    return (hours, node_counts, nodes[first], edge_counts,
+            source[first_edges], target[first_edges], sentiment[last],
+            times[last])
+
+
+def build_store(source, target, times, sentiment, names, layout, iterations,
+                processes, last=None):
+    """Return the TemporalGraphStore of the hourly graphs.
+
+        Keyword arguments:
+        source, target, times, sentiment -- edge arrays
+        names -- names of the subreddits
+        layout -- name of the graph layout of the nodes
+        iterations -- iterations of the spring layout
+        processes -- number of worker processes
+        last -- keep only the last hours if not None
+    """
+    hour = times.astype('datetime64[h]')
+    # stable - the edges of an hour stay in the order of the file
+    order = np.argsort(hour, kind='stable')
+    hour, source, target, times, sentiment = [
+        a[order] for a in [hour, source, target, times, sentiment]
+    ]
+    if last:
+        start = np.searchsorted(hour, np.unique(hour)[-last:][0])
+        hour, source, target, times, sentiment = [
+            a[start:] for a in [hour, source, target, times, sentiment]
+        ]
+
+    # blocks of whole hours are independent
+    processes = processes or os.cpu_count()
+    bounds = np.searchsorted(
+        hour, np.unique(hour)[::max(1,
+                                    len(np.unique(hour)) //
+                                    (4 * processes))])
+    bounds = np.append(bounds, len(hour))
+    blocks = [
+        tuple(a[i:j] for a in [hour, source, target, times, sentiment])
+        for i, j in zip(bounds[:-1], bounds[1:])
+    ]
+    if processes == 1 or len(blocks) < 2:
+        results = list(map(build_block, blocks))
+    else:
+        with Pool(processes) as pool:
+            results = pool.map(build_block, blocks)
+    (hours, node_counts, nodes, edge_counts, edge_u, edge_v, edge_sentiment,
+     edge_time) = [np.concatenate([r[i] for r in results]) for i in range(8)]
+
+    # node table of the subreddits in the graphs
+    ids = np.unique(nodes)
+    coords = compute_layout(ids, edge_u, edge_v, layout, iterations)
+
+    return TemporalGraphStore(
+        hours.astype('datetime64[s]'),
+        np.concatenate([[0], np.cumsum(node_counts)]),
+        np.searchsorted(ids, nodes).astype(np.int32),
+        np.concatenate([[0], np.cumsum(edge_counts)]),
+        np.searchsorted(ids, edge_u).astype(np.int32),
+        np.searchsorted(ids, edge_v).astype(np.int32),
+        edge_sentiment.astype(np.int8), edge_time.astype('datetime64[s]'),
+        ids.astype(np.int64), names[ids], coords)
+
+
+def compute_layout(ids, edge_u, edge_v, layout, iterations):
+    """Return the coordinates of the nodes in the layout of the union graph
+    of all time steps.
+
+        Keyword arguments:
+        ids -- node ids
+        edge_u, edge_v -- node ids of the edges
+        layout -- name of the layout
+        iterations -- iterations of the spring layout
+    """
+    G = nx.Graph()
+    G.add_nodes_from(ids.tolist())
+    keys = np.unique(np.column_stack(
+        [np.minimum(edge_u, edge_v),
+         np.maximum(edge_u, edge_v)]),
+                     axis=0) if len(edge_u) else np.empty((0, 2), dtype=int)
+    G.add_edges_from(keys.tolist())
+    positions = layouts[layout](G, iterations)
+    return np.array([positions[x] for x in ids.tolist()],
+                    dtype=float).reshape(-1, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Preprocess the Reddit hyperlink network of SNAP into '
+        'hourly graphs in the binary dataset format.')
+    parser.add_argument('tsv', help='path of the SNAP TSV file')
+    parser.add_argument('out', help='directory of the dataset')
+    parser.add_argument('--embeddings',
+                        help='pickled embeddings of the snapshots, computed '
+                        'with the embedding model if not given')
+    parser.add_argument('--model',
+                        choices=sorted(embedders),
+                        default=default_model,
+                        help='embedding model of the snapshots, Graph2Vec '
+                        'like the notebook by default')
+    parser.add_argument('--layout', choices=sorted(layouts), default='spring')
+    parser.add_argument('--iterations',
+                        type=int,
+                        default=100,
+                        help='iterations of the spring layout')
+    parser.add_argument('--chunksize',
+                        type=int,
+                        default=1000000,
+                        help='number of rows read at once')
+    parser.add_argument('--processes',
+                        type=int,
+                        default=None,
+                        help='number of worker processes')
+    parser.add_argument('--last',
+                        type=int,
+                        default=None,
+                        help='keep only the last hours')
+    args = parser.parse_args()
+    # progress of the embedding stage
+    logging.basicConfig(level=logging.INFO)
+
+    start = time.time()
+    source, target, times, sentiment, names = read_edges(
+        args.tsv, args.chunksize)
+    print('Read ' + str(len(source)) + ' edges of ' + str(len(names)) +
+          ' subreddits')
+
+    store = build_store(source, target, times, sentiment, names, args.layout,
+                        args.iterations, args.processes, args.last)
+    print(store)
+
+    if args.embeddings:
+        with open(args.embeddings, 'rb') as f:
+            embeddings = pickle.load(f)
+    else:
+        embeddings = embed_snapshots(
+            store, args.model, processes=args.processes,
+            cache_path=embedding_cache_path(args.out, args.model))
+    save_dataset(args.out, store, embeddings)
+
+    # the metrics table is stored next to the dataset like in load_data
+    load_metrics_table(args.out.rstrip('/') + '_metrics.npz', store,
+                       store.content_hash(), args.processes)
+    print('Dataset written to ' + args.out + ' in ' +
+          str(round(time.time() - start, 1)) + 's')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+"""
+serialize - encoding of the graph responses. Besides the networkX node-link
+            format the graphs are encoded column wise: the node ids and
+            attributes are parallel arrays and the edges are index arrays
+            into the nodes. The binary variant stores the numeric columns as
+            raw little endian arrays. The animation frames are streamed as
+            newline delimited json with the changes between the frames.
+"""
+
+# Author: Eren Cakmak <eren.cakmak@uni-konstanz.de>
+#
+# License: MIT
+
+import gzip
+import struct
+import calendar
+import datetime
+
+import networkx as nx
+import numpy as np
+from flask import json
+from networkx.readwrite import json_graph
+
+formats = ['node_link', 'columnar', 'binary']
+binary_magic = b'MSG1'
+binary_align = 8
+
+
+def _column(values):
+    """Return the column of attribute values - datetimes are converted to
+    seconds since epoch. Returns (values, is_date).
+    """
+    if values and all(isinstance(v, datetime.datetime) for v in values):
+        return [calendar.timegm(v.utctimetuple()) for v in values], True
+    return values, False
+
+
+def _columns(items):
+    """Return the attribute columns and the names of the date columns of the
+    attribute dicts.
+
+        Keyword arguments:
+        items -- list of attribute dicts
+    """
+    keys = []
+    for d in items:
+        for key in d:
+            if key not in keys:
+                keys.append(key)
+    columns = {}
+    dates = []
+    for key in keys:
+        columns[key], is_date = _column([d.get(key) for d in items])
+        if is_date:
+            dates.append(key)
+    return columns, dates
+
+
+def to_columnar(G):
+    """Return the graph as a dict of parallel arrays.
+
+        Keyword arguments:
+        G -- networkX graph
+    """
+    nodes = list(G.nodes(data=True))
+    index = {x: i for i, (x, _) in enumerate(nodes)}
+    node_columns, node_dates = _columns([d for _, d in nodes])
+    node_columns['id'] = [x for x, _ in nodes]
+
+    edges = list(G.edges(data=True))
+    link_columns, link_dates = _columns([d for _, _, d in edges])
+    link_columns['source'] = [index[u] for u, _, _ in edges]
+    link_columns['target'] = [index[v] for _, v, _ in edges]
+
+    return {
+        'format': 'columnar',
+        'graph': G.graph,
+        'nodes': node_columns,
+        'links': link_columns,
+        'dates': {
+            'nodes': node_dates,
+            'links': link_dates
+        }
+    }
+
+
+def _numeric(values):
+    """Return the numpy array of a column if all values are numbers (or pairs
+    of numbers) else None
+    """
+    if not values:
+        return None
+    try:
+        a = np.array(values)
+    except ValueError:
+        return None
+    if a.dtype.kind == 'f':
+        return a.astype('<f8')
+    if a.dtype.kind in 'iu' and np.all(np.abs(a) < 2**31):
+        return a.astype('<i4')
+    return None
+
+
+def to_binary(G):
+    """Return the columnar graph as bytes. Layout: magic, uint32 header
+    length, json header, numeric columns aligned to 8 bytes. The header
+    describes each binary column with dtype, offset and shape relative to
+    the start of the buffer.
+
+        Keyword arguments:
+        G -- networkX graph
+    """
+    data = to_columnar(G)
+    buffers = []
+    offset = 0
+    for group in ['nodes', 'links']:
+        for key, values in list(data[group].items()):
+            a = _numeric(values)
+            if a is None:
+                continue
+            buffers.append(a.tobytes())
+            data[group][key] = {
+                'dtype': a.dtype.str,
+                'offset': offset,
+                'shape': list(a.shape)
+            }
+            offset += -(-a.nbytes // binary_align) * binary_align
+    data['binary'] = [
+        key for group in ['nodes', 'links'] for key, value in
+        data[group].items() if isinstance(value, dict)
+    ]
+
+    header = json.dumps(data).encode('utf-8')
+    # the buffers start aligned after magic, length and header
+    start = len(binary_magic) + 4 + len(header)
+    header += b' ' * (-start % binary_align)
+    body = b''.join(b + b'\0' * (-len(b) % binary_align) for b in buffers)
+    return binary_magic + struct.pack('<I', len(header)) + header + body
+
+
+def encode_graph(G, fmt='node_link'):
+    """Return the encoded graph as (bytes, mimetype).
+
+        Keyword arguments:
+        G -- networkX graph
+        fmt -- one of the formats
+    """
+    if fmt == 'binary':
+        return to_binary(G), 'application/octet-stream'
+    if fmt == 'columnar':
+        data = to_columnar(G)
+    else:
+        data = json_graph.node_link_data(G)
+    return json.dumps(data).encode('utf-8'), 'application/json'
+
+
+def encode_graphs(graphs, fmt='node_link'):
+    """Return the encoded list of graphs as (bytes, mimetype). The binary
+    format is not supported for lists.
+
+        Keyword arguments:
+        graphs -- list of networkX graphs
+        fmt -- node_link or columnar
+    """
+    if fmt == 'columnar':
+        data = [to_columnar(G) for G in graphs]
+    else:
+        data = [json_graph.node_link_data(G) for G in graphs]
+    return json.dumps(data).encode('utf-8'), 'application/json'
+
+
+def parse_graph(data):
+    """Return the networkX graph of a time step in the json format of the
+    ingest: {'time': [date, hour], 'nodes': [{'id', 'name', 'coord'}],
+    'links': [{'source', 'target', 'sentiment', 'time'}]} with dates as ISO
+    strings.
+
+        Keyword arguments:
+        data -- dict of the graph
+    """
+    G = nx.Graph(time=(data['time'][0], int(data['time'][1])))
+    for n in data['nodes']:
+        G.add_node(int(n['id']),
+                   **{key: value
+                      for key, value in n.items() if key != 'id'})
+    for l in data['links']:
+        G.add_edge(int(l['source']),
+                   int(l['target']),
+                   sentiment=int(l['sentiment']),
+                   time=l['time'])
+    return G
+
+
+def node_link_delta(store, time, delta):
+    """Return the changes of a frame in the node-link style as dict.
+
+        Keyword arguments:
+        store -- TemporalGraphStore of the graphs
+        time -- time of the frame
+        delta -- (nodes added, nodes removed, edges added, edges removed) of
+                 TemporalGraphStore.frame_delta
+    """
+    nodes_added, nodes_removed, edges_added, edges_removed = delta
+    ids, node_attrs = store.node_attributes(nodes_added)
+    u, v, edge_attrs = store.edge_attributes(edges_added)
+    removed_u = store.ids[store.edge_u[edges_removed]].tolist()
+    removed_v = store.ids[store.edge_v[edges_removed]].tolist()
+    return {
+        'type': 'delta',
+        'time': time,
+        'nodes_added': [dict(d, id=x) for x, d in zip(ids, node_attrs)],
+        'nodes_removed': store.ids[nodes_removed].tolist(),
+        'links_added':
+        [dict(d, source=a, target=b) for a, b, d in zip(u, v, edge_attrs)],
+        'links_removed': [[a, b] for a, b in zip(removed_u, removed_v)]
+    }
+
+
+def animation_stream(store, indices, mask=None):
+    """Yield the animation frames of the time steps as lines of json. The
+    first frame is a full node-link graph, the following frames only contain
+    the added and removed nodes and edges. Only two frames are kept in memory.
+
+        Keyword arguments:
+        store -- TemporalGraphStore of the graphs
+        indices -- time steps of the frames
+        mask -- boolean mask over the node table or None
+    """
+    prev = None
+    for i in indices:
+        cur = store.frame(i, mask)
+        # empty graphs are skipped like in the animation data
+        if not len(cur[0]):
+            continue
+        time = store.times[i].item()
+        if prev is None:
+            data = {
+                'type': 'frame',
+                'graph': json_graph.node_link_data(store.to_graph(time, *cur))
+            }
+        else:
+            data = node_link_delta(store, time, store.frame_delta(prev, cur))
+        prev = cur
+        yield json.dumps(data).encode('utf-8') + b'\n'
+
+
+class EncodedResponse:
+    def __init__(self, data, mimetype):
+        """Initialize the encoded response with its gzip compressed variant.
+
+            Keyword arguments:
+            data -- encoded bytes
+            mimetype -- mimetype of the data
+        """
+        self.data = data
+        self.gzip_data = gzip.compress(data, compresslevel=6)
+        self.mimetype = mimetype
+
+    def size(self):
+        """Return the size in bytes
+        """
+        return len(self.data) + len(self.gzip_data)
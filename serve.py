@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+serve - production entry point with gunicorn. The dataset is loaded once
+        before the workers are forked, all workers share the read-only
+        hierarchy copy-on-write. The snapshot computations of a worker run
+        in its bounded pool of forked offload processes. Usage:
+
+    python serve.py data/reddit_graphs.pkl data/reddit_embeddings.pkl
+    python serve.py data/reddit --workers 8 --processes 2
+"""
+
+# Author: Eren Cakmak <eren.cakmak@uni-konstanz.de>
+#
+# License: MIT
+
+import argparse
+import threading
+
+from gunicorn.app.base import BaseApplication
+
+import model
+import offload
+import instrument
+from app import app
+
+
+class Server(BaseApplication):
+    def __init__(self, application, options):
+        """Initialize the gunicorn server of the WSGI application.
+
+            Keyword arguments:
+            application -- WSGI application
+            options -- dict of gunicorn settings
+        """
+        self.application = application
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        return self.application
+
+
+def reset_after_fork():
+    """Reset the state of an offload process inherited from the server
+    thread it was forked from
+    """
+    model.reset_locks()
+    model.graph_cache.set_max_bytes(app.config['OFFLOAD_CACHE_BYTES'])
+    instrument.registry.lock = threading.Lock()
+    instrument.abandon_request()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Serve the app with gunicorn workers sharing the '
+        'read-only hierarchy.')
+    parser.add_argument('graphs',
+                        nargs='?',
+                        default='data/reddit_graphs.pkl',
+                        help='pickled graphs or dataset directory')
+    parser.add_argument('embeddings',
+                        nargs='?',
+                        default='data/reddit_embeddings.pkl',
+                        help='pickled embeddings, not required for the '
+                        'dataset format')
+    parser.add_argument('--bind', default=app.config['SERVER_BIND'])
+    parser.add_argument('--workers',
+                        type=int,
+                        default=app.config['SERVER_WORKERS'],
+                        help='number of server processes')
+    parser.add_argument('--threads',
+                        type=int,
+                        default=app.config['SERVER_THREADS'],
+                        help='number of request threads per server process')
+    parser.add_argument('--processes',
+                        type=int,
+                        default=app.config['OFFLOAD_PROCESSES'],
+                        help='number of offload processes per server process')
+    args = parser.parse_args()
+
+    # the snapshots are built before the fork to be shared by all workers
+    model.load_data(args.graphs, args.embeddings, lazy=False)
+    model.configure_filters(app.config['FILTER_DIR'])
+    model.clear_filters()
+    offload.configure(app.config['REQUEST_TIMEOUT'],
+                      app.config['MAX_REQUEST_TIMEOUT'])
+    offload.views = offload.ViewRegistry()
+    app.config['READ_ONLY'] = True
+
+    def post_fork(server, worker):
+        offload.start(args.processes, [reset_after_fork])
+
+    def on_exit(server):
+        model.clear_filters()
+
+    Server(
+        app, {
+            'bind': args.bind,
+            'workers': args.workers,
+            'worker_class': 'gthread',
+            'threads': args.threads,
+            'post_fork': post_fork,
+            'on_exit': on_exit,
+            'timeout': app.config['MAX_REQUEST_TIMEOUT'] + 30
+        }).run()
+
+
+if __name__ == "__main__":
+    main()
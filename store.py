@@ -0,0 +1,577 @@
+# -*- coding: utf-8 -*-
+"""
+store - array backed storage of the dynamic graph. The edges and node
+        occurences of all time steps are stored in flat numpy arrays sorted by
+        time with offsets per time step. networkX graphs are only
+        materialized on request.
+"""
+
+# Author: Eren Cakmak <eren.cakmak@uni-konstanz.de>
+#
+# License: MIT
+
+import hashlib
+
+import networkx as nx
+import numpy as np
+
+
+def graph_time(G):
+    """Return the time step of the graph as a numpy datetime64.
+
+        Keyword arguments:
+        G -- networkX graph with the (date, hour) tuple as time attribute
+    """
+    date, hour = G.graph['time']
+    return np.datetime64(date, 's') + np.timedelta64(int(hour), 'h')
+
+
+def extend_buffer(a, buf, values):
+    """Return the array a extended by the values and its buffer. The array is
+    a view of the buffer with spare capacity, the buffer is only reallocated
+    (doubled) if it is full - appending is amortized O(len(values)).
+
+        Keyword arguments:
+        a -- array, a view of buf
+        buf -- buffer of the array, None if a is not a view of a buffer yet
+        values -- values to append
+    """
+    if not len(values):
+        return a, buf
+    values = np.asarray(values, dtype=a.dtype
+                        if a.dtype.kind != 'U' else None).reshape(
+                            (-1, ) + a.shape[1:])
+    n = len(a)
+    m = n + len(values)
+    dtype = a.dtype
+    if dtype.kind == 'U':
+        # longer names widen the string array
+        dtype = np.result_type(dtype, values.dtype)
+    if buf is None or len(buf) < m or buf.dtype != dtype:
+        buf = np.empty((max(m, 2 * n, 16), ) + a.shape[1:], dtype=dtype)
+        buf[:n] = a
+    buf[n:m] = values
+    return buf[:m], buf
+
+
+class TemporalGraphStore:
+    def __init__(self, times, node_offsets, node_index, edge_offsets, edge_u,
+                 edge_v, edge_sentiment, edge_time, ids, names, coords):
+        """Initialize the store from its arrays. The nodes are referenced by
+        their index in the node table (ids, names, coords).
+
+            Keyword arguments:
+            times -- sorted datetime64 array of the time steps
+            node_offsets -- offsets of the time steps in node_index
+            node_index -- node occurences of all time steps
+            edge_offsets -- offsets of the time steps in the edge arrays
+            edge_u -- first node index of the edges
+            edge_v -- second node index of the edges
+            edge_sentiment -- sentiment of the edges
+            edge_time -- datetime64 timestamp of the edges
+            ids -- node ids of the node table, new nodes are appended
+            names -- node names of the node table
+            coords -- node coordinates of the node table (nan if unknown)
+        """
+        self.times = times
+        self.node_offsets = node_offsets
+        self.node_index = node_index
+        self.edge_offsets = edge_offsets
+        self.edge_u = edge_u
+        self.edge_v = edge_v
+        self.edge_sentiment = edge_sentiment
+        self.edge_time = edge_time
+        self.ids = ids
+        self.names = names
+        self.coords = coords
+        # growable buffers of the appended arrays and the node lookups
+        self.buffers = {}
+        self.lookup = None
+        self.id_order = None
+        # inverted index of the node occurences - built on first use
+        self.time_index = None
+
+        if np.any(self.times[1:] < self.times[:-1]):
+            raise ValueError('Graphs are not sorted by time')
+
+    @classmethod
+    def from_graphs(cls, graphs):
+        """Return a store of a list of networkX graphs. Only the node
+        attributes name and coord and the edge attributes sentiment and time
+        are kept.
+
+            Keyword arguments:
+            graphs -- list of networkX graphs sorted by time
+        """
+        attrs = {}
+        for G in graphs:
+            for x, d in G.nodes(data=True):
+                attrs.setdefault(x, {}).update(d)
+        ids = np.array(sorted(attrs), dtype=np.int64)
+        lookup = {x: i for i, x in enumerate(ids.tolist())}
+        names = np.array([attrs[x].get('name', '') for x in ids.tolist()],
+                         dtype=str)
+        coords = np.full((len(ids), 2), np.nan)
+        for x, i in lookup.items():
+            if 'coord' in attrs[x]:
+                coords[i] = attrs[x]['coord']
+
+        times = np.array([graph_time(G) for G in graphs],
+                         dtype='datetime64[s]')
+        node_offsets = np.cumsum([0] + [len(G) for G in graphs])
+        node_index = np.fromiter((lookup[x] for G in graphs for x in G),
+                                 dtype=np.int32,
+                                 count=node_offsets[-1])
+
+        edges = [(lookup[u], lookup[v], d) for G in graphs
+                 for u, v, d in G.edges(data=True)]
+        edge_offsets = np.cumsum([0] + [G.number_of_edges() for G in graphs])
+        edge_u = np.array([e[0] for e in edges], dtype=np.int32)
+        edge_v = np.array([e[1] for e in edges], dtype=np.int32)
+        edge_sentiment = np.array([e[2]['sentiment'] for e in edges],
+                                  dtype=np.int8)
+        edge_time = np.array([np.datetime64(e[2]['time'], 's') for e in edges],
+                             dtype='datetime64[s]')
+
+        return cls(times, node_offsets, node_index, edge_offsets, edge_u,
+                   edge_v, edge_sentiment, edge_time, ids, names, coords)
+
+    def __len__(self):
+        return len(self.times)
+
+    def extend_array(self, name, values):
+        """Append the values to the array name. The arrays are views of
+        buffers with spare capacity - appending is amortized O(len(values)).
+        Memory mapped arrays are copied on the first append.
+
+            Keyword arguments:
+            name -- name of the array attribute
+            values -- values to append
+        """
+        a, self.buffers[name] = extend_buffer(getattr(self, name),
+                                              self.buffers.get(name), values)
+        setattr(self, name, a)
+
+    def append(self, G):
+        """Append the graph of the next time step to the store. Unknown
+        nodes are added to the node table, the attributes of known nodes are
+        kept.
+
+            Keyword arguments:
+            G -- networkX graph with the (date, hour) tuple as time attribute,
+                 name and coord node attributes and sentiment and time edge
+                 attributes
+        """
+        time = graph_time(G)
+        if len(self) and time < self.times[-1]:
+            raise ValueError('Graphs are not sorted by time')
+
+        lookup = self.get_lookup()
+        new_nodes = [(x, d) for x, d in G.nodes(data=True) if x not in lookup]
+        if new_nodes:
+            for x, _ in new_nodes:
+                lookup[x] = len(lookup)
+            self.extend_array('ids', [x for x, _ in new_nodes])
+            self.extend_array('names', [d.get('name', '') for _, d in new_nodes])
+            self.extend_array(
+                'coords',
+                [d.get('coord', (np.nan, np.nan)) for _, d in new_nodes])
+            self.id_order = None
+
+        edges = list(G.edges(data=True))
+        self.extend_array('node_index', [lookup[x] for x in G])
+        self.extend_array('node_offsets', [self.node_offsets[-1] + len(G)])
+        self.extend_array('edge_u', [lookup[u] for u, _, _ in edges])
+        self.extend_array('edge_v', [lookup[v] for _, v, _ in edges])
+        self.extend_array('edge_sentiment', [d['sentiment'] for _, _, d in edges])
+        self.extend_array(
+            'edge_time', [np.datetime64(d['time'], 's') for _, _, d in edges])
+        self.extend_array('edge_offsets',
+                          [self.edge_offsets[-1] + len(edges)])
+        self.extend_array('times', [time])
+        if self.time_index is not None:
+            self.time_index.append(len(self) - 1, [lookup[x] for x in G])
+        return len(new_nodes)
+
+    def get_lookup(self):
+        """Return the dict of the node ids to their index in the node table
+        """
+        if self.lookup is None:
+            self.lookup = {x: i for i, x in enumerate(self.ids.tolist())}
+        return self.lookup
+
+    def __getitem__(self, i):
+        """Return the graph of time step i as a networkX graph
+        """
+        return self.graph(i)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __repr__(self):
+        return 'TemporalGraphStore: ' + str(len(self)) + ' time steps - ' + \
+            str(len(self.ids)) + ' nodes - ' + str(len(self.edge_u)) + ' edges'
+
+    def content_hash(self):
+        """Return the sha1 hex digest of the arrays of the store
+        """
+        h = hashlib.sha1()
+        for a in [
+                self.times, self.node_offsets, self.node_index,
+                self.edge_offsets, self.edge_u, self.edge_v,
+                self.edge_sentiment, self.edge_time, self.ids, self.names,
+                self.coords
+        ]:
+            a = np.ascontiguousarray(a)
+            h.update(a.dtype.str.encode())
+            h.update(str(a.shape).encode())
+            h.update(a.tobytes())
+        return h.hexdigest()
+
+    def graph(self, i, mask=None):
+        """Return the graph of time step i as a networkX graph.
+
+            Keyword arguments:
+            i -- time step
+            mask -- boolean mask over the node table, the graph is induced on
+                    the masked nodes if given
+        """
+        return self.to_graph(self.times[i].item(), *self.frame(i, mask))
+
+    def frame(self, i, mask=None):
+        """Return the node indices and the unique edge positions of time step
+        i as (node_index, edge_positions).
+
+            Keyword arguments:
+            i -- time step
+            mask -- boolean mask over the node table or None
+        """
+        node_index = self.node_index[self.node_offsets[i]:self.node_offsets[i +
+                                                                            1]]
+        edges = np.arange(self.edge_offsets[i], self.edge_offsets[i + 1])
+        if mask is not None:
+            node_index = node_index[mask[node_index]]
+            edges = edges[mask[self.edge_u[edges]] & mask[self.edge_v[edges]]]
+        return node_index, self.unique_edges(edges)
+
+    def frame_delta(self, prev, cur):
+        """Return the changes between two frames as (added node indices,
+        removed node indices, added edge positions of cur, removed edge
+        positions of prev). Edges with changed attributes are added again.
+
+            Keyword arguments:
+            prev -- (node_index, edge_positions) of the previous frame
+            cur -- (node_index, edge_positions) of the current frame
+        """
+        prev_nodes, prev_edges = prev
+        cur_nodes, cur_edges = cur
+        nodes_added = np.setdiff1d(cur_nodes, prev_nodes, assume_unique=True)
+        nodes_removed = np.setdiff1d(prev_nodes, cur_nodes, assume_unique=True)
+
+        prev_keys = self.edge_keys(prev_edges)
+        cur_keys = self.edge_keys(cur_edges)
+        # match the edges of cur with the same edge of prev
+        order = np.argsort(prev_keys)
+        pos = np.searchsorted(prev_keys[order], cur_keys)
+        found = pos < len(prev_keys)
+        match = prev_edges[order[pos[found]]]
+        same = np.zeros(len(cur_edges), dtype=bool)
+        same[found] = (prev_keys[order[pos[found]]] == cur_keys[found]) & (
+            self.edge_sentiment[match] == self.edge_sentiment[
+                cur_edges[found]]) & (self.edge_time[match]
+                                      == self.edge_time[cur_edges[found]])
+
+        edges_added = cur_edges[~same]
+        edges_removed = prev_edges[~np.isin(prev_keys, cur_keys)]
+        return nodes_added, nodes_removed, edges_added, edges_removed
+
+    def node_times(self):
+        """Return the NodeTimeIndex of the node occurences
+        """
+        if self.time_index is None:
+            self.time_index = NodeTimeIndex(self.node_index, self.node_offsets)
+        return self.time_index
+
+    def node_positions(self, node_ids):
+        """Return the sorted positions of the node ids in the node table.
+        Unknown ids are ignored.
+
+            Keyword arguments:
+            node_ids -- array of node ids
+        """
+        return np.flatnonzero(self.node_mask(node_ids))
+
+    def node_mask(self, node_ids):
+        """Return a boolean mask over the node table of the node ids. Unknown
+        ids are ignored.
+
+            Keyword arguments:
+            node_ids -- array of node ids
+        """
+        node_ids = np.asarray(node_ids, dtype=self.ids.dtype)
+        mask = np.zeros(len(self.ids), dtype=bool)
+        if not len(self.ids):
+            return mask
+        # appended nodes are not sorted by id
+        if self.id_order is None:
+            self.id_order = np.argsort(self.ids, kind='stable')
+        sorted_ids = self.ids[self.id_order]
+        pos = np.minimum(np.searchsorted(sorted_ids, node_ids),
+                         len(self.ids) - 1)
+        mask[self.id_order[pos[sorted_ids[pos] == node_ids]]] = True
+        return mask
+
+    def induced_edges(self, positions, node_index):
+        """Return the edge positions with both nodes in node_index.
+
+            Keyword arguments:
+            positions -- positions in the edge arrays
+            node_index -- node indices of the induced subgraph
+        """
+        mask = np.zeros(len(self.ids), dtype=bool)
+        mask[node_index] = True
+        return positions[mask[self.edge_u[positions]]
+                         & mask[self.edge_v[positions]]]
+
+    def view(self, indx1, indx2):
+        """Return a view of the time steps [indx1, indx2)
+        """
+        return StoreView(self, indx1, indx2)
+
+    def get_nodes(self):
+        """Return a list of all (id, name) pairs of the node table
+        """
+        return list(zip(self.ids.tolist(), self.names.tolist()))
+
+    def edge_keys(self, positions):
+        """Return a key of the undirected edges at the positions
+        """
+        u = self.edge_u[positions].astype(np.int64)
+        v = self.edge_v[positions].astype(np.int64)
+        return np.minimum(u, v) * len(self.ids) + np.maximum(u, v)
+
+    def unique_edges(self, positions):
+        """Return the positions of the last occurence of every undirected edge
+        in positions sorted by position. The last occurence holds the edge
+        attributes of the union graph.
+
+            Keyword arguments:
+            positions -- sorted positions in the edge arrays
+        """
+        keys = self.edge_keys(positions)
+        # first occurence in the reversed keys is the last occurence
+        _, last = np.unique(keys[::-1], return_index=True)
+        return np.sort(positions[len(positions) - 1 - last])
+
+    def to_graph(self, time, node_index, edge_positions):
+        """Return a networkX graph of the nodes and edges of the store.
+
+            Keyword arguments:
+            time -- time graph attribute
+            node_index -- node indices of the graph
+            edge_positions -- positions of the edges in time order, later
+                              edges overwrite the attributes of earlier ones
+        """
+        G = nx.Graph(time=time)
+        G.add_nodes_from(zip(*self.node_attributes(node_index)))
+        G.add_edges_from(zip(*self.edge_attributes(edge_positions)))
+        return G
+
+    def node_attributes(self, node_index):
+        """Return the node ids and the attribute dicts of the nodes as
+        (ids, attrs). Empty names and unknown coordinates are omitted.
+
+            Keyword arguments:
+            node_index -- node indices
+        """
+        names = self.names[node_index].tolist()
+        coords = self.coords[node_index]
+        has_coord = ~np.isnan(coords).any(axis=1)
+        coords = coords.tolist()
+        attrs = []
+        for i in range(len(names)):
+            d = {}
+            if names[i]:
+                d['name'] = names[i]
+            if has_coord[i]:
+                d['coord'] = coords[i]
+            attrs.append(d)
+        return self.ids[node_index].tolist(), attrs
+
+    def edge_attributes(self, edge_positions):
+        """Return the node ids and the attribute dicts of the edges as
+        (u, v, attrs).
+
+            Keyword arguments:
+            edge_positions -- positions in the edge arrays
+        """
+        sentiment = self.edge_sentiment[edge_positions].tolist()
+        t = self.edge_time[edge_positions].tolist()
+        attrs = [{
+            'sentiment': sentiment[i],
+            'time': t[i]
+        } for i in range(len(t))]
+        return self.ids[self.edge_u[edge_positions]].tolist(), self.ids[
+            self.edge_v[edge_positions]].tolist(), attrs
+
+
+class StoreView:
+    def __init__(self, store, indx1, indx2):
+        """Initialize a zero copy view of the time steps [indx1, indx2) of
+        the store.
+
+            Keyword arguments:
+            store -- the TemporalGraphStore
+            indx1 -- first time step of the view
+            indx2 -- end of the view (exclusive), clipped to the store length
+        """
+        self.store = store
+        self.indx1 = indx1
+        self.indx2 = min(indx2, len(store))
+
+    def __len__(self):
+        return self.indx2 - self.indx1
+
+    def __iter__(self):
+        for i in range(self.indx1, self.indx2):
+            yield self.store[i]
+
+    @property
+    def times(self):
+        return self.store.times[self.indx1:self.indx2]
+
+    @property
+    def node_index(self):
+        """Node occurences of the time steps of the view
+        """
+        offsets = self.store.node_offsets
+        return self.store.node_index[offsets[self.indx1]:offsets[self.indx2]]
+
+    @property
+    def edge_positions(self):
+        """Positions of the edges of the view in the edge arrays
+        """
+        offsets = self.store.edge_offsets
+        return np.arange(offsets[self.indx1], offsets[self.indx2])
+
+    def appearance_order(self, node_index):
+        """Return the node indices ordered by their first occurence in the
+        time steps of the view - the node order of the networkX union of the
+        graphs.
+
+            Keyword arguments:
+            node_index -- sorted node indices occuring in the view
+        """
+        occurences = self.node_index
+        nodes, first = np.unique(occurences, return_index=True)
+        first = first[np.searchsorted(nodes, node_index)]
+        return node_index[np.argsort(first, kind='stable')]
+
+    def node_occurences(self):
+        """Return the node indices and the number of time steps they occur in
+        """
+        offsets = self.store.node_offsets
+        if offsets[self.indx2] - offsets[self.indx1] > len(self.store.ids):
+            # range intersection per node is cheaper than the long window
+            return self.store.node_times().window_occurences(
+                self.indx1, self.indx2, len(self.store.ids))
+        return np.unique(self.node_index, return_counts=True)
+
+    def union_edges(self):
+        """Return the positions of the edges of the union graph of the view
+        """
+        return self.store.unique_edges(self.edge_positions)
+
+    def to_graph(self, time=None):
+        """Return the union of the view as a networkX graph
+        """
+        node_index, _ = self.node_occurences()
+        return self.store.to_graph(time, self.appearance_order(node_index),
+                                   self.union_edges())
+
+
+class NodeTimeIndex:
+    def __init__(self, node_index, node_offsets):
+        """Initialize the inverted index of the node occurences - the sorted
+        time steps of every node. The occurences are encoded as sorted keys
+        (node index << 32 | time step), the time steps of a node are a
+        contiguous range of the keys.
+
+            Keyword arguments:
+            node_index -- node occurences of all time steps
+            node_offsets -- offsets of the time steps in node_index
+        """
+        steps = np.repeat(np.arange(len(node_offsets) - 1, dtype=np.int64),
+                          np.diff(node_offsets))
+        self.keys = np.sort((np.asarray(node_index, dtype=np.int64) << 32)
+                            | steps)
+        # unsorted keys of the appended time steps
+        self.tail = np.empty(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.keys) + len(self.tail)
+
+    def __repr__(self):
+        return 'NodeTimeIndex: ' + str(len(self)) + ' occurences'
+
+    @property
+    def nbytes(self):
+        return self.keys.nbytes + self.tail.nbytes
+
+    def append(self, step, node_index):
+        """Add the node occurences of an appended time step. The keys are
+        merged once the appended keys exceed an eighth of the index.
+
+            Keyword arguments:
+            step -- time step
+            node_index -- node indices of the time step
+        """
+        keys = (np.asarray(node_index, dtype=np.int64) << 32) | step
+        self.tail = np.concatenate([self.tail, keys])
+        if len(self.tail) > max(1024, len(self.keys) // 8):
+            self.keys = np.sort(np.concatenate([self.keys, self.tail]))
+            self.tail = np.empty(0, dtype=np.int64)
+
+    def window_occurences(self, indx1, indx2, num_nodes, nodes=None):
+        """Return the node indices occuring in the time steps [indx1, indx2)
+        and the number of time steps they occur in - by intersecting the time
+        step range of every node with the window.
+
+            Keyword arguments:
+            indx1 -- first time step of the window
+            indx2 -- end of the window (exclusive)
+            num_nodes -- number of nodes of the node table
+            nodes -- sorted node indices to count, all nodes if None
+        """
+        if nodes is None:
+            nodes = np.arange(num_nodes, dtype=np.int64)
+        nodes = np.asarray(nodes, dtype=np.int64)
+        counts = np.searchsorted(self.keys, (nodes << 32) | indx2) - \
+            np.searchsorted(self.keys, (nodes << 32) | indx1)
+        if len(self.tail):
+            steps = self.tail & 0xffffffff
+            tail = self.tail[(steps >= indx1) & (steps < indx2)] >> 32
+            counts += np.bincount(tail, minlength=num_nodes)[nodes]
+        present = counts > 0
+        return nodes[present], counts[present].astype(np.int64)
+
+    def occurences(self, nodes):
+        """Return all occurences of the nodes as sorted (node index, time
+        step) arrays.
+
+            Keyword arguments:
+            nodes -- sorted node indices
+        """
+        nodes = np.asarray(nodes, dtype=np.int64)
+        lo = np.searchsorted(self.keys, nodes << 32)
+        hi = np.searchsorted(self.keys, (nodes + 1) << 32)
+        lengths = hi - lo
+        # concatenated key ranges of the nodes
+        positions = np.arange(lengths.sum()) + np.repeat(
+            lo - np.cumsum(lengths) + lengths, lengths)
+        keys = self.keys[positions]
+        if len(self.tail):
+            tail = self.tail[np.isin(self.tail >> 32, nodes)]
+            keys = np.sort(np.concatenate([keys, tail]))
+        return keys >> 32, keys & 0xffffffff
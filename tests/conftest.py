@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""
+conftest - shared fixtures of the tests: a small synthetic hierarchy and
+           the Flask test client of the app serving it
+"""
+
+# Author: Eren Cakmak <eren.cakmak@uni-konstanz.de>
+#
+# License: MIT
+
+import os
+import sys
+
+import pytest
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, root)
+sys.path.insert(0, os.path.join(root, 'scripts'))
+
+import model  # noqa: E402
+from generate import generate_store, random_embeddings  # noqa: E402
+
+
+@pytest.fixture
+def store():
+    """Return a synthetic TemporalGraphStore of 32 time steps
+    """
+    return generate_store(32, nodes=80, active=20, density=0.2)
+
+
+@pytest.fixture
+def hierarchy(store):
+    """Return the hierarchy of the store as the loaded hierarchy of the app
+    """
+    model.graph_cache.clear()
+    model.node_filters.clear()
+    model.hierarchy = model.Hierarchy(store,
+                                      random_embeddings(len(store), 8))
+    yield model.hierarchy
+    model.hierarchy = None
+    model.graph_cache.clear()
+    model.node_filters.clear()
+
+
+@pytest.fixture
+def client(hierarchy):
+    """Return the Flask test client of the app serving the hierarchy
+    """
+    from app import app
+    return app.test_client()
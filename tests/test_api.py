@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+test_api - the validation of the /graph and /graphs requests and the node
+           filter tokens
+"""
+
+# Author: Eren Cakmak <eren.cakmak@uni-konstanz.de>
+#
+# License: MIT
+
+import os
+import json
+
+import model
+
+
+def get_graph(client, **query):
+    query = dict({'level': 3, 'num': 1, 'cluster': 'false'}, **query)
+    return client.get('/graph', query_string=query)
+
+
+def post_graphs(client, requests, **body):
+    response = client.post('/graphs',
+                           data=json.dumps(dict(body, requests=requests)))
+    assert response.status_code == 200
+    return response.get_json()['results']
+
+
+def test_graph_types(client):
+    for graph_type in ['union', 'disjoint', 'intersection']:
+        response = get_graph(client, graph_type=graph_type, k=2)
+        assert response.status_code == 200
+        assert response.get_json()['nodes']
+
+
+def test_disjoint_requires_k(client):
+    response = get_graph(client, graph_type='disjoint')
+    assert response.status_code == 400
+    assert 'k' in response.get_json()['error']
+    # the intersection graph does not depend on k
+    assert get_graph(client, graph_type='intersection').status_code == 200
+
+    results = post_graphs(client, [{
+        'level': 3,
+        'num': 1,
+        'graph_type': 'disjoint'
+    }])
+    assert 'error' in results[0] and 'graph' not in results[0]
+
+
+def test_cluster_and_detail(client):
+    response = get_graph(client,
+                         graph_type='union',
+                         cluster='true',
+                         detail='degree',
+                         tier=0)
+    assert response.status_code == 400
+    error = response.get_json()['error']
+
+    results = post_graphs(client, [{
+        'level': 3,
+        'num': 1,
+        'graph_type': 'union',
+        'cluster': True,
+        'detail': 'degree',
+        'tier': 0
+    }, {
+        'level': 3,
+        'num': 1,
+        'graph_type': 'union',
+        'detail': 'degree',
+        'tier': 0
+    }])
+    assert error in results[0]['error'] and 'graph' not in results[0]
+    assert results[1]['graph']['graph']['detail']['method'] == 'degree'
+
+
+def graph_content(graph):
+    """Return the node ids and edges of a node link graph
+    """
+    nodes = {node['id'] for node in graph['nodes']}
+    edges = {tuple(sorted((e['source'], e['target']))) for e in graph['links']}
+    return nodes, edges
+
+
+def register_filter(client, node_ids):
+    response = client.post('/filter_nodes', data=json.dumps(node_ids))
+    assert response.status_code == 200
+    return response.get_json()['filter']
+
+
+def test_filter_tokens(client):
+    graph = get_graph(client, graph_type='union').get_json()
+    nodes, edges = graph_content(graph)
+    node_ids = sorted(nodes)[::2]
+
+    token = register_filter(client, node_ids)
+    assert len(token) == 40
+    # same nodes - same token
+    assert register_filter(client, node_ids[::-1] + node_ids[:3]) == token
+    assert register_filter(client, []) is None
+
+    filtered = get_graph(client, graph_type='union', filter=token)
+    assert filtered.status_code == 200
+    assert graph_content(filtered.get_json()) == (
+        nodes & set(node_ids),
+        {e for e in edges if set(e) <= set(node_ids)})
+
+    response = get_graph(client, graph_type='union', filter='0' * 40)
+    assert response.status_code == 404
+
+
+def test_filter_directory(client, tmp_path):
+    # the filters of other processes are read from the filter directory
+    model.configure_filters(str(tmp_path))
+    try:
+        token = register_filter(client, [1, 2, 3])
+        assert os.listdir(str(tmp_path)) == [token + '.npy']
+        model.node_filters.clear()
+        node_filter = model.hierarchy.get_filter(token)
+        assert node_filter.ids.tolist() == [1, 2, 3]
+        assert model.hierarchy.get_filter('../' + token) is None
+        model.clear_filters()
+        assert os.listdir(str(tmp_path)) == []
+    finally:
+        model.configure_filters(None)
+
+
+def test_batch(client):
+    items = [{
+        'level': 3,
+        'num': num,
+        'graph_type': graph_type,
+        'k': 2
+    } for num in range(3) for graph_type in ['union', 'intersection']]
+    items += [{'level': 3, 'num': 0}, {'level': 3, 'num': 10**6}]
+    results = post_graphs(client, items)
+    assert [r['index'] for r in results] == list(range(len(items)))
+    for item, result in zip(items[:-2], results):
+        expected = get_graph(client, **item).get_json()
+        assert result['exists'] and result['graph'] == expected
+    # existence checks only
+    assert results[-2] == {'index': len(items) - 2, 'exists': True}
+    assert results[-1] == {'index': len(items) - 1, 'exists': False}
+
+    # streamed as they complete
+    response = client.post('/graphs',
+                           data=json.dumps({
+                               'requests': items,
+                               'stream': True
+                           }))
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    streamed = [json.loads(line) for line in response.data.splitlines()]
+    assert sorted(streamed, key=lambda r: r['index']) == results
+
+
+def test_batch_errors(client):
+    assert client.post('/graphs',
+                       data='{"requests": {}}').status_code == 400
+    assert client.post('/graphs',
+                       data=json.dumps({
+                           'requests': [],
+                           'format': 'xml'
+                       })).status_code == 400
+    results = post_graphs(client, [{'num': 1}, {'level': 'x', 'num': 1}])
+    assert all('error' in r for r in results)
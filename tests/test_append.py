@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+test_append - a hierarchy extended by appends equals the hierarchy rebuilt
+              from all time steps, and the cost of an append does not grow
+              with the length of the history
+"""
+
+# Author: Eren Cakmak <eren.cakmak@uni-konstanz.de>
+#
+# License: MIT
+
+import os
+import sys
+import time
+
+import networkx as nx
+import numpy as np
+import pytest
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, root)
+sys.path.insert(0, os.path.join(root, 'scripts'))
+
+import model  # noqa: E402
+from generate import generate_store, no_embeddings, to_graphs  # noqa: E402
+from metrics import graph_metrics  # noqa: E402
+from store import TemporalGraphStore  # noqa: E402
+
+
+def graphs_of(steps, seed=0):
+    """Return the networkX graphs of a small synthetic store
+    """
+    return to_graphs(
+        generate_store(steps, nodes=60, active=15, density=0.2, seed=seed))
+
+
+def hierarchy_of(graphs, lazy=False, metrics_table=None):
+    """Return a hierarchy without embeddings of the graphs
+    """
+    model.graph_cache.clear()
+    return model.Hierarchy(TemporalGraphStore.from_graphs(graphs),
+                           no_embeddings(8), metrics_table, lazy)
+
+
+def snapshot_data(h, level, num, graph_type):
+    """Return the comparable content of a snapshot graph
+    """
+    model.graph_cache.clear()
+    G = h.get_snapshot(level, num, graph_type, 1)
+    return (sorted(G.nodes(data='occurences')),
+            sorted(tuple(sorted(e)) for e in G.edges()))
+
+
+@pytest.mark.parametrize('lazy', [False, True])
+def test_append_equals_rebuild(lazy):
+    graphs = graphs_of(21)
+    h = hierarchy_of(graphs[:5], lazy)
+    for G in graphs[5:]:
+        h.append(G)
+    rebuilt = hierarchy_of(graphs, lazy)
+
+    assert h.height == rebuilt.height
+    assert np.array_equal(h.times, rebuilt.times)
+    for name in graph_metrics:
+        assert np.array_equal(h.metrics_table[name],
+                              rebuilt.metrics_table[name])
+    for level in rebuilt.levels:
+        assert h.levels[level].bounds == rebuilt.levels[level].bounds
+        assert len(h.levels[level].embeddings) == len(
+            rebuilt.levels[level].embeddings)
+        for num in range(len(rebuilt.levels[level].bounds)):
+            for graph_type in ['union', 'disjoint', 'intersection']:
+                assert snapshot_data(h, level, num,
+                                     graph_type) == snapshot_data(
+                                         rebuilt, level, num, graph_type)
+
+
+def test_append_first_level():
+    # a hierarchy of a single time step without any embedding keys yet
+    graphs = graphs_of(3)
+    model.graph_cache.clear()
+    h = model.Hierarchy(TemporalGraphStore.from_graphs(graphs[:1]), {
+        'embeddings': np.empty((0, 8)),
+        'keys': []
+    })
+    assert h.levels == {}
+    # the appends add the first levels
+    for G in graphs[1:]:
+        h.append(G)
+    rebuilt = hierarchy_of(graphs)
+    assert h.height == rebuilt.height > 1
+    for level in rebuilt.levels:
+        assert h.levels[level].bounds == rebuilt.levels[level].bounds
+        for num in range(len(rebuilt.levels[level].bounds)):
+            assert snapshot_data(h, level, num, 'union') == snapshot_data(
+                rebuilt, level, num, 'union')
+
+
+def next_graph(h, i):
+    """Return a small graph of the time step after the hierarchy
+    """
+    t = h.times[-1] + np.timedelta64(1, 'h')
+    day = t.astype('datetime64[D]')
+    G = nx.Graph(time=(str(day), int((t - day) // np.timedelta64(1, 'h'))))
+    G.add_edge(i % 50, (i + 1) % 50, sentiment=1, time=str(t))
+    return G
+
+
+def append_ms(steps, appends=200):
+    """Return the median duration of an append to a lazy hierarchy of steps
+    time steps in ms
+    """
+    store = generate_store(steps, nodes=100, active=10, density=0.2)
+    table = {
+        name: np.zeros(steps, dtype=dtype)
+        for name, (_, dtype, _) in graph_metrics.items()
+    }
+    model.graph_cache.clear()
+    h = model.Hierarchy(store, no_embeddings(8), table, lazy=True)
+    durations = []
+    for i in range(appends):
+        G = next_graph(h, i)
+        start = time.perf_counter()
+        h.append(G)
+        durations.append(time.perf_counter() - start)
+    return 1000 * np.median(durations)
+
+
+def test_append_cost_flat():
+    short = append_ms(500)
+    long = append_ms(32000)
+    # 64 times the history - a linear append would be far slower
+    assert long < 3 * short + 0.5
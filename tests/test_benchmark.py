@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""
+test_benchmark - smoke test of scripts/benchmark.py: one tiny dataset is
+                 generated, loaded and every route of the API is requested
+                 end to end in the benchmark process
+"""
+
+# Author: Eren Cakmak <eren.cakmak@uni-konstanz.de>
+#
+# License: MIT
+
+import os
+import sys
+import json
+import subprocess
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def test_benchmark_tiny(tmp_path):
+    out = str(tmp_path / 'benchmark.json')
+    subprocess.run([
+        sys.executable,
+        os.path.join(root, 'scripts', 'benchmark.py'), '--steps', '24',
+        '--nodes', '200', '--active', '40', '--no-embeddings', '--repeats',
+        '1', '--json', out
+    ],
+                   cwd=str(tmp_path),
+                   check=True,
+                   timeout=600)
+    with open(out) as f:
+        results = json.load(f)['results']
+
+    assert len(results) == 1
+    result = results[0]
+    assert result['steps'] == 24
+    assert result['missing_routes'] == []
+    failed = [(r['endpoint'], r['request'], r['status'])
+              for r in result['routes'] if r['status'] != 200]
+    assert failed == []
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+test_hierarchy - a lazily built hierarchy equals the eagerly built one and a
+                 hierarchy warm started from the cache of a previous run
+                 equals a cold start
+"""
+
+# Author: Eren Cakmak <eren.cakmak@uni-konstanz.de>
+#
+# License: MIT
+
+import os
+
+import numpy as np
+import pytest
+
+import model
+from generate import generate_store, no_embeddings
+
+
+def hierarchy_of(store, lazy=False, cache_dir=None):
+    """Return a hierarchy without embeddings of the store
+    """
+    model.graph_cache.clear()
+    return model.Hierarchy(store,
+                           no_embeddings(8),
+                           lazy=lazy,
+                           cache_dir=cache_dir)
+
+
+def snapshot_data(h, level, num, graph_type):
+    """Return the comparable content of a snapshot graph
+    """
+    model.graph_cache.clear()
+    G = h.get_snapshot(level, num, graph_type, 2)
+    return (sorted(G.nodes(data='occurences')),
+            sorted(tuple(sorted(e)) for e in G.edges()),
+            G.graph.get('metrics'))
+
+
+def snapshot_keys(h, top_down=False):
+    """Return the (level, num) of all snapshots of the hierarchy
+    """
+    levels = sorted(h.levels, reverse=top_down)
+    return [(level, num) for level in levels
+            for num in range(len(h.levels[level].bounds))]
+
+
+def assert_equal(h, expected, top_down=False):
+    assert h.height == expected.height
+    for level in expected.levels:
+        assert h.levels[level].bounds == expected.levels[level].bounds
+    for level, num in snapshot_keys(expected, top_down):
+        occ = h.levels[level].snapshots[num].get_occurences()
+        expected_occ = expected.levels[level].snapshots[num].get_occurences()
+        assert np.array_equal(occ[0], expected_occ[0])
+        assert np.array_equal(occ[1], expected_occ[1])
+        for graph_type in ['union', 'disjoint', 'intersection']:
+            assert snapshot_data(h, level, num, graph_type) == snapshot_data(
+                expected, level, num, graph_type)
+
+
+@pytest.mark.parametrize('top_down', [False, True])
+def test_lazy_equals_eager(top_down):
+    store = generate_store(40, nodes=60, active=15, churn=0.3, density=0.2)
+    eager = hierarchy_of(store)
+    lazy = hierarchy_of(store, lazy=True)
+    # nothing is built before the first access
+    assert all(s is None for l in lazy.levels.values()
+               for s in l.snapshots.items)
+    # the snapshots are counted from the time steps or merged from their
+    # built children depending on the order of access
+    assert_equal(lazy, eager, top_down)
+
+
+def test_warm_start(tmp_path):
+    store = generate_store(40, nodes=60, active=15, density=0.2)
+    cache_dir = str(tmp_path)
+    cold = hierarchy_of(store, cache_dir=cache_dir)
+    path = os.path.join(cache_dir,
+                        'hierarchy_' + store.content_hash() + '.npz')
+    assert os.listdir(cache_dir) == [os.path.basename(path)]
+    assert all(l.occurences is None for l in cold.levels.values())
+
+    for lazy in [False, True]:
+        warm = hierarchy_of(store, lazy, cache_dir)
+        # the occurences of every level are read from the cache
+        assert all(l.occurences is not None for l in warm.levels.values())
+        assert_equal(warm, cold)
+
+    # the cache of other time steps is not used
+    other = generate_store(24, nodes=60, active=15, density=0.2)
+    os.replace(path,
+               os.path.join(cache_dir,
+                            'hierarchy_' + other.content_hash() + '.npz'))
+    h = hierarchy_of(other, cache_dir=cache_dir)
+    assert all(l.occurences is None for l in h.levels.values())
+    assert_equal(h, hierarchy_of(other))
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+test_metrics - the sparse matrix metrics of GraphMetrics are identical to the
+               networkX implementations and the window aggregates equal the
+               aggregates of the time steps of the windows. Usage:
+
+    python -m pytest tests
+"""
+
+# Author: Eren Cakmak <eren.cakmak@uni-konstanz.de>
+#
+# License: MIT
+
+import os
+import sys
+
+import networkx as nx
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import model  # noqa: E402
+from metrics import GraphMetrics, window_aggregates  # noqa: E402
+
+
+def self_loop_graph():
+    """Return a graph with triangles, self loops and isolated nodes
+    """
+    G = nx.Graph()
+    G.add_edges_from([(0, 1), (1, 2), (2, 0), (2, 3), (3, 4), (4, 2), (4, 5)])
+    G.add_edges_from([(0, 0), (3, 3), (6, 6)])
+    G.add_nodes_from([7, 8])
+    return G
+
+
+def single_self_loop():
+    G = nx.Graph()
+    G.add_edge(0, 0)
+    return G
+
+
+graphs = {
+    'self_loops_isolated': self_loop_graph(),
+    'random': nx.gnp_random_graph(60, 0.1, seed=42),
+    'random_self_loops': nx.Graph(
+        list(nx.gnp_random_graph(40, 0.2, seed=7).edges()) +
+        [(i, i) for i in range(0, 40, 3)]),
+    'isolated': nx.empty_graph(5),
+    'complete': nx.complete_graph(6),
+    'path': nx.path_graph(4),
+    'single_node': nx.empty_graph(1),
+    'single_self_loop': single_self_loop(),
+    'string_nodes': nx.relabel_nodes(self_loop_graph(),
+                                     lambda x: 'n' + str(x)),
+}
+
+
+@pytest.mark.parametrize('name', list(graphs))
+def test_node_metrics(name):
+    G = graphs[name]
+    M = GraphMetrics(G)
+    assert dict(zip(M.nodes, M.clustering().tolist())) == nx.clustering(G)
+    assert dict(zip(M.nodes,
+                    M.degree_centrality().tolist())) == nx.degree_centrality(G)
+    assert dict(zip(M.nodes, M.degree().tolist())) == dict(G.degree())
+
+
+@pytest.mark.parametrize('name', list(graphs))
+def test_graph_metrics(name):
+    G = graphs[name]
+    M = GraphMetrics(G)
+    assert M.transitivity() == nx.transitivity(G)
+    assert M.average_clustering() == nx.average_clustering(G)
+    assert M.density() == nx.density(G)
+
+
+def test_empty_graph():
+    G = nx.Graph()
+    M = GraphMetrics(G)
+    assert M.clustering().tolist() == list(nx.clustering(G).values())
+    assert M.degree_centrality().tolist() == list(
+        nx.degree_centrality(G).values())
+    assert M.transitivity() == nx.transitivity(G)
+    assert M.density() == nx.density(G)
+    # the average of no nodes is undefined for both
+    with pytest.raises(ZeroDivisionError):
+        nx.average_clustering(G)
+    with pytest.raises(ZeroDivisionError):
+        M.average_clustering()
+
+
+@pytest.mark.parametrize('steps, overlap, size', [(17, 1, 16), (17, 2, 8),
+                                                  (17, 4, 5), (16, 8, 4),
+                                                  (3, 4, 2), (0, 2, 3)])
+def test_window_aggregates(steps, overlap, size):
+    rng = np.random.RandomState(steps)
+    table = {
+        'density': rng.rand(steps),
+        'nodes': rng.randint(0, 100, steps),
+    }
+    aggregates = window_aggregates(table, overlap, size)
+    for name, values in table.items():
+        for num in range(size):
+            window = values[num * overlap:num * overlap + 2 * overlap]
+            a = {key: aggregates[name][key][num] for key in aggregates[name]}
+            if not len(window):
+                assert all(np.isnan(list(a.values())))
+                continue
+            assert a['min'] == window.min() and a['max'] == window.max()
+            assert np.isclose(a['mean'], window.mean())
+
+
+def test_downsampled_timeseries(hierarchy):
+    times = hierarchy.times
+    start, end = [
+        t.strftime(model.time_format) for t in times[[3, -2]].tolist()
+    ]
+    rows = hierarchy.get_timeseries(start, end)
+    assert len(rows) == len(times) - 4
+    for max_points in [1, 4, 10]:
+        downsampled = hierarchy.get_timeseries(start, end, max_points)
+        assert 0 < len(downsampled) <= max_points
+        # the windows tile the range without overlap
+        assert downsampled[0]['date'] <= rows[0]['date']
+        assert downsampled[-1]['date_end'] >= rows[-1]['date']
+        for row, next_row in zip(downsampled, downsampled[1:]):
+            assert row['date_end'] < next_row['date']
+        for row in downsampled:
+            first = np.searchsorted(times, np.datetime64(row['date']))
+            last = np.searchsorted(times, np.datetime64(row['date_end']))
+            for name, values in hierarchy.metrics_table.items():
+                window = values[first:last + 1].astype(float)
+                assert row[name + '_min'] == window.min()
+                assert row[name + '_max'] == window.max()
+                assert np.isclose(row[name], window.mean())
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+test_offload - the calls of the worker pool return their results, exceed
+               their time budget or are cancelled and the workers of the
+               unfinished calls are replaced
+"""
+
+# Author: Eren Cakmak <eren.cakmak@uni-konstanz.de>
+#
+# License: MIT
+
+import time
+
+import pytest
+
+import api
+import offload
+
+
+def double(x):
+    return 2 * x
+
+
+def fail(message):
+    raise KeyError(message)
+
+
+def sleep(seconds):
+    time.sleep(seconds)
+    return seconds
+
+
+def slow_snapshot(*args):
+    time.sleep(5)
+
+
+@pytest.fixture
+def pool():
+    """Return a pool of a single worker process
+    """
+    pool = offload.WorkerPool(1)
+    yield pool
+    pool.close()
+
+
+def test_call(pool):
+    assert pool.call(double, (21, ), 5) == 42
+    with pytest.raises(KeyError, match='missing'):
+        pool.call(fail, ('missing', ), 5)
+    assert pool.replaced == 0
+
+
+def test_timeout(pool):
+    start = time.monotonic()
+    with pytest.raises(offload.Timeout):
+        pool.call(sleep, (5, ), 0.3)
+    assert time.monotonic() - start < 2
+    assert pool.replaced == 1
+    # the replaced worker takes the next call
+    assert pool.call(double, (1, ), 5) == 2
+
+
+def test_cancel(pool):
+    start = time.monotonic()
+    with pytest.raises(offload.Cancelled):
+        pool.call(sleep, (5, ), 10, lambda: time.monotonic() - start > 0.2)
+    assert time.monotonic() - start < 2
+    assert pool.replaced == 1
+    assert pool.call(double, (2, ), 5) == 4
+
+
+def test_run_budget(pool, monkeypatch):
+    # without a pool the call runs in the calling thread
+    assert offload.run(double, (3, )) == 6
+    monkeypatch.setattr(offload, 'pool', pool)
+    assert offload.run(double, (3, )) == 6
+    with pytest.raises(offload.Timeout):
+        offload.run(double, (3, ), offload.budget(0))
+    with pytest.raises(offload.Cancelled):
+        offload.run(double, (3, ), offload.budget(5, lambda: True))
+
+
+def test_superseded_view():
+    views = offload.ViewRegistry()
+    first = views.start('view-a')
+    assert not views.superseded('view-a', first)
+    second = views.start('view-a')
+    assert views.superseded('view-a', first)
+    assert not views.superseded('view-a', second)
+    assert not views.superseded('view-b', first)
+
+
+def test_graph_timeout(client, monkeypatch):
+    monkeypatch.setattr(api, 'snapshot_data', slow_snapshot)
+    monkeypatch.setattr(offload, 'pool', offload.WorkerPool(1))
+    try:
+        response = client.get('/graph',
+                              query_string={
+                                  'level': 3,
+                                  'num': 1,
+                                  'graph_type': 'union',
+                                  'cluster': 'false',
+                                  'timeout': 0.3
+                              })
+        assert response.status_code == 504
+        assert offload.pool.replaced == 1
+
+        results = client.post('/graphs',
+                              data='{"timeout": 0.3, "requests": [{"level": '
+                              '3, "num": 2, "graph_type": "union"}]}'
+                              ).get_json()['results']
+        assert 'error' in results[0] and 'graph' not in results[0]
+    finally:
+        offload.pool.close()
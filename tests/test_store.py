@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+test_store - the graphs, unions and summary graphs of the graph store equal
+             the networkX graphs they are built from and the node time index
+             equals the occurences of the time steps
+"""
+
+# Author: Eren Cakmak <eren.cakmak@uni-konstanz.de>
+#
+# License: MIT
+
+import networkx as nx
+import numpy as np
+import pytest
+
+import model
+from generate import generate_store, no_embeddings, to_graphs
+from store import TemporalGraphStore
+
+
+def graph_data(G):
+    """Return the nodes in order and the edges with their attributes
+    """
+    return (list(G.nodes(data=True)),
+            sorted((tuple(sorted((u, v))), sorted(d.items()))
+                   for u, v, d in G.edges(data=True)))
+
+
+def networkx_union(graphs):
+    """Return the union of the graphs like the original snapshots
+    """
+    G = nx.Graph()
+    for H in graphs:
+        G.add_nodes_from(H.nodes(data=True))
+        G.add_edges_from(H.edges(data=True))
+    return G
+
+
+def source_graphs(steps=16):
+    """Return the networkX graphs of a small synthetic store
+    """
+    return to_graphs(
+        generate_store(steps, nodes=60, active=15, churn=0.3, density=0.2))
+
+
+def test_graphs():
+    graphs = source_graphs()
+    store = TemporalGraphStore.from_graphs(graphs)
+    assert len(store) == len(graphs)
+    for i, G in enumerate(graphs):
+        assert graph_data(store[i]) == graph_data(G)
+
+
+def test_view_union():
+    graphs = source_graphs()
+    store = TemporalGraphStore.from_graphs(graphs)
+    for indx1, indx2 in [(0, 1), (0, 4), (3, 11), (8, 16)]:
+        view = store.view(indx1, indx2)
+        expected = networkx_union(graphs[indx1:indx2])
+        assert graph_data(view.to_graph()) == graph_data(expected)
+
+        index, counts = view.node_occurences()
+        occurences = {}
+        for G in graphs[indx1:indx2]:
+            for x in G:
+                occurences[x] = occurences.get(x, 0) + 1
+        assert dict(zip(store.ids[index].tolist(),
+                        counts.tolist())) == occurences
+
+
+def test_snapshot_metrics():
+    # the metrics of the summary graphs equal the networkX metrics of the
+    # union in the node order of the original snapshots
+    graphs = source_graphs()
+    model.graph_cache.clear()
+    h = model.Hierarchy(TemporalGraphStore.from_graphs(graphs),
+                        no_embeddings(8))
+    for level in [2, 3, 4]:
+        for num, (indx1, indx2) in enumerate(h.levels[level].bounds):
+            union = networkx_union(graphs[indx1:indx2])
+            G = h.get_snapshot(level, num, 'union')
+            assert list(G) == list(union)
+            metrics = G.graph['metrics']
+            assert metrics['average_clustering'] == nx.average_clustering(
+                union)
+            assert metrics['transitivity'] == nx.transitivity(union)
+            assert metrics['density'] == nx.density(union)
+            assert nx.get_node_attributes(
+                G, 'clustering') == nx.clustering(union)
+    model.graph_cache.clear()
+
+
+def window_counts(store, indx1, indx2):
+    """Return the node indices and counts of the time steps [indx1, indx2)
+    """
+    offsets = store.node_offsets
+    return np.unique(store.node_index[offsets[indx1]:offsets[indx2]],
+                     return_counts=True)
+
+
+def check_time_index(store):
+    index = store.node_times()
+    steps = len(store)
+    num_nodes = len(store.ids)
+    for indx1, indx2 in [(0, 1), (0, steps), (3, 9), (steps // 2, steps),
+                         (steps - 1, steps), (5, 5)]:
+        nodes, counts = index.window_occurences(indx1, indx2, num_nodes)
+        expected = window_counts(store, indx1, indx2)
+        assert np.array_equal(nodes, expected[0])
+        assert np.array_equal(counts, expected[1])
+        # counts of a subset of the nodes
+        subset = np.arange(0, num_nodes, 3)
+        nodes, counts = index.window_occurences(indx1, indx2, num_nodes,
+                                                subset)
+        present = np.isin(expected[0], subset)
+        assert np.array_equal(nodes, expected[0][present])
+        assert np.array_equal(counts, expected[1][present])
+
+    nodes = np.array([0, 2, 7, num_nodes - 1])
+    steps = np.repeat(np.arange(len(store)), np.diff(store.node_offsets))
+    found = np.isin(store.node_index, nodes)
+    order = np.lexsort((steps[found], store.node_index[found]))
+    node_index, time_steps = index.occurences(nodes)
+    assert np.array_equal(node_index, store.node_index[found][order])
+    assert np.array_equal(time_steps, steps[found][order])
+
+
+@pytest.mark.parametrize('appended', [0, 10, 100])
+def test_node_time_index(appended):
+    graphs = source_graphs(120)
+    store = TemporalGraphStore.from_graphs(graphs[:len(graphs) - appended])
+    store.node_times()
+    # the appended time steps are added to the tail and merged
+    for G in graphs[len(graphs) - appended:]:
+        store.append(G)
+    assert len(store.node_times()) == len(store.node_index)
+    check_time_index(store)